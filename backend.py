@@ -7,22 +7,35 @@ import os
 import datetime
 import uuid
 import time
+import mimetypes
 from typing import Optional, List, Dict, Any
 from pathlib import Path
+from collections import defaultdict
 
 # --- 第三方库导入 ---
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from pyrogram import Client
-from pyrogram.errors import PeerIdInvalid, UsernameNotOccupied, FloodWait
+from pyrogram import Client, enums, raw, utils
 
 # --- 本地模块导入 ---
-from config import PyroConf
+from config import PyroConf, BackendConf
+from helpers.scheduler import DownloadScheduler, QueueFullError
+from helpers.blobstore import BlobStore
+from helpers.taskstore import TaskStore
+from helpers.channelindex import ChannelIndex
+from helpers.thumbcache import ThumbnailCache
+from helpers.events import ProgressBroker, format_sse
+from helpers.metrics import CONTENT_TYPE, REGISTRY, cache_samples, stage
+from helpers.parallel import download_parallel
+from helpers.progress import SpeedMeter
+from helpers.ratelimit import RateLimiter, transfer
+from helpers.sessionpool import SessionPool, session_names
+from helpers.streaming import RangeFileResponse, content_disposition, parse_range
+from helpers.storage import StorageManager
 
 # ==========================================================
 # 1. 配置和初始化
@@ -49,8 +62,47 @@ for directory in [STORAGE_DIR, TEMP_DIR, LOG_DIR]:
     directory.mkdir(exist_ok=True)
     logger.info(f"Directory '{directory}' ready.")
 
-# [全新!] 任务状态管理器 - 更完善的状态跟踪
-DOWNLOAD_TASKS: Dict[str, Dict[str, Any]] = {}
+# [升级!] 任务状态管理器 - SQLite(WAL) 持久化，进程崩溃后任务状态不丢失
+TASK_STORE = TaskStore(LOG_DIR / "tasks.db")
+
+# [全新!] 频道媒体索引 - 列表接口直接由本地索引回答，只向 Telegram 增量同步
+CHANNEL_INDEX = ChannelIndex(LOG_DIR / "channel_index.db")
+CHANNEL_LOCKS: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+# [全新!] 列表接口支持的媒体类型，由 Telegram 服务端按类型过滤消息
+MEDIA_FILTERS = {
+    "video": enums.MessagesFilter.VIDEO,
+    "document": enums.MessagesFilter.DOCUMENT,
+    "audio": enums.MessagesFilter.AUDIO,
+    "photo": enums.MessagesFilter.PHOTO,
+}
+
+# [全新!] 按 file_unique_id 寻址的文件仓库，相同文件只下载一次
+BLOB_STORE = BlobStore(STORAGE_DIR / "blobs")
+
+# [全新!] 磁盘配额管理 - 空间不足时按最久未访问淘汰已下载文件，并清理崩溃残留的 .temp 文件
+STORAGE = StorageManager(
+    [BLOB_STORE.root, TEMP_DIR],
+    quota=PyroConf.STORAGE_QUOTA_MB * 1024 * 1024,
+    min_free=PyroConf.STORAGE_MIN_FREE_MB * 1024 * 1024
+)
+
+# [全新!] 缩略图缓存 - 内存 + 磁盘两级 LRU，重复请求不再访问 Telegram
+THUMB_CACHE = ThumbnailCache(
+    STORAGE_DIR / "thumbnails",
+    max_bytes=BackendConf.THUMB_CACHE_SIZE_MB * 1024 * 1024,
+    memory_items=BackendConf.THUMB_MEMORY_ITEMS
+)
+
+# [全新!] 优先级下载调度器 - 限制并发，按优先级/先进先出顺序执行
+scheduler = DownloadScheduler(
+    workers=BackendConf.DOWNLOAD_WORKERS,
+    max_queue=BackendConf.DOWNLOAD_QUEUE_SIZE,
+    per_chat=BackendConf.PER_CHAT_DOWNLOADS
+)
+
+# [全新!] 任务事件推送 (SSE)，进度事件按任务节流
+EVENTS = ProgressBroker(min_interval=BackendConf.EVENT_MIN_INTERVAL)
 
 # 任务状态常量
 class TaskStatus:
@@ -60,6 +112,38 @@ class TaskStatus:
     FAILED = "failed"
     EXPIRED = "expired"
 
+FINISHED_STATUSES = {TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.EXPIRED}
+
+# [全新!] Prometheus 指标 - 队列、缓存等状态在抓取时读取，热路径没有额外开销
+REGISTRY.gauge_callback(
+    "rcdl_download_queue", "Backend download tasks by scheduler state.",
+    lambda: [({"state": state}, scheduler.stats()[state]) for state in ("queued", "running")],
+)
+REGISTRY.counter_callback(
+    "rcdl_cache_requests_total", "Cache lookups by result.",
+    lambda: cache_samples(blob=BLOB_STORE, thumbnail=THUMB_CACHE),
+)
+REGISTRY.counter_callback(
+    "rcdl_blob_coalesced_total", "Downloads that joined an identical in-flight download.",
+    lambda: [({}, BLOB_STORE.coalesced)],
+)
+REGISTRY.gauge_callback(
+    "rcdl_storage_bytes", "Disk space used and reserved by downloads.",
+    lambda: [({"state": "used"}, STORAGE.usage()), ({"state": "reserved"}, STORAGE.reserved())],
+)
+REGISTRY.counter_callback(
+    "rcdl_storage_evicted_bytes_total", "Bytes of downloads evicted to make room.",
+    lambda: [({}, STORAGE.evicted_bytes)],
+)
+REGISTRY.gauge_callback(
+    "rcdl_session_in_flight", "Calls in flight per user session.",
+    lambda: [({"session": session["name"]}, session["in_flight"]) for session in USERS.stats()],
+)
+REGISTRY.gauge_callback(
+    "rcdl_event_subscribers", "Open Server-Sent Events streams.",
+    lambda: [({}, EVENTS.subscriber_count)],
+)
+
 app = FastAPI(
     title="Telegram Media Backend",
     version="3.0.0",
@@ -76,12 +160,24 @@ app.add_middleware(
 
 # Pyrogram 客户端初始化
 try:
-    user = Client(
-        "user_session",
-        api_id=PyroConf.API_ID,
-        api_hash=PyroConf.API_HASH,
-        session_string=PyroConf.SESSION_STRING
-    )
+    # [全新!] 多账号会话池：SESSION_STRINGS 中的每个账号一个客户端，下载和列表请求分摊到负载最低的账号
+    USERS = SessionPool([
+        Client(
+            name,
+            api_id=PyroConf.API_ID,
+            api_hash=PyroConf.API_HASH,
+            session_string=session_string,
+            max_concurrent_transmissions=PyroConf.MAX_CONCURRENT_TRANSMISSIONS
+        )
+        for name, session_string in zip(session_names(len(PyroConf.SESSION_STRINGS)), PyroConf.SESSION_STRINGS)
+    ])
+    user = USERS.primary
+    # [全新!] 所有 Telegram 请求经过限速器：按方法类别令牌桶限速，遇到 FloodWait 自动等待并降速
+    RATE_LIMITERS = [
+        RateLimiter("user" if index == 0 else f"user_{index + 1}").attach(client)
+        for index, client in enumerate(USERS.clients)
+    ]
+    RATE_LIMITER = RATE_LIMITERS[0]
     logger.info("Pyrogram client initialized successfully.")
 except Exception as e:
     logger.error(f"Failed to initialize Pyrogram client: {e}")
@@ -109,6 +205,7 @@ class TaskResponse(BaseModel):
     file_path: Optional[str] = None
     file_size: Optional[int] = None
     error: Optional[str] = None
+    queue_position: Optional[int] = None
     estimated_completion: Optional[str] = None
 
 # ==========================================================
@@ -119,15 +216,25 @@ class TaskResponse(BaseModel):
 async def startup_event():
     """应用启动时的初始化工作"""
     try:
-        await user.start()
+        await USERS.start()
         me = await user.get_me()
-        logger.info(f"🚀 Pyrogram client started successfully as '{me.first_name}' (ID: {me.id})")
+        logger.info(f"🚀 Pyrogram client started successfully as '{me.first_name}' (ID: {me.id}), {len(USERS)} session(s)")
         
         # 清理过期任务
         await cleanup_expired_tasks()
         
-        # 启动定时清理任务
+        # 任务状态变化时推送事件
+        TASK_STORE.add_listener(_publish_task_change)
+        
+        # 启动下载调度器，并重新排队上次中断的任务
+        TASK_STORE.start()
+        scheduler.start(_process_download_task)
+        await requeue_interrupted_tasks()
+        
+        # 启动定时清理任务和索引核对任务
         asyncio.create_task(periodic_cleanup())
+        asyncio.create_task(periodic_reconcile())
+        asyncio.create_task(STORAGE.maintain())
         
         logger.info("✅ Backend startup completed successfully.")
         
@@ -139,11 +246,12 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭时的清理工作"""
     try:
-        await user.stop()
+        await scheduler.stop()
+        await USERS.stop()
         logger.info("🛑 Pyrogram client stopped gracefully.")
         
-        # 保存未完成任务状态到文件
-        await save_tasks_state()
+        # 写入缓冲中的进度并关闭任务数据库
+        await TASK_STORE.close()
         
     except Exception as e:
         logger.error(f"❌ Shutdown error: {e}")
@@ -155,15 +263,15 @@ async def shutdown_event():
 async def cleanup_expired_tasks():
     """清理过期的任务"""
     current_time = time.time()
-    expired_tasks = []
     
-    for task_id, task_info in DOWNLOAD_TASKS.items():
-        # 任务超过1小时未完成则标记为过期
-        if current_time - task_info.get('created_at', 0) > 3600:
-            expired_tasks.append(task_id)
+    # 任务超过1小时则标记为过期
+    expired_tasks = TASK_STORE.ids_with_status(
+        (TaskStatus.PENDING, TaskStatus.PROCESSING, TaskStatus.COMPLETED, TaskStatus.FAILED),
+        created_before=current_time - 3600
+    )
     
     for task_id in expired_tasks:
-        DOWNLOAD_TASKS[task_id]['status'] = TaskStatus.EXPIRED
+        TASK_STORE.update(task_id, {"status": TaskStatus.EXPIRED})
         logger.warning(f"⏰ Task {task_id} marked as expired")
 
 async def periodic_cleanup():
@@ -176,16 +284,28 @@ async def periodic_cleanup():
             logger.error(f"Periodic cleanup error: {e}")
             await asyncio.sleep(60)
 
-async def save_tasks_state():
-    """保存任务状态到文件"""
-    try:
-        import json
-        state_file = LOG_DIR / "tasks_state.json"
-        with open(state_file, 'w', encoding='utf-8') as f:
-            json.dump(DOWNLOAD_TASKS, f, indent=2, ensure_ascii=False)
-        logger.info(f"Tasks state saved to {state_file}")
-    except Exception as e:
-        logger.error(f"Failed to save tasks state: {e}")
+async def requeue_interrupted_tasks():
+    """重新排队上次运行时未完成（排队中/处理中）的任务"""
+    interrupted = TASK_STORE.ids_with_status((TaskStatus.PENDING, TaskStatus.PROCESSING))
+    
+    for task_id in interrupted:
+        task_info = TASK_STORE.update(task_id, {"status": TaskStatus.PENDING, "progress": 0.0})
+        try:
+            await scheduler.submit(
+                task_id,
+                task_info["chat_id"],
+                task_info["message_id"],
+                priority=task_info.get("priority") or 1
+            )
+        except QueueFullError:
+            TASK_STORE.update(task_id, {
+                "status": TaskStatus.FAILED,
+                "error": "Download queue full after restart",
+                "failed_at": time.time()
+            })
+    
+    if interrupted:
+        logger.info(f"♻️ Re-queued {len(interrupted)} interrupted task(s)")
 
 def format_file_size(size_bytes: int) -> str:
     """格式化文件大小显示"""
@@ -198,26 +318,349 @@ def format_file_size(size_bytes: int) -> str:
         i += 1
     return f"{size_bytes:.2f} {size_names[i]}"
 
+def _blob_suffix(file_name: str, mime_type: Optional[str] = None) -> str:
+    """仓库文件的扩展名：优先取原文件名的扩展名，其次按 MIME 类型推断，都没有时用 .bin"""
+    suffix = Path(file_name).suffix
+    if not suffix and mime_type:
+        suffix = mimetypes.guess_extension(mime_type) or ""
+    return suffix or ".bin"
+
+def _find_stored_task(chat_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+    """查找同一消息已完成且文件仍在仓库中的任务"""
+    for task_info in TASK_STORE.find(chat_id, message_id, TaskStatus.COMPLETED):
+        if task_info.get("file_path") and Path(task_info["file_path"]).is_file():
+            return task_info
+    return None
+
+def _build_task_response(task_id: str, task: Dict[str, Any]) -> TaskResponse:
+    """根据任务信息构建响应，排队中的任务附带队列位置和预计完成时间"""
+    queue_position = None
+    estimated_completion = None
+    
+    if task["status"] == TaskStatus.PENDING:
+        queue_position = scheduler.position(task_id)
+        if queue_position is not None:
+            eta = time.time() + scheduler.estimated_wait(queue_position) + scheduler.average_duration()
+            estimated_completion = datetime.datetime.fromtimestamp(eta).isoformat()
+    
+    return TaskResponse(
+        task_id=task_id,
+        status=task["status"],
+        created_at=datetime.datetime.fromtimestamp(task["created_at"]).isoformat(),
+        progress=task.get("progress"),
+        file_path=task.get("file_path"),
+        file_size=task.get("actual_file_size"),
+        error=task.get("error"),
+        queue_position=queue_position,
+        estimated_completion=estimated_completion
+    )
+
+def _task_event(task_id: str, task: Dict[str, Any]) -> Dict[str, Any]:
+    """推送给事件订阅者的任务信息（比 TaskResponse 更轻量）"""
+    event = {
+        "task_id": task_id,
+        "status": task["status"],
+        "progress": task.get("progress"),
+        "file_name": task.get("file_name"),
+        "error": task.get("error")
+    }
+    if task["status"] == TaskStatus.PENDING:
+        event["queue_position"] = scheduler.position(task_id)
+    return event
+
+def _publish_task_change(task_id: str, task: Dict[str, Any]):
+    """任务状态写入数据库时立即推送，不受节流限制"""
+    EVENTS.publish(task_id, _task_event(task_id, task), force=True)
+    if task["status"] in FINISHED_STATUSES:
+        EVENTS.forget(task_id)
+
 # ==========================================================
 # 5. 核心业务函数
 # ==========================================================
 
+def _default_file_name(media_type: str, name: Any) -> str:
+    extension = {"video": "mp4", "audio": "mp3", "photo": "jpg"}.get(media_type, "bin")
+    return f"{media_type}_{name}.{extension}"
+
+def _media_row(message, media_type: str) -> Optional[Dict[str, Any]]:
+    """提取消息中指定类型的媒体元数据，写入频道索引"""
+    media = getattr(message, media_type, None)
+    if not media:
+        return None
+    return {
+        "chat_id": message.chat.id,
+        "message_id": message.id,
+        "media_type": media_type,
+        "date": message.date.timestamp(),
+        "file_name": getattr(media, "file_name", None) or _default_file_name(media_type, message.id),
+        "file_size": media.file_size or 0,
+        "duration": getattr(media, "duration", None) or 0,
+        "caption": message.caption or "",
+        "link": message.link,
+        "has_thumbnail": bool(media.thumbs),
+        "file_unique_id": media.file_unique_id
+    }
+
+def _format_media(row: Dict[str, Any]) -> Dict[str, Any]:
+    """将索引记录转换为接口返回的媒体信息"""
+    utc = datetime.timezone.utc
+    msg_date = datetime.datetime.fromtimestamp(row["date"]).replace(tzinfo=utc)
+    duration = row["duration"]
+    minutes, seconds = divmod(int(duration), 60) if duration else (0, 0)
+    return {
+        "message_id": row["message_id"],
+        "chat_id": row["chat_id"],
+        "media_type": row["media_type"],
+        "file_name": row["file_name"],
+        "file_size_bytes": row["file_size"],
+        "file_size_formatted": format_file_size(row["file_size"]),
+        "duration_seconds": duration,
+        "duration_formatted": f"{minutes}:{seconds:02d}" if duration else "Unknown",
+        "date": msg_date.isoformat(),
+        "date_formatted": msg_date.strftime("%Y-%m-%d %H:%M:%S"),
+        "link": row["link"],
+        "caption": row["caption"],
+        "has_thumbnail": bool(row["has_thumbnail"])
+    }
+
+async def _resolve_channel(channel_id: str) -> int:
+    """把频道用户名或ID解析为数字ID，用户名映射缓存在索引中"""
+    try:
+        return int(channel_id)
+    except ValueError:
+        pass
+    
+    chat_id = CHANNEL_INDEX.resolve(channel_id)
+    if chat_id is None:
+        with stage("resolve"):
+            chat = await USERS.call(channel_id, lambda client: client.get_chat(channel_id))
+        chat_id = chat.id
+        CHANNEL_INDEX.remember_alias(channel_id, chat_id)
+    return chat_id
+
+async def _search_media(
+    chat_id: int,
+    media_type: str,
+    limit: int,
+    offset_id: int = 0,
+    offset_date: Optional[datetime.datetime] = None,
+    min_id: int = 0
+):
+    """按媒体类型在服务端搜索消息（从新到旧），只返回该类型的消息
+    
+    代替 get_chat_history 遍历全部消息后在本地筛选，文字、贴纸等消息不再占用请求。
+    """
+    async def resolve(client: Client):
+        return client, await client.resolve_peer(chat_id)
+    
+    # 整个搜索使用同一个能访问该频道的账号，分页偏移只对该账号有效
+    with stage("resolve"):
+        client, peer = await USERS.call(chat_id, resolve)
+    max_date = int(offset_date.timestamp()) if offset_date else 0
+    remaining = limit
+    
+    while remaining > 0:
+        with stage("search"):
+            async with USERS.lease(chat_id, client):
+                r = await client.invoke(
+                    raw.functions.messages.Search(
+                        peer=peer,
+                        q="",
+                        filter=MEDIA_FILTERS[media_type].value(),
+                        min_date=0,
+                        max_date=max_date,
+                        offset_id=offset_id,
+                        add_offset=0,
+                        limit=min(100, remaining),
+                        max_id=0,
+                        min_id=min_id,
+                        hash=0
+                    ),
+                    sleep_threshold=60
+                )
+        messages = await utils.parse_messages(client, r, replies=0)
+        if not messages:
+            return
+        
+        for message in messages:
+            yield message
+        remaining -= len(messages)
+        offset_id = messages[-1].id
+
+async def _index_history(chat_id: int, media_type: str, limit: int, stop_before: float, **search_kwargs):
+    """搜索指定类型的媒体消息（从新到旧）并写入索引
+    
+    返回 (获取消息数, 最旧消息ID, 最旧消息时间, 最新消息ID, 是否已到达历史尽头)
+    """
+    rows = []
+    processed = 0
+    low_id = high_id = None
+    low_date = 0.0
+    exhausted = True
+    
+    async for message in _search_media(chat_id, media_type, limit, **search_kwargs):
+        processed += 1
+        if high_id is None:
+            high_id = message.id
+        low_id, low_date = message.id, message.date.timestamp()
+        
+        row = _media_row(message, media_type)
+        if row:
+            rows.append(row)
+        if len(rows) >= 200:
+            CHANNEL_INDEX.upsert(rows)
+            rows = []
+        
+        if processed % 100 == 0:
+            logger.info(f"📊 Indexed {processed} {media_type} messages from chat {chat_id}")
+        
+        # 已经早于需要的开始日期，停止遍历
+        if low_date < stop_before:
+            exhausted = False
+            break
+    else:
+        exhausted = processed < limit
+    
+    CHANNEL_INDEX.upsert(rows)
+    return processed, low_id, low_date, high_id, exhausted
+
+async def _sync_channel_index(
+    chat_id: int, media_type: str, start_ts: float, end_ts: float, limit: int
+) -> int:
+    """同步频道中指定类型的媒体索引，保证 [start_ts, end_ts) 范围被索引覆盖，返回从 Telegram 获取的消息数
+    
+    历史日期范围通过 offset_date 直接定位到 end_ts，遍历到 start_ts 即停止，
+    开销只与范围内的消息数有关，而与频道的历史长度无关。
+    """
+    
+    async with CHANNEL_LOCKS[chat_id]:
+        now = time.time()
+        processed = 0
+        synced_at = CHANNEL_INDEX.channel_state(chat_id, media_type)["synced_at"]
+        
+        # 请求范围涉及最新消息时才需要同步频道头部
+        if end_ts > now - BackendConf.INDEX_SYNC_INTERVAL:
+            if synced_at is None or now - synced_at > BackendConf.INDEX_SYNC_INTERVAL:
+                # 增量同步：只获取比已索引最大ID更新的消息
+                top = CHANNEL_INDEX.head_span(chat_id, media_type)
+                count, low_id, low_date, high_id, exhausted = await _index_history(
+                    chat_id, media_type, limit, start_ts, min_id=top["high_id"] if top else 0
+                )
+                processed += count
+                if exhausted:
+                    # 新消息与已有索引相连（或已到达历史尽头）
+                    low_id, low_date = (top["low_id"], top["low_date"]) if top else (0, 0.0)
+                    high_id = max(high_id or 0, top["high_id"] if top else 0)
+                CHANNEL_INDEX.add_span(chat_id, media_type, low_id, high_id, low_date, now)
+                if synced_at is None:
+                    CHANNEL_INDEX.mark(chat_id, media_type, "reconciled_at")
+                # 与头部区段的 high_date 使用同一时间，间隔内的请求才能完全由索引回答
+                CHANNEL_INDEX.mark(chat_id, media_type, "synced_at", now)
+            else:
+                # 刚同步过，接受最多 INDEX_SYNC_INTERVAL 秒的延迟
+                end_ts = min(end_ts, synced_at)
+        
+        while processed < limit and not CHANNEL_INDEX.covers(chat_id, media_type, start_ts, end_ts):
+            spans = CHANNEL_INDEX.spans(chat_id, media_type)
+            containing = next((s for s in spans if s["low_date"] <= end_ts <= s["high_date"]), None)
+            
+            if containing is None:
+                # 范围结束日期不在索引中：直接定位到 end_ts，向旧消息遍历
+                below = next((s for s in spans if s["high_date"] < end_ts), None)
+                count, low_id, low_date, high_id, exhausted = await _index_history(
+                    chat_id, media_type, limit - processed, start_ts,
+                    offset_date=datetime.datetime.fromtimestamp(end_ts),
+                    min_id=below["high_id"] if below else 0
+                )
+                processed += count
+                if exhausted:
+                    low_id, low_date = (below["low_id"], below["low_date"]) if below else (0, 0.0)
+                    high_id = high_id or (below["high_id"] if below else 0)
+                elif not count:
+                    break
+                CHANNEL_INDEX.add_span(chat_id, media_type, low_id, high_id, low_date, end_ts)
+                continue
+            
+            # 结束日期已覆盖但开始日期没有：从该区段底部继续向旧消息回填
+            if containing["low_id"] <= 1:
+                break
+            below = next((s for s in spans if s["high_id"] < containing["low_id"]), None)
+            count, low_id, low_date, _, exhausted = await _index_history(
+                chat_id, media_type, limit - processed, start_ts,
+                offset_id=containing["low_id"],
+                min_id=below["high_id"] if below else 0
+            )
+            processed += count
+            if exhausted:
+                low_id, low_date = (below["low_id"], below["low_date"]) if below else (0, 0.0)
+            elif not count:
+                break
+            CHANNEL_INDEX.add_span(
+                chat_id, media_type, low_id, containing["low_id"], low_date, containing["high_date"]
+            )
+        
+        return processed
+
+async def _reconcile_channel(chat_id: int, media_type: str):
+    """核对已索引的消息，删除已被删除的媒体，更新被编辑的说明文字"""
+    
+    async with CHANNEL_LOCKS[chat_id]:
+        after_id = 0
+        removed = updated = 0
+        while True:
+            message_ids = CHANNEL_INDEX.message_ids(chat_id, media_type, after_id, limit=200)
+            if not message_ids:
+                break
+            after_id = message_ids[-1]
+            
+            with stage("get_messages"):
+                messages = await USERS.call(chat_id, lambda client: client.get_messages(chat_id, message_ids))
+            rows, gone = [], []
+            for message_id, message in zip(message_ids, messages):
+                row = _media_row(message, media_type) if message and not message.empty else None
+                if row:
+                    rows.append(row)
+                else:
+                    gone.append(message_id)
+            
+            CHANNEL_INDEX.upsert(rows)
+            CHANNEL_INDEX.delete(chat_id, gone)
+            updated += len(rows)
+            removed += len(gone)
+        
+        CHANNEL_INDEX.mark(chat_id, media_type, "reconciled_at")
+        logger.info(f"🔁 Reconciled {media_type} index of chat {chat_id}: {updated} checked, {removed} removed")
+
+async def periodic_reconcile():
+    """定期核对频道索引（编辑/删除）"""
+    while True:
+        await asyncio.sleep(BackendConf.INDEX_RECONCILE_INTERVAL / 4)
+        try:
+            stale = CHANNEL_INDEX.channels_to_reconcile(time.time() - BackendConf.INDEX_RECONCILE_INTERVAL)
+            for chat_id, media_type in stale:
+                await _reconcile_channel(chat_id, media_type)
+        except Exception as e:
+            logger.error(f"Index reconcile error: {e}")
+
 async def _fetch_videos_from_channel(
     channel_id: str,
     limit: int,
     date_from: Optional[str] = None,
-    date_to: Optional[str] = None
+    date_to: Optional[str] = None,
+    media_type: str = "video"
 ) -> Dict[str, Any]:
-    """从频道获取视频列表的核心函数"""
+    """从频道获取媒体列表的核心函数（由本地索引回答，只向 Telegram 获取增量）"""
+    
+    if media_type not in MEDIA_FILTERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported media_type '{media_type}', expected one of: {', '.join(MEDIA_FILTERS)}"
+        )
     
-    logger.info(f"🔍 Fetching videos from channel '{channel_id}' (limit: {limit})")
+    logger.info(f"🔍 Fetching {media_type} from channel '{channel_id}' (limit: {limit})")
     
     try:
-        # 尝试解析为整数ID，否则使用字符串用户名
-        try:
-            chat_id = int(channel_id)
-        except ValueError:
-            chat_id = channel_id
+        chat_id = await _resolve_channel(channel_id)
             
         # 处理日期范围
         utc = datetime.timezone.utc
@@ -229,58 +672,22 @@ async def _fetch_videos_from_channel(
             (datetime.datetime.fromisoformat(date_to) + datetime.timedelta(days=1)).replace(tzinfo=utc)
             if date_to else datetime.datetime.now(utc)
         )
+        # 消息时间按本地时间比较，与 Pyrogram 的 message.date 保持一致
+        start_ts = start_date.replace(tzinfo=None).timestamp() if date_from else 0.0
+        end_ts = end_date.replace(tzinfo=None).timestamp() if date_to else time.time()
         
-        video_list = []
-        processed_count = 0
+        processed_count = await _sync_channel_index(chat_id, media_type, start_ts, end_ts, limit)
+        media_list = [_format_media(row) for row in CHANNEL_INDEX.query(chat_id, media_type, start_ts, end_ts, limit)]
         
-        # 获取消息历史
-        async for message in user.get_chat_history(chat_id, limit=limit):
-            processed_count += 1
-            
-            if processed_count % 100 == 0:
-                logger.info(f"📊 Processed {processed_count} messages, found {len(video_list)} videos")
-            
-            msg_date = message.date.replace(tzinfo=utc)
-            
-            # 如果消息早于开始日期，停止搜索
-            if msg_date < start_date:
-                logger.info(f"⏹️ Reached start date limit, stopping search")
-                break
-            
-            # 检查是否为视频且在日期范围内
-            if message.video and start_date <= msg_date < end_date:
-                video_obj = message.video
-                
-                # 安全地获取视频属性
-                file_name = getattr(video_obj, 'file_name', f"video_{message.id}.mp4")
-                file_size = getattr(video_obj, 'file_size', 0)
-                duration = getattr(video_obj, 'duration', 0)
-                minutes, seconds = divmod(int(duration), 60) if duration else (0, 0)
-                video_info = {
-                    "message_id": message.id,
-                    "chat_id": message.chat.id,
-                    "file_name": file_name,
-                    "file_size_bytes": file_size,
-                    "file_size_formatted": format_file_size(file_size),
-                    "duration_seconds": duration,
-                    "duration_formatted": f"{minutes}:{seconds:02d}" 
-                    if duration 
-                        else "Unknown",
-                    "date": msg_date.isoformat(),
-                    "date_formatted": msg_date.strftime("%Y-%m-%d %H:%M:%S"),
-                    "link": message.link,
-                    "caption": message.caption or "",
-                    "has_thumbnail": hasattr(video_obj, 'thumbnail') and video_obj.thumbnail is not None
-                }
-                
-                video_list.append(video_info)
-        
-        logger.info(f"✅ Successfully found {len(video_list)} videos from {processed_count} messages")
+        logger.info(f"✅ Successfully found {len(media_list)} {media_type} ({processed_count} messages fetched from Telegram)")
         
+        # "videos" 键名保持不变，兼容现有前端
         return {
-            "videos": video_list,
-            "total_found": len(video_list),
+            "media_type": media_type,
+            "videos": media_list,
+            "total_found": len(media_list),
             "messages_processed": processed_count,
+            "indexed_videos": CHANNEL_INDEX.count(chat_id, media_type),
             "date_range": {
                 "from": start_date.isoformat(),
                 "to": end_date.isoformat()
@@ -288,18 +695,25 @@ async def _fetch_videos_from_channel(
         }
         
     except Exception as e:
-        logger.error(f"❌ Error fetching videos from channel '{channel_id}': {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to fetch videos: {str(e)}")
+        logger.error(f"❌ Error fetching {media_type} from channel '{channel_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch {media_type}: {str(e)}")
 
 async def _process_download_task(task_id: str, chat_id: int, message_id: int):
     """后台下载任务的核心处理函数"""
     
     task_start_time = time.time()
+    
+    # 排队期间已过期或被删除的任务不再处理
+    task_info = TASK_STORE.get(task_id)
+    if not task_info or task_info["status"] != TaskStatus.PENDING:
+        logger.info(f"⏭️ [Task {task_id}] Skipped, no longer pending")
+        return
+    
     logger.info(f"🔄 [Task {task_id}] Starting download for message {message_id} from chat {chat_id}")
     
     try:
         # 更新任务状态为处理中
-        DOWNLOAD_TASKS[task_id].update({
+        TASK_STORE.update(task_id, {
             "status": TaskStatus.PROCESSING,
             "started_at": task_start_time,
             "progress": 0.1
@@ -307,49 +721,73 @@ async def _process_download_task(task_id: str, chat_id: int, message_id: int):
         
         # 获取消息
         logger.debug(f"[Task {task_id}] Fetching message...")
-        message = await user.get_messages(chat_id, message_id)
+        with stage("get_messages"):
+            message = await USERS.call(chat_id, lambda client: client.get_messages(chat_id, message_id))
         
-        if not message or not message.video:
-            raise ValueError("Message not found or does not contain video")
+        media_type = next((t for t in MEDIA_FILTERS if getattr(message, t, None)), None) if message else None
+        if not media_type:
+            raise ValueError("Message not found or does not contain downloadable media")
         
-        # 获取视频信息
-        video = message.video
-        file_name = getattr(video, 'file_name', f"video_{chat_id}_{message_id}.mp4")
-        file_size = getattr(video, 'file_size', 0)
+        # 获取媒体信息
+        media = getattr(message, media_type)
+        default_name = _default_file_name(media_type, f"{chat_id}_{message_id}")
+        file_name = getattr(media, 'file_name', None) or default_name
+        file_size = getattr(media, 'file_size', 0)
         
         # 确保文件名安全
         safe_file_name = "".join(c for c in file_name if c.isalnum() or c in "._-").rstrip()
         if not safe_file_name:
-            safe_file_name = f"video_{chat_id}_{message_id}.mp4"
+            safe_file_name = default_name
         
-        file_path = STORAGE_DIR / safe_file_name
+        # 文件按 file_unique_id 存储，不同视频重名也不会互相覆盖
+        suffix = _blob_suffix(safe_file_name, getattr(media, "mime_type", None))
+        cached = BLOB_STORE.lookup(media.file_unique_id, suffix) is not None
         
         # 更新任务信息
-        DOWNLOAD_TASKS[task_id].update({
+        TASK_STORE.update(task_id, {
             "progress": 0.2,
             "file_name": safe_file_name,
+            "file_unique_id": media.file_unique_id,
+            "blob_suffix": suffix,
             "file_size": file_size,
-            "file_size_formatted": format_file_size(file_size)
+            "file_size_formatted": format_file_size(file_size),
+            "cached": cached
         })
         
-        logger.info(f"[Task {task_id}] Downloading '{safe_file_name}' ({format_file_size(file_size)})")
+        if cached:
+            logger.info(f"[Task {task_id}] '{safe_file_name}' already stored, skipping download")
+        else:
+            logger.info(f"[Task {task_id}] Downloading '{safe_file_name}' ({format_file_size(file_size)})")
         
-        # 下载文件
-        await user.download_media(
-            message=message,
-            file_name=str(file_path),
-            progress=lambda current, total: _update_download_progress(task_id, current, total)
-        )
+        # 下载文件（同一文件的并发请求共享同一次下载，大文件多连接分段并行下载）
+        # 先预留磁盘空间，空间不足时淘汰旧文件或排队等待，超时则任务失败
+        async def download(path: Path, progress):
+            async with STORAGE.reserve(file_size, path=path, timeout=BackendConf.STORAGE_WAIT):
+                # 文件引用只对获取该消息的账号有效，由它下载
+                async with USERS.lease(chat_id, message._client) as client:
+                    await download_parallel(
+                        client,
+                        message,
+                        str(path),
+                        connections=PyroConf.DOWNLOAD_CONNECTIONS,
+                        segment_size=PyroConf.DOWNLOAD_SEGMENT_MB * 1024 * 1024,
+                        progress=progress
+                    )
         
-        # 验证下载完成
-        if not file_path.exists():
-            raise FileNotFoundError("Downloaded file not found")
+        meter = SpeedMeter()
+        file_path = await BLOB_STORE.fetch(
+            media.file_unique_id,
+            suffix,
+            download,
+            progress=lambda current, total: _update_download_progress(task_id, meter, current, total)
+        )
         
+        STORAGE.touch(file_path)
         actual_size = file_path.stat().st_size
         download_time = time.time() - task_start_time
         
         # 更新任务状态为完成
-        DOWNLOAD_TASKS[task_id].update({
+        TASK_STORE.update(task_id, {
             "status": TaskStatus.COMPLETED,
             "progress": 1.0,
             "file_path": str(file_path),
@@ -367,20 +805,33 @@ async def _process_download_task(task_id: str, chat_id: int, message_id: int):
         logger.error(f"❌ [Task {task_id}] Download failed: {error_msg}", exc_info=True)
         
         # 更新任务状态为失败
-        DOWNLOAD_TASKS[task_id].update({
+        TASK_STORE.update(task_id, {
             "status": TaskStatus.FAILED,
             "error": error_msg,
             "failed_at": time.time()
         })
 
-def _update_download_progress(task_id: str, current: int, total: int):
-    """更新下载进度"""
-    if task_id in DOWNLOAD_TASKS and total > 0:
-        progress = 0.2 + (current / total) * 0.8  # 20% 为准备阶段，80% 为下载阶段
-        DOWNLOAD_TASKS[task_id]["progress"] = progress
-        
-        if current % (total // 10) == 0:  # 每10%记录一次
-            logger.debug(f"[Task {task_id}] Progress: {progress:.1%} ({format_file_size(current)}/{format_file_size(total)})")
+def _update_download_progress(task_id: str, meter: SpeedMeter, current: int, total: int):
+    """更新下载进度（速度与剩余时间经平滑计算）"""
+    if total <= 0:
+        return
+    previous = meter.current
+    meter.update(current, total)
+    progress = 0.2 + meter.fraction * 0.8  # 20% 为准备阶段，80% 为下载阶段
+    task = TASK_STORE.update(task_id, {"progress": progress})  # 进度批量写入数据库
+    if task:
+        eta = meter.eta()
+        event = _task_event(task_id, task)
+        event.update(
+            downloaded=current,
+            total=total,
+            speed=round(meter.speed),
+            eta=round(eta) if eta is not None else None,
+        )
+        EVENTS.publish(task_id, event)
+    
+    if current * 10 // total > previous * 10 // total:  # 每跨过10%记录一次
+        logger.debug(f"[Task {task_id}] Progress: {progress:.1%} ({format_file_size(current)}/{format_file_size(total)})")
 
 # ==========================================================
 # 6. API 端点
@@ -403,8 +854,14 @@ async def health_check():
             "status": "healthy",
             "version": "3.0.0",
             "user": f"{me.first_name} ({me.id})",
-            "active_tasks": len([t for t in DOWNLOAD_TASKS.values() if t["status"] == TaskStatus.PROCESSING]),
-            "total_tasks": len(DOWNLOAD_TASKS)
+            "active_tasks": TASK_STORE.count(TaskStatus.PROCESSING),
+            "total_tasks": TASK_STORE.count(),
+            "scheduler": scheduler.stats(),
+            "thumbnails": THUMB_CACHE.stats(),
+            "storage": STORAGE.stats(),
+            "event_subscribers": EVENTS.subscriber_count,
+            "sessions": USERS.stats(),
+            "rate_limiter": RATE_LIMITER.summary()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -413,10 +870,26 @@ async def health_check():
             content={"status": "unhealthy", "error": str(e)}
         )
 
+@app.get("/metrics")
+async def metrics():
+    """[全新!] Prometheus 文本格式的运行指标"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/ratelimit")
+async def rate_limit_state(session: str = "user"):
+    """[全新!] 各类 Telegram 请求的限速状态（当前速率、暂停剩余时间、FloodWait 次数）
+    
+    多账号时用 session 参数指定账号（user、user_2 ...），默认为第一个账号。
+    """
+    limiter = next((limiter for limiter in RATE_LIMITERS if limiter.name == session), None)
+    if limiter is None:
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session}")
+    return limiter.stats()
+
 # --- 下载相关API ---
 
 @app.post("/api/download/request", response_model=TaskResponse)
-async def request_download(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def request_download(request: DownloadRequest):
     """提交下载请求"""
     
     logger.info(f"📥 Received download request: chat_id={request.chat_id}, message_id={request.message_id}")
@@ -438,24 +911,57 @@ async def request_download(request: DownloadRequest, background_tasks: Backgroun
             "error": None
         }
         
-        DOWNLOAD_TASKS[task_id] = task_info
+        # 同一消息的文件已在仓库中，直接完成任务，无需排队
+        stored = _find_stored_task(request.chat_id, request.message_id)
+        if stored:
+            task_info.update({
+                "status": TaskStatus.COMPLETED,
+                "progress": 1.0,
+                "cached": True,
+                "completed_at": current_time,
+                **{key: stored.get(key) for key in (
+                    "file_path", "file_name", "file_unique_id", "file_size", "actual_file_size"
+                )}
+            })
+            TASK_STORE.create(task_id, task_info)
+            logger.info(f"⚡ Download task {task_id} served from storage: {stored['file_path']}")
+            return _build_task_response(task_id, task_info)
         
-        # 添加后台任务
-        background_tasks.add_task(
-            _process_download_task,
-            task_id,
-            request.chat_id,
-            request.message_id
-        )
+        # 加入调度队列，队列已满时返回 429
+        # 先检查队列容量再创建任务，被拒绝的请求不会推送给事件订阅者
+        try:
+            scheduler.check_capacity()
+            TASK_STORE.create(task_id, task_info)
+            try:
+                await scheduler.submit(
+                    task_id,
+                    request.chat_id,
+                    request.message_id,
+                    priority=request.priority
+                )
+            except QueueFullError as e:
+                # 检查之后队列被并发请求占满：先推送失败状态，订阅者不会留下一直等待的任务
+                TASK_STORE.update(task_id, {
+                    "status": TaskStatus.FAILED,
+                    "error": str(e),
+                    "failed_at": time.time()
+                })
+                TASK_STORE.delete(task_id)
+                raise
+        except QueueFullError as e:
+            logger.warning(f"🚦 Download queue full, rejecting request (retry after {e.retry_after}s)")
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
         
         logger.info(f"✅ Download task created with ID: {task_id}")
         
-        return TaskResponse(
-            task_id=task_id,
-            status=TaskStatus.PENDING,
-            created_at=datetime.datetime.fromtimestamp(current_time).isoformat()
-        )
+        return _build_task_response(task_id, task_info)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Failed to create download task: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create download task: {str(e)}")
@@ -464,28 +970,123 @@ async def request_download(request: DownloadRequest, background_tasks: Backgroun
 async def get_download_status(task_id: str):
     """查询下载任务状态"""
     
-    task = DOWNLOAD_TASKS.get(task_id)
+    task = TASK_STORE.get(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return TaskResponse(
-        task_id=task_id,
-        status=task["status"],
-        created_at=datetime.datetime.fromtimestamp(task["created_at"]).isoformat(),
-        progress=task.get("progress"),
-        file_path=task.get("file_path"),
-        file_size=task.get("actual_file_size"),
-        error=task.get("error")
+    return _build_task_response(task_id, task)
+
+async def _task_event_stream(task_id: Optional[str] = None):
+    """SSE 事件流：task_id 为空时推送所有任务的事件，否则推送单个任务直到其结束"""
+    with EVENTS.subscribe(task_id) as queue:
+        # 先订阅再取快照，避免漏掉两者之间的事件
+        if task_id is not None:
+            task = TASK_STORE.get(task_id)
+            if not task:
+                return
+            yield format_sse(_task_event(task_id, task))
+            if task["status"] in FINISHED_STATUSES:
+                return
+        
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                # 心跳，防止代理断开空闲连接
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+            if task_id is not None and event["status"] in FINISHED_STATUSES:
+                return
+
+def _event_response(task_id: Optional[str] = None) -> StreamingResponse:
+    return StreamingResponse(
+        _task_event_stream(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/download/events")
+async def all_task_events():
+    """[全新!] 订阅所有任务的状态和进度事件 (Server-Sent Events)"""
+    return _event_response()
+
+@app.get("/api/download/events/{task_id}")
+async def task_events(task_id: str):
+    """[全新!] 订阅单个任务的状态和进度事件，任务结束后关闭连接"""
+    if not TASK_STORE.get(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _event_response(task_id)
+
+async def _stream_in_progress(task_id: str, task: Dict[str, Any], request: Request):
+    """边下边传：跟随正在下载的文件，把已到达的字节推送给客户端"""
+    
+    # 排队中的任务需要等待开始处理，拿到 file_unique_id 后才能定位文件
+    deadline = time.time() + BackendConf.STREAM_START_TIMEOUT
+    while not task.get("file_unique_id"):
+        if task["status"] in (TaskStatus.FAILED, TaskStatus.EXPIRED):
+            raise HTTPException(status_code=400, detail=task.get("error") or f"Task {task['status']}")
+        if time.time() > deadline:
+            raise HTTPException(status_code=504, detail="Task did not start in time")
+        await asyncio.sleep(0.5)
+        task = TASK_STORE.get(task_id) or task
+    
+    unique_id = task["file_unique_id"]
+    # 与下载时使用的扩展名一致，旧任务没有记录时按文件名推断
+    suffix = task.get("blob_suffix") or _blob_suffix(task["file_name"])
+    
+    # 文件已经在仓库中，直接按普通文件返回
+    stored = BLOB_STORE.lookup(unique_id, suffix)
+    if stored and not BLOB_STORE.is_downloading(unique_id, suffix):
+        return RangeFileResponse(stored, request.headers, filename=task["file_name"], method=request.method)
+    
+    file_size = task.get("file_size") or 0
+    if not file_size:
+        raise HTTPException(status_code=400, detail="File size unknown, wait for the download to complete")
+    
+    status_code = 200
+    start, end = 0, file_size - 1
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(task["file_name"])
+    }
+    if "range" in request.headers:
+        try:
+            parsed = parse_range(request.headers["range"], file_size)
+        except ValueError:
+            raise HTTPException(
+                status_code=416,
+                detail="Range not satisfiable",
+                headers={"Content-Range": f"bytes */{file_size}"}
+            )
+        if parsed:
+            start, end = parsed
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    logger.info(f"📡 [Task {task_id}] Streaming in-progress download from byte {start}")
+    
+    if request.method == "HEAD":
+        return StreamingResponse(iter(()), status_code=status_code, media_type="application/octet-stream", headers=headers)
+    return StreamingResponse(
+        BLOB_STORE.tail(unique_id, suffix, start, end),
+        status_code=status_code,
+        media_type="application/octet-stream",
+        headers=headers
     )
 
-@app.get("/api/download/fetch/{task_id}")
-async def fetch_downloaded_file(task_id: str):
-    """提取已下载的文件"""
+@app.api_route("/api/download/fetch/{task_id}", methods=["GET", "HEAD"])
+async def fetch_downloaded_file(task_id: str, request: Request, stream: bool = False):
+    """提取已下载的文件，支持 Range 断点续传；stream=true 时可在下载完成前边下边传"""
     
-    task = DOWNLOAD_TASKS.get(task_id)
+    task = TASK_STORE.get(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    if stream and task["status"] in (TaskStatus.PENDING, TaskStatus.PROCESSING):
+        return await _stream_in_progress(task_id, task, request)
+    
     if task["status"] != TaskStatus.COMPLETED:
         raise HTTPException(
             status_code=400,
@@ -493,34 +1094,36 @@ async def fetch_downloaded_file(task_id: str):
         )
     
     file_path = Path(task.get("file_path"))
+    download_name = task.get("file_name") or file_path.name
 
 
     # 1. 在提供服务前，进行最终的、严格的文件验证
+    if not file_path.exists() and task.get("file_unique_id"):
+        # 文件因磁盘配额被淘汰，任务过期，重新提交即可再次下载
+        TASK_STORE.update(task_id, {"status": TaskStatus.EXPIRED})
+        raise HTTPException(status_code=410, detail="File was removed to free up space. Please request it again.")
     if not file_path or not file_path.is_file() or file_path.stat().st_size == 0:
         logger.error(f"Attempted to serve an invalid file for task {task_id}: {file_path}")
         # 如果文件无效，将任务状态更新为失败
-        task["status"] = TaskStatus.FAILED
-        task["error"] = "Downloaded file is invalid or empty on the server."
+        TASK_STORE.update(task_id, {
+            "status": TaskStatus.FAILED,
+            "error": "Downloaded file is invalid or empty on the server."
+        })
         raise HTTPException(status_code=500, detail="Downloaded file is invalid. Please try again.")
         
-    logger.info(f"📤 Preparing to stream file: {file_path.name} ({format_file_size(file_path.stat().st_size)})")
-
-    # 2. 定义一个文件迭代器生成器，这可以防止内存溢出
-    def file_iterator(path: Path, chunk_size: int = 8192):
-        with open(path, "rb") as f:
-            while chunk := f.read(chunk_size):
-                yield chunk
+    logger.info(
+        f"📤 Preparing to stream file: {file_path.name} ({format_file_size(file_path.stat().st_size)})"
+        + (f" [Range: {request.headers['range']}]" if "range" in request.headers else "")
+    )
 
-    # 3. 使用 StreamingResponse 进行响应
-    # 这种方式对大文件非常友好，且能更好地处理与客户端的连接
-    return StreamingResponse(
-        file_iterator(file_path),
-        media_type='application/octet-stream',
-        headers={
+    STORAGE.touch(file_path)
 
-            'Content-Length': str(file_path.stat().st_size),
-            'Content-Disposition': f'attachment; filename="{file_path.name}"'
-        }
+    # 2. 使用支持 Range/If-Range 的文件响应，大块读取，服务器支持时零拷贝发送
+    return RangeFileResponse(
+        file_path,
+        request.headers,
+        filename=download_name,
+        method=request.method
     )
 
 @app.get("/api/download/tasks")
@@ -531,89 +1134,88 @@ async def list_download_tasks(
 ):
     """列出下载任务"""
     
-    tasks = []
-    for task_id, task_info in list(DOWNLOAD_TASKS.items())[offset:offset+limit]:
-        if status is None or task_info["status"] == status:
-            task_response = TaskResponse(
-                task_id=task_id,
-                status=task_info["status"],
-                created_at=datetime.datetime.fromtimestamp(task_info["created_at"]).isoformat(),
-                progress=task_info.get("progress"),
-                file_path=task_info.get("file_path"),
-                file_size=task_info.get("actual_file_size"),
-                error=task_info.get("error")
-            )
-            tasks.append(task_response)
+    tasks = [
+        _build_task_response(task_id, task_info)
+        for task_id, task_info in TASK_STORE.list(status=status, limit=limit, offset=offset)
+    ]
     
     return {
         "tasks": tasks,
-        "total": len(DOWNLOAD_TASKS),
+        "total": TASK_STORE.count(),
         "filtered": len(tasks)
     }
 
 # --- 缩略图API ---
 
+async def _download_thumbnail(chat_id: int, message_id: int) -> Optional[bytes]:
+    """下载消息中媒体的缩略图到内存，没有缩略图时返回 None"""
+    with stage("get_messages"):
+        message = await USERS.call(chat_id, lambda client: client.get_messages(chat_id, message_id))
+    if not message or message.empty:
+        return None
+    
+    media = next((getattr(message, t) for t in MEDIA_FILTERS if getattr(message, t, None)), None)
+    if not media or not media.thumbs:
+        return None
+    
+    with stage("thumbnail"):
+        async with USERS.lease(chat_id, message._client) as client, transfer(client, "download"):
+            thumb = await client.download_media(media.thumbs[0].file_id, in_memory=True)
+    return thumb.getvalue() if thumb else None
+
+def _placeholder_response() -> FileResponse:
+    placeholder_path = Path("web") / "placeholder.png"
+    if placeholder_path.exists():
+        return FileResponse(str(placeholder_path))
+    raise HTTPException(status_code=404, detail="Thumbnail not found")
+
 @app.get("/api/thumbnail/{chat_id}/{message_id}")
-async def get_thumbnail(chat_id: int, message_id: int):
-    """获取视频缩略图"""
+async def get_thumbnail(chat_id: int, message_id: int, request: Request):
+    """获取媒体缩略图（带缓存，支持 ETag 条件请求）"""
     
     logger.debug(f"🖼️ Thumbnail request for message {message_id} from chat {chat_id}")
     
     try:
-        message = await user.get_messages(chat_id, message_id)
-        
-        if not message or not message.video or not message.video.thumbnail:
-            # 返回默认占位图
-            placeholder_path = Path("web") / "placeholder.png"
-            if placeholder_path.exists():
-                return FileResponse(str(placeholder_path))
-            else:
-                raise HTTPException(status_code=404, detail="Thumbnail not found")
-        
-        # 生成临时缩略图文件名
-        temp_thumb_path = TEMP_DIR / f"thumb_{chat_id}_{message_id}_{int(time.time())}.jpg"
-        
-        # 下载缩略图
-        await user.download_media(
-            message.video.thumbnail,
-            file_name=str(temp_thumb_path)
-        )
-        
-        return FileResponse(
-            path=str(temp_thumb_path),
-            media_type="image/jpeg",
-            background=lambda: temp_thumb_path.unlink(missing_ok=True)
+        # 同一缩略图的并发请求共享同一次下载
+        thumb = await THUMB_CACHE.get(
+            (chat_id, message_id),
+            lambda: _download_thumbnail(chat_id, message_id)
         )
-        
     except Exception as e:
         logger.error(f"❌ Failed to get thumbnail for message {message_id}: {e}")
-        # 尝试返回占位图
-        placeholder_path = Path("web") / "placeholder.png"
-        if placeholder_path.exists():
-            return FileResponse(str(placeholder_path))
-        else:
-            raise HTTPException(status_code=500, detail=f"Failed to get thumbnail: {str(e)}")
+        return _placeholder_response()
+    
+    if thumb is None:
+        return _placeholder_response()
+    
+    data, etag = thumb
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="image/jpeg", headers=headers)
 
 # --- 视频列表API ---
 
 @app.get("/api/channel/{channel_id}/")
-async def get_all_videos(channel_id: str, limit: int = 10000):
-    """获取频道所有视频"""
-    return await _fetch_videos_from_channel(channel_id=channel_id, limit=limit)
+async def get_all_videos(channel_id: str, limit: int = 10000, media_type: str = "video"):
+    """获取频道所有视频（media_type 可选 video/document/audio/photo）"""
+    return await _fetch_videos_from_channel(channel_id=channel_id, limit=limit, media_type=media_type)
 
 @app.get("/api/channel/{channel_id}/videos")
 async def get_videos_by_date(
     channel_id: str,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    limit: int = 2000
+    limit: int = 2000,
+    media_type: str = "video"
 ):
-    """按日期范围获取视频"""
+    """按日期范围获取视频（media_type 可选 video/document/audio/photo）"""
     return await _fetch_videos_from_channel(
         channel_id=channel_id,
         limit=limit,
         date_from=date_from,
-        date_to=date_to
+        date_to=date_to,
+        media_type=media_type
     )
 
 # --- 转发API ---
@@ -0,0 +1,440 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import asyncio
+import inspect
+import random
+from io import BytesIO
+from time import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from pyrogram import Client, raw, types, utils
+from pyrogram.errors import FloodWait
+
+# Telegram serves and accepts files in 1 MiB parts
+PART_SIZE = 1024 * 1024
+THUMB_SIZE = 16 * 1024
+
+MEDIA_TYPES = ("video", "document", "audio", "photo")
+
+SEARCH_FILTERS = {
+    raw.types.InputMessagesFilterVideo: "video",
+    raw.types.InputMessagesFilterDocument: "document",
+    raw.types.InputMessagesFilterMusic: "audio",
+    raw.types.InputMessagesFilterPhotos: "photo",
+}
+
+
+class NetworkProfile:
+    """Simulated network: latency per API call, bandwidth per connection, FloodWait injection.
+
+    ``bandwidth`` is in bytes per second (0 = unlimited) and applies to each
+    connection separately, like Telegram's per-session throttling.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.02,
+        bandwidth: float = 0,
+        flood_rate: float = 0.0,
+        flood_wait: int = 1,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.flood_rate = flood_rate
+        self.flood_wait = flood_wait
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.flood_waits = 0
+
+    async def call(self):
+        """One round trip; raises FloodWait for a ``flood_rate`` share of calls."""
+        self.calls += 1
+        if self.flood_rate and self._random.random() < self.flood_rate:
+            self.flood_waits += 1
+            raise FloodWait(value=self.flood_wait)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send(self, size: int):
+        if self.bandwidth:
+            await asyncio.sleep(size / self.bandwidth)
+
+
+class FakeTelegram:
+    """Synthetic channels with media messages, kept as raw API objects.
+
+    Each channel holds ``messages`` single media posts (cycling through
+    video, document, audio and photo, one per minute up to now) followed by
+    ``albums`` media groups of ``album_size`` items. File contents are not
+    stored; every part of every file is the same random ``PART_SIZE`` block.
+    """
+
+    def __init__(
+        self,
+        channels: int = 1,
+        messages: int = 200,
+        albums: int = 0,
+        album_size: int = 4,
+        media_size: int = 16 * PART_SIZE,
+        photo_size: int = 256 * 1024,
+        protected: bool = True,
+        seed: int = 0,
+    ):
+        self.media_size = media_size
+        self.photo_size = photo_size
+        self.block = random.Random(seed).randbytes(PART_SIZE)
+        self.channels: Dict[int, raw.types.Channel] = {}
+        # raw channel id -> message id -> message
+        self.history: Dict[int, Dict[int, raw.types.Message]] = {}
+        self.singles: Dict[int, List[int]] = {}
+        self.albums: Dict[int, List[int]] = {}
+        self._next_id = 1
+
+        now = int(time())
+        total = messages + albums * album_size
+        for index in range(channels):
+            channel_id = 1000000 + index
+            self.channels[channel_id] = raw.types.Channel(
+                id=channel_id,
+                title=f"Benchmark {index}",
+                photo=raw.types.ChatPhotoEmpty(),
+                date=now - 86400 * 365,
+                access_hash=0,
+                broadcast=True,
+                noforwards=protected,
+                usernames=[],
+                restriction_reason=[],
+            )
+            history = self.history[channel_id] = {}
+            self.singles[channel_id] = []
+            self.albums[channel_id] = []
+            for message_id in range(1, messages + 1):
+                date = now - (total - message_id) * 60
+                media_type = MEDIA_TYPES[message_id % len(MEDIA_TYPES)]
+                history[message_id] = self._message(channel_id, message_id, date, media_type, protected)
+                self.singles[channel_id].append(message_id)
+            for album in range(albums):
+                first = messages + album * album_size + 1
+                self.albums[channel_id].append(first)
+                for message_id in range(first, first + album_size):
+                    date = now - (total - message_id) * 60
+                    media_type = "photo" if message_id % 2 else "video"
+                    history[message_id] = self._message(
+                        channel_id, message_id, date, media_type, protected, grouped_id=first
+                    )
+
+    @staticmethod
+    def chat_id(channel_id: int) -> int:
+        return utils.get_channel_id(channel_id)
+
+    def _media_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _message(self, channel_id, message_id, date, media_type, protected, grouped_id=None):
+        if media_type == "photo":
+            media = raw.types.MessageMediaPhoto(
+                photo=raw.types.Photo(
+                    id=self._media_id(),
+                    access_hash=0,
+                    file_reference=b"\x00",
+                    date=date,
+                    sizes=[raw.types.PhotoSize(type="y", w=1280, h=720, size=self.photo_size)],
+                    dc_id=2,
+                )
+            )
+        else:
+            attributes, mime_type, thumbs = {
+                "video": (
+                    [raw.types.DocumentAttributeVideo(duration=60, w=1280, h=720, supports_streaming=True)],
+                    "video/mp4",
+                    [raw.types.PhotoSize(type="m", w=320, h=180, size=THUMB_SIZE)],
+                ),
+                "audio": (
+                    [raw.types.DocumentAttributeAudio(duration=180, title="Track", performer="Benchmark")],
+                    "audio/mpeg",
+                    [],
+                ),
+                "document": ([], "application/octet-stream", []),
+            }[media_type]
+            extension = {"video": "mp4", "audio": "mp3", "document": "bin"}[media_type]
+            attributes.append(raw.types.DocumentAttributeFilename(file_name=f"{message_id}.{extension}"))
+            media = raw.types.MessageMediaDocument(
+                document=raw.types.Document(
+                    id=self._media_id(),
+                    access_hash=0,
+                    file_reference=b"\x00",
+                    date=date,
+                    mime_type=mime_type,
+                    size=self.media_size,
+                    dc_id=2,
+                    attributes=attributes,
+                    thumbs=thumbs,
+                )
+            )
+        return raw.types.Message(
+            id=message_id,
+            peer_id=raw.types.PeerChannel(channel_id=channel_id),
+            date=date,
+            message=f"Post {message_id}",
+            entities=[],
+            media=media,
+            post=True,
+            noforwards=protected,
+            grouped_id=grouped_id,
+        )
+
+    def _answer(self, channel_id: int, messages: List[raw.base.Message]) -> raw.types.messages.ChannelMessages:
+        return raw.types.messages.ChannelMessages(
+            pts=0,
+            count=len(messages),
+            messages=messages,
+            topics=[],
+            chats=[self.channels[channel_id]],
+            users=[],
+        )
+
+    def get_messages(self, channel_id: int, message_ids: List[int]):
+        history = self.history[channel_id]
+        return self._answer(
+            channel_id,
+            [history.get(message_id) or raw.types.MessageEmpty(id=message_id) for message_id in message_ids],
+        )
+
+    def search(self, channel_id: int, query: raw.functions.messages.Search):
+        media_type = SEARCH_FILTERS.get(type(query.filter))
+        found = []
+        # Newest first, like Telegram
+        for message_id in sorted(self.history[channel_id], reverse=True):
+            message = self.history[channel_id][message_id]
+            if query.offset_id and message_id >= query.offset_id:
+                continue
+            if query.max_date and message.date >= query.max_date:
+                continue
+            if message_id <= query.min_id:
+                break
+            if media_type and self.media_type(message) != media_type:
+                continue
+            found.append(message)
+            if len(found) >= query.limit:
+                break
+        return self._answer(channel_id, found)
+
+    @staticmethod
+    def media_type(message: raw.types.Message) -> str:
+        if isinstance(message.media, raw.types.MessageMediaPhoto):
+            return "photo"
+        mime_type = message.media.document.mime_type
+        return "video" if mime_type.startswith("video/") else "audio" if mime_type.startswith("audio/") else "document"
+
+
+def _media_size(message) -> int:
+    media = getattr(message, message.media.value, None) if message.media else None
+    return getattr(media, "file_size", 0) or 0
+
+
+async def _call_progress(progress, current, total, progress_args):
+    if progress is None:
+        return
+    result = progress(current, total, *progress_args)
+    if inspect.isawaitable(result):
+        await result
+
+
+class FakeClient(Client):
+    """A ``pyrogram.Client`` answered by a ``FakeTelegram`` instead of Telegram.
+
+    The raw API calls the app makes (message lookup and search) are answered
+    in ``invoke``, so pyrogram parses the results exactly as in production
+    and rate limiters attached to ``invoke`` see every call. File transfers
+    are simulated in ``stream_media`` and ``download_media``.
+    """
+
+    def __init__(self, world: FakeTelegram, profile: Optional[NetworkProfile] = None, name: str = "fake"):
+        super().__init__(name, api_id=1, api_hash="0" * 32, in_memory=True, no_updates=True)
+        self.world = world
+        self.profile = profile or NetworkProfile()
+        self.me = types.User(id=1, is_self=True, is_premium=True, first_name="Benchmark")
+        self.downloaded = 0
+
+    async def start(self):
+        self.is_connected = True
+        return self
+
+    async def stop(self, block: bool = True):
+        self.is_connected = False
+        return self
+
+    async def get_me(self):
+        return self.me
+
+    async def resolve_peer(self, peer_id):
+        # Only the channels' numeric ids are simulated; get_channel_id is its own inverse
+        return raw.types.InputPeerChannel(channel_id=utils.get_channel_id(int(peer_id)), access_hash=0)
+
+    async def invoke(self, query, *args, **kwargs):
+        await self.profile.call()
+        if isinstance(query, raw.functions.channels.GetMessages):
+            return self.world.get_messages(query.channel.channel_id, [item.id for item in query.id])
+        if isinstance(query, raw.functions.messages.Search):
+            return self.world.search(query.peer.channel_id, query)
+        raise NotImplementedError(f"{type(query).__name__} is not simulated")
+
+    async def _parts(self, size: int, first: int = 0, limit: int = 0):
+        last = -(-size // PART_SIZE)
+        if limit:
+            last = min(last, first + limit)
+        for part in range(first, last):
+            # One GetFile round trip per part
+            await self.profile.call()
+            chunk = self.world.block[:min(PART_SIZE, size - part * PART_SIZE)]
+            await self.profile.send(len(chunk))
+            self.downloaded += len(chunk)
+            yield chunk
+
+    async def stream_media(self, message, limit: int = 0, offset: int = 0):
+        async for chunk in self._parts(_media_size(message), offset, limit):
+            yield chunk
+
+    async def download_media(
+        self,
+        message,
+        file_name: str = "downloads/",
+        in_memory: bool = False,
+        block: bool = True,
+        progress=None,
+        progress_args: tuple = (),
+    ):
+        if isinstance(message, str):
+            # A thumbnail's file_id
+            size, name = THUMB_SIZE, "thumb.jpg"
+        else:
+            size = _media_size(message)
+            name = f"{message.id}"
+
+        if in_memory:
+            file = BytesIO()
+            file.name = name
+        else:
+            if file_name.endswith("/"):
+                file_name = os.path.join(file_name, name)
+            os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+            file = open(file_name + ".temp", "wb")
+
+        current = 0
+        try:
+            async for chunk in self._parts(size):
+                await asyncio.to_thread(file.write, chunk)
+                current += len(chunk)
+                await _call_progress(progress, current, size, progress_args)
+        finally:
+            if not in_memory:
+                file.close()
+
+        if in_memory:
+            file.seek(0)
+            return file
+        os.replace(file_name + ".temp", file_name)
+        return file_name
+
+
+class FakeReply:
+    """A message the bot sent; edits and deletes only cost a round trip."""
+
+    def __init__(self, profile: NetworkProfile, chat_id: int, text: str = ""):
+        self.profile = profile
+        self.chat = SimpleNamespace(id=chat_id)
+        self.text = text
+        self.media = None
+
+    async def edit(self, text: str, **kwargs):
+        await self.profile.call()
+        self.text = text
+        return self
+
+    edit_text = edit
+
+    async def delete(self, *args, **kwargs):
+        await self.profile.call()
+        return True
+
+
+class FakeBot:
+    """The bot's side: uploads are read from disk and sent at the profile's bandwidth."""
+
+    def __init__(self, profile: Optional[NetworkProfile] = None):
+        self.profile = profile or NetworkProfile()
+        # chat id -> bytes uploaded to it
+        self.uploaded_to: Dict[int, int] = {}
+        self.replies = 0
+
+    async def upload(self, chat_id: int, path, progress=None, progress_args: tuple = ()):
+        if not isinstance(path, str):
+            return
+        size = os.path.getsize(path)
+        current = 0
+        with open(path, "rb") as file:
+            while True:
+                chunk = await asyncio.to_thread(file.read, PART_SIZE)
+                if not chunk:
+                    break
+                await self.profile.call()
+                await self.profile.send(len(chunk))
+                current += len(chunk)
+                await _call_progress(progress, current, size, progress_args)
+        self.uploaded_to[chat_id] = self.uploaded_to.get(chat_id, 0) + size
+
+    async def send_media_group(self, chat_id: int, media: list, **kwargs):
+        for item in media:
+            await self.upload(chat_id, item.media)
+        return [FakeReply(self.profile, chat_id) for _ in media]
+
+    async def _send(self, chat_id: int, media, progress=None, progress_args: tuple = (), **kwargs):
+        await self.upload(chat_id, media, progress, progress_args)
+        return FakeReply(self.profile, chat_id)
+
+    async def send_photo(self, chat_id: int, photo, **kwargs):
+        return await self._send(chat_id, photo, **kwargs)
+
+    async def send_video(self, chat_id: int, video, **kwargs):
+        return await self._send(chat_id, video, **kwargs)
+
+    async def send_audio(self, chat_id: int, audio, **kwargs):
+        return await self._send(chat_id, audio, **kwargs)
+
+    async def send_document(self, chat_id: int, document, **kwargs):
+        return await self._send(chat_id, document, **kwargs)
+
+    async def send_voice(self, chat_id: int, voice, **kwargs):
+        return await self._send(chat_id, voice, **kwargs)
+
+
+class FakeCommand:
+    """A user's private message to the bot, such as ``/dl <link>``."""
+
+    def __init__(self, bot: FakeBot, message_id: int, chat_id: int = 1, text: str = ""):
+        self.bot = bot
+        self.id = message_id
+        self.chat = SimpleNamespace(id=chat_id)
+        self.text = text
+
+    async def reply(self, text: str, **kwargs):
+        await self.bot.profile.call()
+        self.bot.replies += 1
+        return FakeReply(self.bot.profile, self.chat.id, text)
+
+    async def reply_photo(self, photo, **kwargs):
+        return await self.bot.send_photo(self.chat.id, photo, **kwargs)
+
+    async def reply_video(self, video, **kwargs):
+        return await self.bot.send_video(self.chat.id, video, **kwargs)
+
+    async def reply_audio(self, audio, **kwargs):
+        return await self.bot.send_audio(self.chat.id, audio, **kwargs)
+
+    async def reply_document(self, document, **kwargs):
+        return await self.bot.send_document(self.chat.id, document, **kwargs)
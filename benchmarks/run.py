@@ -0,0 +1,311 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import psutil
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.fake_client import (  # noqa: E402
+    PART_SIZE,
+    FakeBot,
+    FakeClient,
+    FakeCommand,
+    FakeTelegram,
+    NetworkProfile,
+)
+
+SCENARIOS = ("channel_cold", "channel_warm", "backend_download", "bot_single", "bot_album")
+
+
+class RssSampler:
+    """Peak resident memory of this process while a scenario runs."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            await asyncio.sleep(self.interval)
+
+    async def __aenter__(self):
+        self.peak = self.process.memory_info().rss
+        self._task = asyncio.create_task(self._sample())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def measure(
+    name: str,
+    count: int,
+    concurrency: int,
+    request: Callable[[int], Awaitable[int]],
+) -> Dict[str, float]:
+    """Run ``request(index)`` ``count`` times, ``concurrency`` at once.
+
+    ``request`` returns the bytes it moved; failures are counted, not raised.
+    """
+    latencies: List[float] = []
+    moved = errors = 0
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(index: int):
+        nonlocal moved, errors
+        async with slots:
+            started = perf_counter()
+            try:
+                size = await request(index)
+            except Exception as e:
+                errors += 1
+                logging.getLogger("benchmarks").warning(f"{name} request {index} failed: {e!r}")
+                return
+            latencies.append(perf_counter() - started)
+            moved += size
+
+    async with RssSampler() as rss:
+        started = perf_counter()
+        await asyncio.gather(*(one(index) for index in range(count)))
+        elapsed = perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": count,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mb_per_second": round(moved / 1024 / 1024 / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(rss.peak / 1024 / 1024, 1),
+    }
+
+
+async def run(args) -> List[Dict[str, float]]:
+    # Imported here, after the working directory and environment are set up
+    import httpx
+    import backend
+    import main as bot_app
+    from helpers.ratelimit import RateLimiter
+    from helpers.sessionpool import SessionPool, session_names
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    profile = NetworkProfile(
+        latency=args.latency / 1000,
+        bandwidth=args.bandwidth * 1024 * 1024,
+        flood_rate=args.flood_rate,
+        flood_wait=args.flood_wait,
+    )
+    # A channel per cold listing request, plus one for everything else
+    channels = args.requests + 1
+    world = FakeTelegram(
+        channels=channels,
+        messages=max(args.messages, args.requests * 2),
+        albums=args.requests,
+        album_size=args.album_size,
+        media_size=int(args.media_mb * PART_SIZE),
+    )
+    main_channel = world.chat_id(1000000 + args.requests)
+    raw_main_channel = 1000000 + args.requests
+
+    # Accounts of the session pool, all members of every simulated channel
+    users = SessionPool([
+        FakeClient(world, profile, name=name)
+        for name in session_names(max(1, args.sessions), base="benchmark_user")
+    ])
+    limiters = [RateLimiter(client.name).attach(client) for client in users.clients]
+    backend.USERS = bot_app.USERS = users
+    backend.user = bot_app.user = users.primary
+    backend.RATE_LIMITERS = bot_app.USER_LIMITERS = limiters
+    backend.RATE_LIMITER = bot_app.USER_LIMITER = limiters[0]
+    bot_app.MEDIA_INFO.client = users.primary
+    bot = FakeBot(profile)
+
+    results = []
+    await backend.startup_event()
+    try:
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+
+            async def channel_list(chat_id: int) -> int:
+                response = await http.get(
+                    f"/api/channel/{chat_id}/", params={"limit": args.messages, "media_type": "video"}
+                )
+                response.raise_for_status()
+                return len(response.content)
+
+            async def backend_download(index: int) -> int:
+                message_id = world.singles[raw_main_channel][index]
+                response = await http.post(
+                    "/api/download/request", json={"chat_id": main_channel, "message_id": message_id}
+                )
+                response.raise_for_status()
+                task_id = response.json()["task_id"]
+                while True:
+                    status = (await http.get(f"/api/download/status/{task_id}")).json()
+                    if status["status"] == "completed":
+                        break
+                    if status["status"] in ("failed", "expired"):
+                        raise RuntimeError(status.get("error") or status["status"])
+                    await asyncio.sleep(args.poll / 1000)
+                response = await http.get(f"/api/download/fetch/{task_id}")
+                response.raise_for_status()
+                return len(response.content)
+
+            commands = iter(range(1, 10 ** 9))
+
+            async def bot_download(message_id: int) -> int:
+                # A chat and a download folder of its own per command
+                command = FakeCommand(bot, message_id=next(commands), chat_id=next(commands))
+                await bot_app.handle_download(
+                    bot, command, f"https://t.me/c/{raw_main_channel}/{message_id}"
+                )
+                # handle_download reports errors as replies, so check what was sent
+                if not bot.uploaded_to.get(command.chat.id):
+                    raise RuntimeError("nothing was uploaded")
+                return bot.uploaded_to[command.chat.id]
+
+            scenarios = {
+                # Every request indexes a channel it has not seen
+                "channel_cold": lambda index: channel_list(world.chat_id(1000000 + index)),
+                # Answered from the index built by the cold requests
+                "channel_warm": lambda index: channel_list(world.chat_id(1000000 + index)),
+                "backend_download": backend_download,
+                "bot_single": lambda index: bot_download(world.singles[raw_main_channel][index]),
+                "bot_album": lambda index: bot_download(world.albums[raw_main_channel][index]),
+            }
+            for name in args.scenarios:
+                calls, flood_waits = profile.calls, profile.flood_waits
+                result = await measure(name, args.requests, args.concurrency, scenarios[name])
+                result["api_calls"] = profile.calls - calls
+                result["flood_waits"] = profile.flood_waits - flood_waits
+                results.append(result)
+    finally:
+        await backend.shutdown_event()
+
+    return results
+
+
+def print_table(results: List[Dict[str, float]]):
+    columns = (
+        ("scenario", "scenario", 17),
+        ("requests", "reqs", 5),
+        ("errors", "errs", 5),
+        ("requests_per_second", "req/s", 8),
+        ("mb_per_second", "MB/s", 8),
+        ("p50_ms", "p50 ms", 9),
+        ("p99_ms", "p99 ms", 9),
+        ("peak_rss_mb", "RSS MB", 8),
+    )
+    print("  ".join(title.rjust(width) if key != "scenario" else title.ljust(width) for key, title, width in columns))
+    for result in results:
+        print("  ".join(
+            str(result[key]).rjust(width) if key != "scenario" else str(result[key]).ljust(width)
+            for key, _, width in columns
+        ))
+
+
+def compare(results: List[Dict[str, float]], baseline_path: str, tolerance: float) -> bool:
+    """Print changes against a saved run; False if any scenario got slower than ``tolerance``."""
+    with open(baseline_path) as file:
+        baseline = {result["scenario"]: result for result in json.load(file)["results"]}
+
+    ok = True
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if not before:
+            continue
+        changes = []
+        for key, higher_is_better in (("requests_per_second", True), ("mb_per_second", True), ("p99_ms", False)):
+            if not before[key]:
+                continue
+            change = (result[key] - before[key]) / before[key]
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            ok = ok and not regressed
+            changes.append(f"{key} {change:+.0%}{' REGRESSION' if regressed else ''}")
+        print(f"{result['scenario']}: " + ", ".join(changes))
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Measure the backend and the bot against a simulated Telegram, no account needed.",
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--messages", type=int, default=500, help="media messages per channel")
+    parser.add_argument("--album-size", type=int, default=4)
+    parser.add_argument("--media-mb", type=float, default=24, help="size of each video, audio and document")
+    parser.add_argument("--latency", type=float, default=20, help="milliseconds per API call and file part")
+    parser.add_argument("--bandwidth", type=float, default=50, help="MB/s per connection, 0 = unlimited")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of calls answered with FloodWait")
+    parser.add_argument("--flood-wait", type=int, default=1, help="seconds of each injected FloodWait")
+    parser.add_argument("--sessions", type=int, default=1, help="user accounts to spread requests over")
+    parser.add_argument("--poll", type=float, default=20, help="milliseconds between task status polls")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="compare with results saved by --json")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before failing --compare")
+    parser.add_argument("--workdir", help="directory for downloads and databases (default: a temporary one)")
+    parser.add_argument("--verbose", action="store_true", help="keep the application's INFO logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    output = os.path.abspath(args.json) if args.json else None
+
+    # Both apps write their databases, logs and downloads to the working directory
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rcdl-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    os.environ.setdefault("API_ID", "1")
+    os.environ.setdefault("API_HASH", "0" * 32)
+    os.environ.setdefault("BOT_TOKEN", "1:benchmark")
+    # Relayed uploads go through raw upload sessions that are not simulated
+    os.environ["RELAY_UPLOADS"] = "false"
+    # Small synthetic files still take the segmented download path
+    os.environ.setdefault("DOWNLOAD_SEGMENT_MB", "8")
+
+    results = asyncio.run(run(args))
+    print_table(results)
+    print(f"\nworkdir: {workdir}")
+
+    if output:
+        with open(output, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+    if baseline and not compare(results, baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,4 +28,44 @@ class PyroConf(object):
     API_HASH = getenv("API_HASH", "eb06d4abfb49dc3eeb1aeb98ae0f581e")
     BOT_TOKEN = getenv("BOT_TOKEN")
     SESSION_STRING = getenv("SESSION_STRING")
+    # More accounts to spread downloads over, separated by commas or spaces
+    SESSION_STRINGS = [SESSION_STRING] + getenv("SESSION_STRINGS", "").replace(",", " ").split()
     BOT_START_TIME = time()
+    # Parallel downloads: connections per file, and media connections in total
+    DOWNLOAD_CONNECTIONS = int(getenv("DOWNLOAD_CONNECTIONS", "4"))
+    DOWNLOAD_SEGMENT_MB = int(getenv("DOWNLOAD_SEGMENT_MB", "64"))
+    MAX_CONCURRENT_TRANSMISSIONS = int(getenv("MAX_CONCURRENT_TRANSMISSIONS", "8"))
+    # /bdl: posts handled at once, and FloodWait retries per post
+    BATCH_WORKERS = int(getenv("BATCH_WORKERS", "3"))
+    BATCH_RETRIES = int(getenv("BATCH_RETRIES", "3"))
+    UPLOAD_CACHE_PATH = getenv("UPLOAD_CACHE_PATH", "upload_cache.db")
+    # Upload files above RELAY_MIN_MB while they are still downloading
+    RELAY_UPLOADS = getenv("RELAY_UPLOADS", "true").lower() == "true"
+    RELAY_MIN_MB = int(getenv("RELAY_MIN_MB", "20"))
+    RELAY_UPLOAD_WORKERS = int(getenv("RELAY_UPLOAD_WORKERS", "4"))
+    # ffprobe/ffmpeg processes at once (0 = half the CPU cores), and their timeout
+    FFMPEG_WORKERS = int(getenv("FFMPEG_WORKERS", "0"))
+    FFMPEG_TIMEOUT = int(getenv("FFMPEG_TIMEOUT", "60"))
+    # Album items downloaded at once
+    MEDIA_GROUP_CONCURRENCY = int(getenv("MEDIA_GROUP_CONCURRENCY", "3"))
+    # Minimum seconds between progress message edits in one chat
+    PROGRESS_EDIT_INTERVAL = float(getenv("PROGRESS_EDIT_INTERVAL", "3"))
+    # Port of the bot's Prometheus /metrics exporter (0 = disabled)
+    METRICS_PORT = int(getenv("METRICS_PORT", "0"))
+    # Disk space downloads may use (0 = no quota), and free space always kept
+    STORAGE_QUOTA_MB = int(getenv("STORAGE_QUOTA_MB", "0"))
+    STORAGE_MIN_FREE_MB = int(getenv("STORAGE_MIN_FREE_MB", "512"))
+
+
+# Backend (FastAPI) setup
+class BackendConf(object):
+    DOWNLOAD_WORKERS = int(getenv("DOWNLOAD_WORKERS", "3"))
+    DOWNLOAD_QUEUE_SIZE = int(getenv("DOWNLOAD_QUEUE_SIZE", "200"))
+    PER_CHAT_DOWNLOADS = int(getenv("PER_CHAT_DOWNLOADS", "2"))
+    STREAM_START_TIMEOUT = int(getenv("STREAM_START_TIMEOUT", "600"))
+    INDEX_SYNC_INTERVAL = int(getenv("INDEX_SYNC_INTERVAL", "60"))
+    INDEX_RECONCILE_INTERVAL = int(getenv("INDEX_RECONCILE_INTERVAL", "3600"))
+    THUMB_CACHE_SIZE_MB = int(getenv("THUMB_CACHE_SIZE_MB", "200"))
+    THUMB_MEMORY_ITEMS = int(getenv("THUMB_MEMORY_ITEMS", "512"))
+    EVENT_MIN_INTERVAL = float(getenv("EVENT_MIN_INTERVAL", "0.5"))
+    STORAGE_WAIT = int(getenv("STORAGE_WAIT", "300"))
@@ -0,0 +1,83 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+import logging
+from time import monotonic
+from typing import AsyncIterator, Union
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from pyrogram.types import Message
+
+from helpers.metrics import stage
+
+log = logging.getLogger(__name__)
+
+# get_messages accepts at most 200 ids per call
+MAX_BATCH_SIZE = 200
+
+
+class AdaptivePacer:
+    """Spaces out batch work instead of sleeping a fixed time per item.
+
+    Starts with no delay, doubles the gap between items on every FloodWait
+    (and holds everyone until the wait is over), then eases back towards
+    ``min_delay`` as items succeed.
+    """
+
+    def __init__(self, min_delay: float = 0.0, max_delay: float = 30.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min_delay
+        self.flood_waits = 0
+        self._resume_at = 0.0
+        self._next_slot = 0.0
+
+    async def wait(self):
+        now = monotonic()
+        slot = max(now, self._resume_at, self._next_slot)
+        self._next_slot = slot + self.delay
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def success(self):
+        self.delay = max(self.min_delay, self.delay * 0.9)
+        if self.delay < 0.05:
+            self.delay = self.min_delay
+
+    def flood(self, seconds: float):
+        self.flood_waits += 1
+        self._resume_at = max(self._resume_at, monotonic() + seconds)
+        self.delay = min(self.max_delay, max(self.delay * 2, 0.5))
+
+
+async def iter_messages(
+    client: Client,
+    chat_id: Union[int, str],
+    start_id: int,
+    end_id: int,
+    pacer: AdaptivePacer,
+    batch_size: int = MAX_BATCH_SIZE,
+) -> AsyncIterator[Message]:
+    """Yield the existing messages with ids ``start_id..end_id``, fetched in batches.
+
+    Deleted or missing ids come back as empty messages in the same call and
+    are skipped here without any extra round-trips.
+    """
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    for first in range(start_id, end_id + 1, batch_size):
+        ids = list(range(first, min(first + batch_size, end_id + 1)))
+        while True:
+            await pacer.wait()
+            try:
+                with stage("get_messages"):
+                    messages = await client.get_messages(chat_id=chat_id, message_ids=ids)
+                break
+            except FloodWait as e:
+                log.warning(f"FloodWait of {e.value}s while fetching messages {ids[0]}-{ids[-1]}")
+                pacer.flood(e.value)
+
+        for msg in messages:
+            if msg and not msg.empty:
+                yield msg
@@ -0,0 +1,165 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import anyio
+
+from helpers.streaming import CHUNK_SIZE, read_file_at
+
+log = logging.getLogger(__name__)
+
+ProgressListener = Callable[[int, int], None]
+
+
+class _Inflight:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.listeners: List[ProgressListener] = []
+        self.current = 0
+        self.total = 0
+        self.updated = asyncio.Event()
+
+    def notify(self):
+        event, self.updated = self.updated, asyncio.Event()
+        event.set()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self.updated.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class BlobStore:
+    """Files keyed by Telegram's ``file_unique_id``.
+
+    The same media is stored once no matter how many chats or names it has,
+    and concurrent fetches of one blob (unique id and suffix) share a single
+    download.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._inflight: Dict[Path, _Inflight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def path_for(self, unique_id: str, suffix: str = "") -> Path:
+        return self.root / f"{unique_id}{suffix}"
+
+    def lookup(self, unique_id: str, suffix: str = "") -> Optional[Path]:
+        path = self.path_for(unique_id, suffix)
+        if path.is_file() and path.stat().st_size > 0:
+            return path
+        return None
+
+    def is_downloading(self, unique_id: str, suffix: str = "") -> bool:
+        return self.path_for(unique_id, suffix) in self._inflight
+
+    async def fetch(
+        self,
+        unique_id: str,
+        suffix: str,
+        download: Callable[[Path, Callable], Awaitable],
+        progress: Optional[ProgressListener] = None,
+    ) -> Path:
+        """Return the blob path, downloading it unless it is stored or in flight.
+
+        ``download(path, progress)`` must write the file to ``path``; the
+        progress coroutine it receives fans out to every waiting caller.
+        """
+        path = self.lookup(unique_id, suffix)
+        if path:
+            self.hits += 1
+            return path
+
+        path = self.path_for(unique_id, suffix)
+        inflight = self._inflight.get(path)
+        if inflight:
+            self.coalesced += 1
+            log.info(f"Joining in-flight download of {path.name}")
+        else:
+            self.misses += 1
+            inflight = self._inflight[path] = _Inflight()
+            inflight.task = asyncio.create_task(self._download(path, download, inflight))
+
+        if progress:
+            inflight.listeners.append(progress)
+            if inflight.total:
+                progress(inflight.current, inflight.total)
+        try:
+            # Shielded so one caller giving up does not abort the shared download
+            return await asyncio.shield(inflight.task)
+        finally:
+            if progress in inflight.listeners:
+                inflight.listeners.remove(progress)
+
+    async def _download(self, path: Path, download, inflight: _Inflight) -> Path:
+        async def fan_out(current: int, total: int, *args):
+            inflight.current, inflight.total = current, total
+            inflight.notify()
+            for listener in list(inflight.listeners):
+                try:
+                    listener(current, total)
+                except Exception as e:
+                    log.error(f"Progress listener failed for {path.name}: {e}")
+
+        try:
+            await download(path, fan_out)
+            if not path.is_file() or path.stat().st_size == 0:
+                raise FileNotFoundError("Downloaded file not found")
+            return path
+        finally:
+            self._inflight.pop(path, None)
+            inflight.notify()
+
+    async def tail(
+        self, unique_id: str, suffix: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Yield bytes ``start..end`` of a blob, following it while it downloads.
+
+        Reads never go past the reported progress of the in-flight download,
+        and switch to the final file once the ``.temp`` file is renamed.
+        """
+        path = self.path_for(unique_id, suffix)
+        temp = path.with_name(path.name + ".temp")
+        offset = start
+
+        while end is None or offset <= end:
+            inflight = self._inflight.get(path)
+            if inflight is None:
+                if not path.is_file():
+                    raise FileNotFoundError(f"Download of {unique_id} failed")
+                available = path.stat().st_size
+            else:
+                available = inflight.current
+
+            limit = available if end is None else min(available, end + 1)
+            if offset >= limit:
+                if inflight is None:
+                    return
+                await inflight.wait(timeout=1)
+                continue
+
+            source = path if inflight is None else temp
+            try:
+                chunk = await anyio.to_thread.run_sync(
+                    read_file_at, source, offset, min(CHUNK_SIZE, limit - offset)
+                )
+            except FileNotFoundError:
+                # Renamed from .temp to its final name between the two checks
+                await asyncio.sleep(0.05)
+                continue
+            if not chunk:
+                # Reported but not flushed to disk yet
+                await asyncio.sleep(0.1)
+                continue
+
+            offset += len(chunk)
+            yield chunk
@@ -0,0 +1,222 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import sqlite3
+from time import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+MEDIA_COLUMNS = (
+    "chat_id", "message_id", "media_type", "date", "file_name", "file_size",
+    "duration", "caption", "link", "has_thumbnail", "file_unique_id",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    media_type TEXT NOT NULL,
+    date REAL NOT NULL,
+    file_name TEXT,
+    file_size INTEGER,
+    duration INTEGER,
+    caption TEXT,
+    link TEXT,
+    has_thumbnail INTEGER,
+    file_unique_id TEXT,
+    PRIMARY KEY (chat_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_media_date ON media (chat_id, media_type, date);
+
+CREATE TABLE IF NOT EXISTS spans (
+    chat_id INTEGER NOT NULL,
+    media_type TEXT NOT NULL,
+    low_id INTEGER NOT NULL,
+    high_id INTEGER NOT NULL,
+    low_date REAL NOT NULL,
+    high_date REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_spans_chat ON spans (chat_id, media_type);
+
+CREATE TABLE IF NOT EXISTS channels (
+    chat_id INTEGER NOT NULL,
+    media_type TEXT NOT NULL,
+    synced_at REAL,
+    reconciled_at REAL,
+    PRIMARY KEY (chat_id, media_type)
+);
+
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL
+);
+"""
+
+
+class ChannelIndex:
+    """Local index of channel media metadata.
+
+    A span ``(low_id, high_id, low_date, high_date)`` records that every
+    message with an id in ``[low_id, high_id]`` is reflected in the index,
+    so any date window inside ``[low_date, high_date]`` can be answered
+    without asking Telegram. ``low_id == 0`` means the start of history.
+    """
+
+    def __init__(self, path: Path):
+        self._db = sqlite3.connect(str(path), isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(channels)")]
+        if columns and "media_type" not in columns:
+            # Sync bookkeeping used to be per chat; it is rebuilt on the next sync
+            self._db.execute("DROP TABLE channels")
+        self._db.executescript(SCHEMA)
+
+    # --- chat aliases ---
+
+    def resolve(self, alias: Union[int, str]) -> Optional[int]:
+        if isinstance(alias, int):
+            return alias
+        row = self._db.execute(
+            "SELECT chat_id FROM aliases WHERE alias = ?", (alias.lower(),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def remember_alias(self, alias: str, chat_id: int):
+        self._db.execute(
+            "INSERT OR REPLACE INTO aliases (alias, chat_id) VALUES (?, ?)",
+            (alias.lower(), chat_id),
+        )
+
+    # --- media rows ---
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]):
+        rows = [tuple(row.get(column) for column in MEDIA_COLUMNS) for row in rows]
+        if not rows:
+            return
+        self._db.execute("BEGIN")
+        self._db.executemany(
+            f"INSERT OR REPLACE INTO media ({', '.join(MEDIA_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(MEDIA_COLUMNS))})",
+            rows,
+        )
+        self._db.execute("COMMIT")
+
+    def delete(self, chat_id: int, message_ids: Iterable[int]):
+        self._db.execute("BEGIN")
+        self._db.executemany(
+            "DELETE FROM media WHERE chat_id = ? AND message_id = ?",
+            [(chat_id, message_id) for message_id in message_ids],
+        )
+        self._db.execute("COMMIT")
+
+    def query(
+        self, chat_id: int, media_type: str, start: float, end: float, limit: int = -1
+    ) -> List[Dict[str, Any]]:
+        # SQLite treats a negative LIMIT as no limit
+        rows = self._db.execute(
+            "SELECT * FROM media WHERE chat_id = ? AND media_type = ? "
+            "AND date >= ? AND date < ? ORDER BY date DESC, message_id DESC LIMIT ?",
+            (chat_id, media_type, start, end, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def message_ids(
+        self, chat_id: int, media_type: str, after_id: int = 0, limit: int = 200
+    ) -> List[int]:
+        rows = self._db.execute(
+            "SELECT message_id FROM media WHERE chat_id = ? AND media_type = ? "
+            "AND message_id > ? ORDER BY message_id LIMIT ?",
+            (chat_id, media_type, after_id, limit),
+        )
+        return [row[0] for row in rows]
+
+    def count(self, chat_id: int, media_type: str) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM media WHERE chat_id = ? AND media_type = ?",
+            (chat_id, media_type),
+        ).fetchone()[0]
+
+    # --- coverage ---
+
+    def spans(self, chat_id: int, media_type: str) -> List[Dict[str, Any]]:
+        rows = self._db.execute(
+            "SELECT low_id, high_id, low_date, high_date FROM spans "
+            "WHERE chat_id = ? AND media_type = ? ORDER BY high_id DESC",
+            (chat_id, media_type),
+        )
+        return [dict(row) for row in rows]
+
+    def head_span(self, chat_id: int, media_type: str) -> Optional[Dict[str, Any]]:
+        spans = self.spans(chat_id, media_type)
+        return spans[0] if spans else None
+
+    def add_span(
+        self, chat_id: int, media_type: str,
+        low_id: int, high_id: int, low_date: float, high_date: float,
+    ):
+        """Record a covered id range, merging it with overlapping spans."""
+        merged = {"low_id": low_id, "high_id": high_id, "low_date": low_date, "high_date": high_date}
+        overlapping = [
+            span for span in self.spans(chat_id, media_type)
+            if span["low_id"] <= high_id and span["high_id"] >= low_id
+        ]
+        for span in overlapping:
+            if span["low_id"] < merged["low_id"]:
+                merged["low_id"], merged["low_date"] = span["low_id"], span["low_date"]
+            if span["high_id"] > merged["high_id"] or (
+                span["high_id"] == merged["high_id"] and span["high_date"] > merged["high_date"]
+            ):
+                merged["high_id"], merged["high_date"] = span["high_id"], span["high_date"]
+
+        self._db.execute("BEGIN")
+        for span in overlapping:
+            self._db.execute(
+                "DELETE FROM spans WHERE chat_id = ? AND media_type = ? AND low_id = ? AND high_id = ?",
+                (chat_id, media_type, span["low_id"], span["high_id"]),
+            )
+        self._db.execute(
+            "INSERT INTO spans (chat_id, media_type, low_id, high_id, low_date, high_date) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (chat_id, media_type, merged["low_id"], merged["high_id"], merged["low_date"], merged["high_date"]),
+        )
+        self._db.execute("COMMIT")
+
+    def covers(self, chat_id: int, media_type: str, start: float, end: float) -> bool:
+        return any(
+            span["low_date"] <= start and span["high_date"] >= end
+            for span in self.spans(chat_id, media_type)
+        )
+
+    # --- sync bookkeeping ---
+
+    def channel_state(self, chat_id: int, media_type: str) -> Dict[str, Any]:
+        row = self._db.execute(
+            "SELECT synced_at, reconciled_at FROM channels WHERE chat_id = ? AND media_type = ?",
+            (chat_id, media_type),
+        ).fetchone()
+        return dict(row) if row else {"synced_at": None, "reconciled_at": None}
+
+    def mark(self, chat_id: int, media_type: str, field: str, now: Optional[float] = None):
+        """Stamp ``field`` with ``now`` (the current time by default)."""
+        assert field in ("synced_at", "reconciled_at")
+        self._db.execute(
+            "INSERT OR IGNORE INTO channels (chat_id, media_type) VALUES (?, ?)",
+            (chat_id, media_type),
+        )
+        self._db.execute(
+            f"UPDATE channels SET {field} = ? WHERE chat_id = ? AND media_type = ?",
+            (time() if now is None else now, chat_id, media_type),
+        )
+
+    def channels_to_reconcile(self, older_than: float) -> List[Tuple[int, str]]:
+        rows = self._db.execute(
+            "SELECT chat_id, media_type FROM channels "
+            "WHERE reconciled_at IS NULL OR reconciled_at < ?",
+            (older_than,),
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    def close(self):
+        self._db.close()
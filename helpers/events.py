@@ -0,0 +1,94 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import json
+import asyncio
+from time import monotonic
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+
+Event = Dict[str, Any]
+
+
+def format_sse(event: Event, name: str = "task") -> str:
+    return f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class ProgressBroker:
+    """Fans task events out to Server-Sent Events subscribers.
+
+    Progress events are throttled to one per ``min_interval`` per task; the
+    latest one held back is sent when the interval ends, so subscribers
+    always see the final value. Status events are sent immediately.
+    """
+
+    def __init__(self, min_interval: float = 0.5, queue_size: int = 100):
+        self.min_interval = min_interval
+        self.queue_size = queue_size
+        self._task_subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._all_subscribers: Set[asyncio.Queue] = set()
+        self._last_sent: Dict[str, float] = {}
+        self._pending: Dict[str, Event] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._all_subscribers) + sum(len(q) for q in self._task_subscribers.values())
+
+    def _has_subscribers(self, task_id: str) -> bool:
+        return bool(self._all_subscribers or self._task_subscribers.get(task_id))
+
+    def _put(self, queue: asyncio.Queue, event: Event):
+        if queue.full():
+            # A slow client only loses old events, never blocks the download
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def _send(self, task_id: str, event: Event):
+        self._last_sent[task_id] = monotonic()
+        for queue in self._task_subscribers.get(task_id, ()):
+            self._put(queue, event)
+        for queue in self._all_subscribers:
+            self._put(queue, event)
+
+    def _send_pending(self, task_id: str):
+        event = self._pending.pop(task_id, None)
+        if event is not None:
+            self._send(task_id, event)
+
+    def publish(self, task_id: str, event: Event, force: bool = False):
+        if not self._has_subscribers(task_id):
+            self._last_sent.pop(task_id, None)
+            self._pending.pop(task_id, None)
+            return
+
+        if force:
+            self._pending.pop(task_id, None)
+            self._send(task_id, event)
+            return
+
+        wait = self._last_sent.get(task_id, 0) + self.min_interval - monotonic()
+        if wait <= 0:
+            self._send(task_id, event)
+            return
+        if task_id not in self._pending:
+            asyncio.get_running_loop().call_later(wait, self._send_pending, task_id)
+        self._pending[task_id] = event
+
+    def forget(self, task_id: str):
+        self._last_sent.pop(task_id, None)
+
+    @contextmanager
+    def subscribe(self, task_id: Optional[str] = None) -> Iterator[asyncio.Queue]:
+        """Register a queue for one task's events, or every task's when ``task_id`` is None."""
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        subscribers = (
+            self._all_subscribers if task_id is None
+            else self._task_subscribers.setdefault(task_id, set())
+        )
+        subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers.discard(queue)
+            if task_id is not None and not subscribers:
+                self._task_subscribers.pop(task_id, None)
@@ -2,33 +2,50 @@
 # Channel: https://t.me/itsSmartDev
 
 import os
-from typing import Optional
+import asyncio
+import logging
+from typing import Optional, Union
+from weakref import WeakValueDictionary
 
-from logger import LOGGER
+log = logging.getLogger(__name__)
 
 SIZE_UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
 
-def get_download_path(folder_id: int, filename: str, root_dir: str = "downloads") -> str:
+# Source file_unique_id -> lock held while a download writes to its folder
+_DOWNLOAD_LOCKS: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+
+
+def get_download_path(folder_id: Union[int, str], filename: str, root_dir: str = "downloads") -> str:
     folder = os.path.join(root_dir, str(folder_id))
     os.makedirs(folder, exist_ok=True)
     return os.path.join(folder, filename)
 
 
+def download_lock(key: str) -> asyncio.Lock:
+    """Lock for downloads of one source file, which share its partial ``.temp``/``.parts`` files."""
+    lock = _DOWNLOAD_LOCKS.get(key)
+    if lock is None:
+        lock = _DOWNLOAD_LOCKS[key] = asyncio.Lock()
+    return lock
+
+
 def cleanup_download(path: str) -> None:
+    """Remove a sent file; partial downloads stay for the next attempt to resume.
+
+    Abandoned ``.temp``/``.parts`` files are left to ``StorageManager.sweep``.
+    """
     try:
-        LOGGER(__name__).info(f"Cleaning Download: {path}")
+        log.info(f"Cleaning Download: {path}")
         
         if os.path.exists(path):
             os.remove(path)
-        if os.path.exists(path + ".temp"):
-            os.remove(path + ".temp")
 
         folder = os.path.dirname(path)
         if os.path.isdir(folder) and not os.listdir(folder):
             os.rmdir(folder)
 
     except Exception as e:
-        LOGGER(__name__).error(f"Cleanup failed for {path}: {e}")
+        log.error(f"Cleanup failed for {path}: {e}")
 
 
 def get_readable_file_size(size_in_bytes: Optional[float]) -> str:
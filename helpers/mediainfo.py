@@ -0,0 +1,276 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import json
+import asyncio
+import logging
+import tempfile
+from io import BytesIO
+from time import monotonic
+from collections import OrderedDict
+from asyncio.subprocess import PIPE
+from asyncio import create_subprocess_exec
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyrogram import Client
+from pyrogram.types import Message
+
+from helpers.metrics import stage
+from helpers.ratelimit import transfer
+
+log = logging.getLogger(__name__)
+
+# Telegram ignores thumbnails larger than 320px on either side
+MAX_THUMB_SIDE = 320
+
+
+class MediaPool:
+    """Runs ffprobe/ffmpeg with at most ``workers`` processes at a time.
+
+    Jobs beyond that wait their turn, each gets ``cpu_count // workers``
+    threads so the pool as a whole does not oversubscribe the CPU, and a
+    process that outlives ``timeout`` is killed.
+    """
+
+    def __init__(self, workers: int = 0, timeout: float = 60):
+        cores = os.cpu_count() or 2
+        self.workers = workers or max(1, cores // 2)
+        self.threads = max(1, cores // self.workers)
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(self.workers)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+
+    async def run(self, cmd: List[str], timeout: Optional[float] = None) -> Tuple[str, str, int]:
+        """Run ``cmd`` and return its stdout, stderr and return code."""
+        queued = monotonic()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_time += monotonic() - queued
+
+        started = monotonic()
+        self.running += 1
+        try:
+            stdout, stderr, code = await self._exec(cmd, timeout or self.timeout)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self.run_time += monotonic() - started
+            self._slots.release()
+        if code == 0:
+            self.completed += 1
+        else:
+            self.failed += 1
+        return stdout, stderr, code
+
+    async def _exec(self, cmd: List[str], timeout: float) -> Tuple[str, str, int]:
+        proc = await create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            proc.kill()
+            await proc.wait()
+            raise
+        except asyncio.CancelledError:
+            proc.kill()
+            # Reap the process even if the caller is cancelled again meanwhile
+            await asyncio.shield(proc.wait())
+            raise
+        return (
+            stdout.decode(errors="replace").strip(),
+            stderr.decode(errors="replace").strip(),
+            proc.returncode,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "avg_wait": round(self.wait_time / finished, 2) if finished else 0.0,
+            "avg_run": round(self.run_time / finished, 2) if finished else 0.0,
+        }
+
+
+class MediaInfo:
+    """Upload metadata of one file: duration, size, audio tags and thumbnail bytes."""
+
+    def __init__(self, duration=0, width=0, height=0, performer=None, title=None, thumb=None):
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.performer = performer
+        self.title = title
+        self.thumb: Optional[bytes] = thumb
+
+    def thumb_file(self) -> Optional[BytesIO]:
+        """A fresh file object for the thumbnail, as the upload methods expect."""
+        if not self.thumb:
+            return None
+        file = BytesIO(self.thumb)
+        file.name = "thumb.jpg"
+        return file
+
+    def incomplete(self, media_type: str) -> bool:
+        if media_type == "video":
+            return not (self.duration and self.width and self.height and self.thumb)
+        if media_type == "audio":
+            return not self.duration
+        return False
+
+
+async def probe_media(path: str, pool: MediaPool) -> Dict[str, Any]:
+    """Duration, video size and audio tags of a file from one ffprobe run."""
+    try:
+        with stage("ffprobe"):
+            stdout, stderr, code = await pool.run([
+                "ffprobe", "-hide_banner", "-loglevel", "error", "-print_format", "json",
+                "-show_format", "-show_streams", path,
+            ])
+    except Exception as e:
+        log.warning(f"ffprobe failed for {path}: {e}")
+        return {}
+    if code != 0 or not stdout:
+        log.warning(f"ffprobe failed for {path}: {stderr}")
+        return {}
+    try:
+        data = json.loads(stdout)
+    except ValueError:
+        return {}
+
+    fields = data.get("format") or {}
+    tags = {key.lower(): value for key, value in (fields.get("tags") or {}).items()}
+    info = {
+        "duration": round(float(fields.get("duration") or 0)),
+        "performer": tags.get("artist"),
+        "title": tags.get("title"),
+    }
+    for stream in data.get("streams") or []:
+        if stream.get("codec_type") == "video":
+            info["width"] = stream.get("width") or 0
+            info["height"] = stream.get("height") or 0
+            break
+    return info
+
+
+async def generate_thumbnail(video_file: str, duration: int, pool: MediaPool) -> Optional[bytes]:
+    """Grab a frame from the middle of a video, scaled down for Telegram."""
+    # A fresh output per call, so concurrent uploads never share a file
+    fd, output = tempfile.mkstemp(suffix=".jpg", dir=os.path.dirname(os.path.abspath(video_file)))
+    os.close(fd)
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-ss", str((duration or 3) // 2), "-i", video_file,
+        "-vf", f"thumbnail,scale={MAX_THUMB_SIDE}:{MAX_THUMB_SIDE}:force_original_aspect_ratio=decrease",
+        "-q:v", "2", "-frames:v", "1",
+        "-threads", str(pool.threads), output,
+    ]
+    try:
+        with stage("thumbnail"):
+            _, err, code = await pool.run(cmd)
+        if code != 0:
+            log.warning(f"ffmpeg failed for {video_file}: {err}")
+            return None
+        with open(output, "rb") as file:
+            return file.read() or None
+    except Exception as e:
+        log.warning(f"ffmpeg failed for {video_file}: {e!r}")
+        return None
+    finally:
+        if os.path.exists(output):
+            os.remove(output)
+
+
+def _pick_thumb(thumbs):
+    fitting = [t for t in thumbs if max(t.width or 0, t.height or 0) <= MAX_THUMB_SIDE]
+    return max(fitting or thumbs, key=lambda t: t.file_size or 0)
+
+
+class MediaInfoCache:
+    """Upload metadata per source ``file_unique_id``.
+
+    Takes duration, dimensions, audio tags and thumbnails from the source
+    message, which Telegram already knows, and only runs ffprobe/ffmpeg on
+    the downloaded file for whatever is still missing.
+    """
+
+    def __init__(self, client: Client, pool: MediaPool, max_items: int = 512):
+        self.client = client
+        self.pool = pool
+        self.max_items = max_items
+        self._items: "OrderedDict[str, MediaInfo]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.probes = 0
+
+    async def get(self, chat_message: Message, media_path: Optional[str] = None) -> MediaInfo:
+        media_type = chat_message.media.value if chat_message.media else None
+        media = getattr(chat_message, media_type, None) if media_type else None
+        if media is None:
+            return MediaInfo()
+
+        key = media.file_unique_id
+        info = self._items.get(key)
+        if info is not None:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return info
+        self.misses += 1
+
+        info = MediaInfo(
+            duration=getattr(media, "duration", 0) or 0,
+            width=getattr(media, "width", 0) or 0,
+            height=getattr(media, "height", 0) or 0,
+            performer=getattr(media, "performer", None),
+            title=getattr(media, "title", None),
+        )
+        if media_type != "photo" and getattr(media, "thumbs", None):
+            try:
+                # File ids are usable by the session that fetched the message
+                client = getattr(chat_message, "_client", None) or self.client
+                with stage("thumbnail"):
+                    async with transfer(client, "download"):
+                        thumb = await client.download_media(
+                            _pick_thumb(media.thumbs).file_id, in_memory=True
+                        )
+                info.thumb = bytes(thumb.getbuffer())
+            except Exception as e:
+                log.warning(f"Could not download thumbnail of {key}: {e}")
+
+        if media_path and info.incomplete(media_type):
+            await self._fill_from_file(info, media_type, media_path)
+
+        # Without the file there was no fallback, so a later call may do better
+        if media_path or not info.incomplete(media_type):
+            self._items[key] = info
+        if len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return info
+
+    async def _fill_from_file(self, info: MediaInfo, media_type: str, media_path: str):
+        self.probes += 1
+        if not (info.duration and (media_type != "video" or (info.width and info.height))):
+            probed = await probe_media(media_path, self.pool)
+            info.duration = info.duration or probed.get("duration", 0)
+            info.width = info.width or probed.get("width", 0)
+            info.height = info.height or probed.get("height", 0)
+            info.performer = info.performer or probed.get("performer")
+            info.title = info.title or probed.get("title")
+        if media_type == "video" and not info.thumb:
+            info.thumb = await generate_thumbnail(media_path, info.duration, self.pool)
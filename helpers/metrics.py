@@ -0,0 +1,255 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from time import perf_counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers a quick API call up to a multi-gigabyte transfer
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+Labels = Tuple[str, ...]
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._children: Dict[Labels, object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh value for one combination of label values."""
+
+    @abstractmethod
+    def _render_child(self, values: Labels, child) -> List[str]:
+        """Exposition lines for one child."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}"]
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Labels = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}")
+        labels = _format_labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class _Callback:
+    """Values read from the application when scraped, so hot paths pay nothing."""
+
+    def __init__(self, name: str, help: str, kind: str, collect: Callable[[], Samples]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            log.error(f"Collecting {self.name} failed: {e}")
+            return lines
+        for labels, value in samples:
+            lines.append(f"{self.name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    """Metrics of one process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Labels = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Labels = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge_callback(self, name: str, help: str, collect: Callable[[], Samples]):
+        """Gauge whose samples ``collect`` returns as ``(labels, value)`` pairs."""
+        self._metrics.pop(name, None)
+        return self._register(_Callback(name, help, "gauge", collect))
+
+    def counter_callback(self, name: str, help: str, collect: Callable[[], Samples]):
+        """Like ``gauge_callback``, for values that only ever grow."""
+        self._metrics.pop(name, None)
+        return self._register(_Callback(name, help, "counter", collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TRANSFER_BYTES = REGISTRY.counter(
+    "rcdl_transfer_bytes_total", "Bytes moved to or from Telegram.", ("direction",)
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "rcdl_stage_seconds", "Time spent per processing stage.", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "rcdl_stage_errors_total", "Stages that ended with an exception.", ("stage",)
+)
+FLOOD_WAITS = REGISTRY.counter(
+    "rcdl_flood_waits_total", "FloodWait errors received.", ("client", "kind")
+)
+FLOOD_WAIT_SECONDS = REGISTRY.counter(
+    "rcdl_flood_wait_seconds_total", "Seconds Telegram asked to wait.", ("client", "kind")
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time one stage (resolve, get_messages, download, ffprobe, thumbnail, upload...)."""
+    started = perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(name).observe(perf_counter() - started)
+
+
+def cache_samples(**caches) -> Samples:
+    """``rcdl_cache_requests_total`` samples from objects with ``hits``/``misses``."""
+    for name, cache in caches.items():
+        yield {"cache": name, "result": "hit"}, cache.hits
+        yield {"cache": name, "result": "miss"}, cache.misses
+
+
+async def start_metrics_server(port: int, registry: Registry = REGISTRY, host: str = "0.0.0.0") -> asyncio.AbstractServer:
+    """Serve ``registry`` at ``http://host:port/metrics`` for processes without a web app."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 10)
+            # Skip the headers, the request line is all we need
+            while (await asyncio.wait_for(reader.readline(), 10)).strip():
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, content_type, body = "200 OK", CONTENT_TYPE, registry.render().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    log.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
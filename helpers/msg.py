@@ -64,3 +64,17 @@ def get_file_name(message_id: int, chat_message) -> str:
         return f"{message_id}.jpg"
     else:
         return f"{message_id}"
+
+
+def get_file_unique_id(chat_message):
+    if not chat_message.media:
+        return None
+    media = getattr(chat_message, chat_message.media.value, None)
+    return getattr(media, "file_unique_id", None)
+
+
+def get_file_size(chat_message) -> int:
+    if not chat_message.media:
+        return 0
+    media = getattr(chat_message, chat_message.media.value, None)
+    return getattr(media, "file_size", 0) or 0
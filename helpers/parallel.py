@@ -0,0 +1,282 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import json
+import asyncio
+import inspect
+import logging
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from pyrogram.types import Message
+
+from helpers.metrics import TRANSFER_BYTES, stage
+from helpers.ratelimit import transfer
+
+log = logging.getLogger(__name__)
+
+# Telegram serves files in 1 MiB parts; offsets passed to stream_media count parts
+PART_SIZE = 1024 * 1024
+
+MEDIA_KINDS = ("audio", "document", "photo", "sticker", "animation", "video", "voice", "video_note")
+
+# Seconds between saves of the completed offsets of a partial download
+CHECKPOINT_INTERVAL = 2.0
+
+
+def _media(message: Message):
+    for kind in MEDIA_KINDS:
+        media = getattr(message, kind, None)
+        if media is not None:
+            return media
+    return None
+
+
+def _media_size(message: Message) -> int:
+    return getattr(_media(message), "file_size", 0) or 0
+
+
+def _load_parts(path: str, identity: dict) -> Dict[int, int]:
+    """Bytes done per segment from a ``.parts`` file, if it matches ``identity``."""
+    try:
+        with open(path) as file:
+            state = json.load(file)
+        if any(state.get(key) != value for key, value in identity.items()):
+            return {}
+        return {int(first_part): int(done) for first_part, done in state["done"].items()}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return {}
+
+
+def _save_parts(path: str, temp_path: str, state: dict):
+    # The offsets may only claim bytes that are safely on disk
+    fd = os.open(temp_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    with open(path + ".new", "w") as file:
+        json.dump(state, file)
+    os.replace(path + ".new", path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def _refetch(client: Client, message: Message) -> Optional[Message]:
+    """The message again, with a fresh file reference for its media."""
+    try:
+        fresh = await client.get_messages(message.chat.id, message.id)
+    except Exception as e:
+        log.warning(f"Could not refresh message {message.id}: {e}")
+        return None
+    if not fresh or getattr(fresh, "empty", False) or _media(fresh) is None:
+        return None
+    return fresh
+
+
+def _write_at(file, offset: int, data: bytes):
+    file.seek(offset)
+    file.write(data)
+    # Make the bytes visible to readers of the .temp file before reporting them
+    file.flush()
+
+
+class _Segment:
+    def __init__(self, first_part: int, size: int):
+        self.first_part = first_part
+        self.size = size
+        self.done = 0
+
+
+async def download_parallel(
+    client: Client,
+    message: Message,
+    file_name: str,
+    connections: int = 4,
+    segment_size: int = 64 * PART_SIZE,
+    retries: int = 3,
+    progress: Optional[Callable] = None,
+    progress_args: tuple = (),
+) -> str:
+    """Download a message's media over several connections at once.
+
+    The file is split into ``segment_size`` segments that up to
+    ``connections`` workers fetch in order with ``stream_media``, each on its
+    own media session, writing into a preallocated ``file_name + ".temp"``
+    that is renamed to ``file_name`` when complete. ``progress`` receives the
+    length of the contiguous prefix written so far, so readers of the
+    ``.temp`` file can trust everything below it.
+
+    The bytes completed per segment are saved to ``file_name + ".parts"``
+    every few seconds and when the download fails, so a later call for the
+    same file (after a restart, say) continues where it stopped. Stalled
+    segments refetch the message in case its file reference expired.
+
+    Files no larger than one segment use a plain ``download_media`` and
+    start over when interrupted.
+    """
+    media = _media(message)
+    file_size = _media_size(message)
+    segment_size = max(PART_SIZE, segment_size - segment_size % PART_SIZE)
+    downloaded = TRANSFER_BYTES.labels("download")
+    if file_size <= segment_size:
+        with stage("download"):
+            async with transfer(client, "download"):
+                path = await client.download_media(
+                    message, file_name=file_name, progress=progress, progress_args=progress_args
+                )
+                if not path:
+                    # download_media swallows errors such as an expired file reference
+                    fresh = await _refetch(client, message)
+                    if fresh:
+                        path = await client.download_media(
+                            fresh, file_name=file_name, progress=progress, progress_args=progress_args
+                        )
+        if path:
+            downloaded.inc(file_size)
+        return path
+
+    directory = os.path.dirname(os.path.abspath(file_name))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = file_name + ".temp"
+    parts_path = file_name + ".parts"
+    identity = {
+        "file_unique_id": getattr(media, "file_unique_id", None),
+        "size": file_size,
+        "segment_size": segment_size,
+    }
+
+    segments: List[_Segment] = [
+        _Segment(offset // PART_SIZE, min(segment_size, file_size - offset))
+        for offset in range(0, file_size, segment_size)
+    ]
+    resumed = 0
+    if os.path.isfile(temp_path) and os.path.getsize(temp_path) == file_size:
+        done = _load_parts(parts_path, identity)
+        for segment in segments:
+            restored = min(segment.size, max(0, done.get(segment.first_part, 0)))
+            # Offsets are whole parts except at the end of a segment
+            segment.done = restored if restored == segment.size else restored - restored % PART_SIZE
+            resumed += segment.done
+    if resumed:
+        log.info(f"Resuming {file_name} at {resumed}/{file_size} bytes")
+    else:
+        with open(temp_path, "wb") as file:
+            file.truncate(file_size)
+
+    pending = iter(segments)
+    reported = 0
+    source = message
+    refresh_lock = asyncio.Lock()
+    checkpoint_lock = asyncio.Lock()
+    saved_at = monotonic()
+
+    async def checkpoint(force: bool = False):
+        nonlocal saved_at
+        if not force and monotonic() - saved_at < CHECKPOINT_INTERVAL:
+            return
+        saved_at = monotonic()
+        async with checkpoint_lock:
+            state = dict(identity, done={str(s.first_part): s.done for s in segments})
+            await asyncio.to_thread(_save_parts, parts_path, temp_path, state)
+
+    async def refresh(stale: Message):
+        nonlocal source
+        async with refresh_lock:
+            # Another worker may have refreshed it already
+            if source is stale:
+                fresh = await _refetch(client, stale)
+                if fresh:
+                    source = fresh
+
+    async def report():
+        nonlocal reported
+        watermark = 0
+        for segment in segments:
+            watermark += segment.done
+            if segment.done < segment.size:
+                break
+        if progress is None or watermark == reported:
+            return
+        reported = watermark
+        result = progress(watermark, file_size, *progress_args)
+        if inspect.isawaitable(result):
+            await result
+
+    async def fetch(segment: _Segment, file):
+        failures = 0
+        while segment.done < segment.size:
+            before = segment.done
+            current = source
+            part = segment.first_part + segment.done // PART_SIZE
+            parts_left = -(-(segment.size - segment.done) // PART_SIZE)
+            stream = client.stream_media(current, limit=parts_left, offset=part)
+            try:
+                async with transfer(client, "download"):
+                    async for chunk in stream:
+                        chunk = chunk[:segment.size - segment.done]
+                        await asyncio.to_thread(
+                            _write_at, file, segment.first_part * PART_SIZE + segment.done, chunk
+                        )
+                        segment.done += len(chunk)
+                        downloaded.inc(len(chunk))
+                        await report()
+                        await checkpoint()
+                        if segment.done >= segment.size:
+                            break
+            except FloodWait as e:
+                log.warning(f"FloodWait of {e.value}s while fetching part {part}")
+                await asyncio.sleep(e.value)
+                continue
+            finally:
+                # Release the media session and transmission slot right away
+                await stream.aclose()
+
+            if segment.done < segment.size:
+                # stream_media stops quietly on network errors, resume from the last part
+                failures = 0 if segment.done > before else failures + 1
+                if failures > retries:
+                    raise IOError(
+                        f"Segment at part {segment.first_part} stalled at "
+                        f"{segment.done}/{segment.size} bytes"
+                    )
+                if failures:
+                    await refresh(current)
+                await asyncio.sleep(failures)
+
+    async def worker():
+        with open(temp_path, "r+b") as file:
+            for segment in pending:
+                await fetch(segment, file)
+
+    await report()
+    workers = [
+        asyncio.create_task(worker()) for _ in range(min(max(1, connections), len(segments)))
+    ]
+    try:
+        with stage("download"):
+            await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Keep the partial file for the next attempt
+        try:
+            await checkpoint(force=True)
+        except Exception as e:
+            log.warning(f"Could not save download state of {file_name}: {e}")
+            _remove(temp_path)
+            _remove(parts_path)
+        raise
+
+    os.replace(temp_path, file_name)
+    _remove(parts_path)
+    return file_name
@@ -0,0 +1,164 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import math
+import asyncio
+import logging
+from time import monotonic
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.types import Message
+
+from helpers.files import get_readable_file_size, get_readable_time
+
+log = logging.getLogger(__name__)
+
+PROGRESS_TEMPLATE = """{action}
+
+{bar}
+Percentage: {percentage:.2f}% | {current}/{total}
+Speed: {speed}/s
+Estimated Time Left: {eta}
+"""
+
+
+class SpeedMeter:
+    """Transfer speed and ETA from raw byte counters.
+
+    ``update`` only does arithmetic, so it is cheap enough to call from hot
+    download loops. The speed is an exponential moving average of samples
+    taken at least ``window`` seconds apart.
+    """
+
+    def __init__(self, smoothing: float = 0.3, window: float = 1.0):
+        self.smoothing = smoothing
+        self.window = window
+        self.current = 0
+        self.total = 0
+        self.speed = 0.0
+        self._sample_at = monotonic()
+        self._sample_bytes = 0
+
+    def update(self, current: int, total: int):
+        self.current, self.total = current, total
+        now = monotonic()
+        elapsed = now - self._sample_at
+        if elapsed < self.window:
+            return
+        rate = max(0, current - self._sample_bytes) / elapsed
+        self.speed = rate if not self.speed else (
+            self.smoothing * rate + (1 - self.smoothing) * self.speed
+        )
+        self._sample_at, self._sample_bytes = now, current
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.current / self.total) if self.total > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        if not self.speed or self.total <= 0:
+            return None
+        return max(0, self.total - self.current) / self.speed
+
+
+class ProgressTracker:
+    """Progress of one transfer shown in one Telegram message."""
+
+    def __init__(self, message: Message, action: str):
+        self.message = message
+        self.action = action
+        self.meter = SpeedMeter()
+        self.dirty = False
+        self.flushed_at = 0.0
+
+    async def update(self, current: int, total: int, *args):
+        """Progress callback for Pyrogram and ``download_parallel``; never edits."""
+        self.meter.update(current, total)
+        self.dirty = True
+
+    def render(self) -> str:
+        meter = self.meter
+        filled = math.floor(meter.fraction * 20)
+        eta = meter.eta()
+        return PROGRESS_TEMPLATE.format(
+            action=self.action,
+            bar="▓" * filled + "░" * (20 - filled),
+            percentage=meter.fraction * 100,
+            current=get_readable_file_size(meter.current),
+            total=get_readable_file_size(meter.total),
+            speed=get_readable_file_size(meter.speed),
+            eta=get_readable_time(eta) if eta is not None else "-",
+        )
+
+
+class ProgressHub:
+    """Turns progress counters into Telegram message edits at a bounded rate.
+
+    Trackers only record numbers; a single background task edits at most
+    one progress message per chat every ``chat_interval`` seconds, taking
+    turns between the transfers of that chat, and backs off on FloodWait.
+    """
+
+    def __init__(self, chat_interval: float = 3.0, tick: float = 0.5):
+        self.chat_interval = chat_interval
+        self.tick = tick
+        self._trackers: Dict[int, List[ProgressTracker]] = {}
+        self._next_edit: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.edits = 0
+        self.skipped = 0
+
+    @contextmanager
+    def track(self, message: Message, action: str) -> Iterator[ProgressTracker]:
+        """Show the progress of the enclosed transfer in ``message``."""
+        tracker = ProgressTracker(message, action)
+        chat_id = message.chat.id
+        self._trackers.setdefault(chat_id, []).append(tracker)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            yield tracker
+        finally:
+            trackers = self._trackers.get(chat_id, [])
+            if tracker in trackers:
+                trackers.remove(tracker)
+            if not trackers:
+                self._trackers.pop(chat_id, None)
+
+    @property
+    def active(self) -> int:
+        return sum(len(trackers) for trackers in self._trackers.values())
+
+    async def _run(self):
+        while self._trackers:
+            await asyncio.sleep(self.tick)
+            now = monotonic()
+            flushes = []
+            for chat_id, trackers in list(self._trackers.items()):
+                if now < self._next_edit.get(chat_id, 0):
+                    continue
+                dirty = [tracker for tracker in trackers if tracker.dirty]
+                if not dirty:
+                    continue
+                # The transfer that waited longest gets this chat's next edit
+                tracker = min(dirty, key=lambda t: t.flushed_at)
+                self._next_edit[chat_id] = now + self.chat_interval
+                flushes.append(self._flush(chat_id, tracker))
+            await asyncio.gather(*flushes)
+        self._next_edit.clear()
+
+    async def _flush(self, chat_id: int, tracker: ProgressTracker):
+        tracker.dirty = False
+        tracker.flushed_at = monotonic()
+        try:
+            await tracker.message.edit(tracker.render())
+            self.edits += 1
+        except MessageNotModified:
+            self.skipped += 1
+        except FloodWait as e:
+            self._next_edit[chat_id] = monotonic() + e.value
+            log.warning(f"FloodWait of {e.value}s on progress edits in chat {chat_id}")
+        except Exception as e:
+            log.debug(f"Progress edit failed in chat {chat_id}: {e}")
@@ -0,0 +1,187 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+import logging
+from time import monotonic
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, Iterable, Tuple
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+
+from helpers.metrics import FLOOD_WAITS, FLOOD_WAIT_SECONDS
+
+log = logging.getLogger(__name__)
+
+# Method class -> (requests per second, burst)
+DEFAULT_RATES: Dict[str, Tuple[float, int]] = {
+    "read": (10, 20),
+    "history": (5, 10),
+    "send": (5, 10),
+    "download": (10, 20),
+    "upload": (5, 10),
+    "other": (10, 20),
+}
+
+METHOD_CLASSES = {
+    "GetMessages": "read",
+    "GetChannels": "read",
+    "GetChats": "read",
+    "GetUsers": "read",
+    "GetFullChannel": "read",
+    "GetFullUser": "read",
+    "ResolveUsername": "read",
+    "GetHistory": "history",
+    "Search": "history",
+    "GetReplies": "history",
+    "SendMessage": "send",
+    "SendMedia": "send",
+    "SendMultiMedia": "send",
+    "ForwardMessages": "send",
+    "EditMessage": "send",
+    "DeleteMessages": "send",
+    "UploadMedia": "send",
+    "GetFile": "download",
+    "SaveFilePart": "upload",
+    "SaveBigFilePart": "upload",
+}
+
+
+def method_class(query: Any) -> str:
+    name = getattr(query, "QUALNAME", type(query).__name__).rsplit(".", 1)[-1]
+    return METHOD_CLASSES.get(name, "other")
+
+
+class TokenBucket:
+    """Token bucket whose rate halves on FloodWait and climbs back on success."""
+
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self.calls = 0
+        self.flood_waits = 0
+        self._updated = monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            now = monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.calls += 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def success(self):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+    def flood(self, seconds: float):
+        self.flood_waits += 1
+        self.paused_until = max(self.paused_until, monotonic() + seconds)
+        self.rate = max(self.base_rate * 0.05, self.rate / 2)
+        self.tokens = 0.0
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "rate": round(self.rate, 2),
+            "base_rate": self.base_rate,
+            "tokens": round(min(self.burst, self.tokens), 2),
+            "paused_for": round(max(0.0, self.paused_until - monotonic()), 1),
+            "calls": self.calls,
+            "flood_waits": self.flood_waits,
+        }
+
+
+class RateLimiter:
+    """Per-account limiter for every Telegram request of a client.
+
+    ``attach`` routes ``client.invoke`` through one token bucket per method
+    class. FloodWaits pause that class for the requested time, halve its
+    rate and are retried when no longer than ``max_wait``; the rate then
+    ramps back up as requests succeed. File transfers run on separate media
+    sessions, so their call sites use ``transfer`` instead.
+    """
+
+    def __init__(self, name: str, max_wait: float = 60, rates: Dict[str, Tuple[float, int]] = DEFAULT_RATES):
+        self.name = name
+        self.max_wait = max_wait
+        self.buckets = {kind: TokenBucket(rate, burst) for kind, (rate, burst) in rates.items()}
+
+    def attach(self, client: Client) -> "RateLimiter":
+        original = client.invoke
+
+        async def invoke(query, *args, sleep_threshold: float = None, **kwargs):
+            bucket = self.buckets[method_class(query)]
+            threshold = max(self.max_wait, sleep_threshold or 0)
+            while True:
+                await bucket.acquire()
+                try:
+                    # sleep_threshold=0 so every FloodWait reaches the limiter
+                    result = await original(query, *args, sleep_threshold=0, **kwargs)
+                except FloodWait as e:
+                    bucket.flood(e.value)
+                    self._record_flood(method_class(query), e.value)
+                    log.warning(f"[{self.name}] FloodWait of {e.value}s on {method_class(query)} request")
+                    if e.value > threshold:
+                        raise
+                    continue
+                bucket.success()
+                return result
+
+        client.invoke = invoke
+        client.rate_limiter = self
+        return self
+
+    @asynccontextmanager
+    async def transfer(self, kind: str) -> AsyncIterator[None]:
+        """Pace one file transfer request and record its FloodWait, if any."""
+        bucket = self.buckets[kind]
+        await bucket.acquire()
+        try:
+            yield
+        except FloodWait as e:
+            bucket.flood(e.value)
+            self._record_flood(kind, e.value)
+            log.warning(f"[{self.name}] FloodWait of {e.value}s on {kind}")
+            raise
+        bucket.success()
+
+    def _record_flood(self, kind: str, seconds: float):
+        FLOOD_WAITS.labels(self.name, kind).inc()
+        FLOOD_WAIT_SECONDS.labels(self.name, kind).inc(seconds)
+
+    def paused_for(self, kinds: Iterable[str] = ()) -> float:
+        """Seconds until the given method classes (all by default) are out of FloodWait."""
+        now = monotonic()
+        pauses = [
+            bucket.paused_until - now
+            for kind, bucket in self.buckets.items()
+            if not kinds or kind in kinds
+        ]
+        return max([0.0] + pauses)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {kind: bucket.state() for kind, bucket in self.buckets.items()}
+
+    def summary(self) -> str:
+        paused = [kind for kind, bucket in self.buckets.items() if bucket.paused_until > monotonic()]
+        flood_waits = sum(bucket.flood_waits for bucket in self.buckets.values())
+        return f"{flood_waits} FloodWait(s)" + (f", paused: {', '.join(paused)}" if paused else "")
+
+
+def transfer(client: Client, kind: str) -> AsyncContextManager:
+    """``RateLimiter.transfer`` of the limiter attached to ``client``, if it has one."""
+    limiter = getattr(client, "rate_limiter", None)
+    return limiter.transfer(kind) if limiter else nullcontext()
@@ -0,0 +1,237 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import math
+import asyncio
+import logging
+import inspect
+from typing import Callable, Optional
+
+from pyrogram import Client, raw, types, utils
+from pyrogram.errors import FilePartMissing, FloodWait
+from pyrogram.session import Session
+from pyrogram.types import Message
+
+from helpers.mediainfo import MediaInfo
+from helpers.metrics import TRANSFER_BYTES, stage
+from helpers.parallel import download_parallel
+from helpers.ratelimit import transfer
+
+log = logging.getLogger(__name__)
+
+# Telegram upload part size; files over 10 MiB must use SaveBigFilePart
+UPLOAD_PART_SIZE = 512 * 1024
+BIG_FILE_SIZE = 10 * 1024 * 1024
+
+RELAY_MEDIA_TYPES = ("video", "audio", "document")
+
+
+def can_relay(chat_message: Message, min_size: int) -> bool:
+    if not chat_message.media or chat_message.media.value not in RELAY_MEDIA_TYPES:
+        return False
+    media = getattr(chat_message, chat_message.media.value)
+    return (media.file_size or 0) > max(min_size, BIG_FILE_SIZE)
+
+
+def _read_at(path: str, offset: int, size: int) -> bytes:
+    with open(path, "rb") as file:
+        file.seek(offset)
+        return file.read(size)
+
+
+class _Watermark:
+    """Length of the downloaded prefix, with a way to wait for it to grow."""
+
+    def __init__(self):
+        self.current = 0
+        self._event = asyncio.Event()
+
+    def advance(self, current: int):
+        self.current = max(self.current, current)
+        self.notify()
+
+    def notify(self):
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _attributes(media_type: str, info: MediaInfo, file_name: str) -> list:
+    attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+    if media_type == "video":
+        attributes.append(raw.types.DocumentAttributeVideo(
+            duration=info.duration,
+            w=info.width,
+            h=info.height,
+            supports_streaming=True,
+        ))
+    elif media_type == "audio":
+        attributes.append(raw.types.DocumentAttributeAudio(
+            duration=info.duration,
+            title=info.title,
+            performer=info.performer,
+        ))
+    return attributes
+
+
+async def relay_media(
+    bot: Client,
+    user: Client,
+    chat_message: Message,
+    chat_id: int,
+    download_path: str,
+    caption: str,
+    info: Optional[MediaInfo] = None,
+    connections: int = 4,
+    segment_size: int = 64 * 1024 * 1024,
+    upload_workers: int = 4,
+    retries: int = 3,
+    progress: Optional[Callable] = None,
+    progress_args: tuple = (),
+) -> Optional[Message]:
+    """Download a large file with ``user`` while ``bot`` uploads it to ``chat_id``.
+
+    Each 512 KiB upload part is sent as soon as the download's contiguous
+    prefix covers it, so the total time is close to the slower of the two
+    transfers instead of their sum. ``info`` must not need the file itself
+    (see ``MediaInfoCache.get``), since it is incomplete when sending starts.
+    """
+    media_type = chat_message.media.value
+    media = getattr(chat_message, media_type)
+    file_size = media.file_size
+    info = info or MediaInfo()
+    file_name = getattr(media, "file_name", None) or download_path.rsplit("/", 1)[-1]
+    total_parts = math.ceil(file_size / UPLOAD_PART_SIZE)
+    temp_path = download_path + ".temp"
+
+    downloaded = _Watermark()
+
+    async def download():
+        try:
+            await download_parallel(
+                user,
+                chat_message,
+                download_path,
+                connections=connections,
+                segment_size=segment_size,
+                progress=lambda current, total: downloaded.advance(current),
+            )
+        finally:
+            downloaded.notify()
+
+    download_task = asyncio.create_task(download())
+
+    async def read_part(part: int) -> bytes:
+        start = part * UPLOAD_PART_SIZE
+        size = min(UPLOAD_PART_SIZE, file_size - start)
+        while True:
+            if download_task.done():
+                # Raises if the download failed
+                download_task.result()
+            elif downloaded.current < start + size:
+                await downloaded.wait(timeout=1)
+                continue
+            for path in (temp_path, download_path):
+                try:
+                    data = await asyncio.to_thread(_read_at, path, start, size)
+                except FileNotFoundError:
+                    # Renamed from .temp to its final name in between
+                    continue
+                if len(data) == size:
+                    return data
+            await asyncio.sleep(0.1)
+
+    session = Session(
+        bot, await bot.storage.dc_id(), await bot.storage.auth_key(),
+        await bot.storage.test_mode(), is_media=True
+    )
+    file_id = bot.rnd_id()
+
+    async def save_part(part: int):
+        data = await read_part(part)
+        rpc = raw.functions.upload.SaveBigFilePart(
+            file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=data
+        )
+        for attempt in range(retries + 1):
+            try:
+                await session.invoke(rpc)
+                TRANSFER_BYTES.labels("upload").inc(len(data))
+                return len(data)
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                log.warning(f"Upload of part {part}/{total_parts} failed, retrying: {e}")
+                await asyncio.sleep(attempt + 1)
+        raise IOError(f"Upload of part {part}/{total_parts} kept hitting FloodWait")
+
+    next_part = 0
+    uploaded = 0
+
+    async def upload_worker():
+        nonlocal next_part, uploaded
+        while next_part < total_parts:
+            part = next_part
+            next_part += 1
+            size = await save_part(part)
+            uploaded += size
+            if progress:
+                result = progress(uploaded, file_size, *progress_args)
+                if inspect.isawaitable(result):
+                    await result
+
+    workers = []
+    try:
+        with stage("relay"):
+            async with transfer(bot, "upload"):
+                await session.start()
+
+                thumb = None
+                if info.thumb:
+                    thumb = await bot.save_file(info.thumb_file())
+
+                workers = [asyncio.create_task(upload_worker()) for _ in range(upload_workers)]
+                await asyncio.gather(*workers)
+                await download_task
+
+                media_input = raw.types.InputMediaUploadedDocument(
+                    file=raw.types.InputFileBig(id=file_id, parts=total_parts, name=file_name),
+                    mime_type=getattr(media, "mime_type", None) or "application/octet-stream",
+                    attributes=_attributes(media_type, info, file_name),
+                    thumb=thumb,
+                    force_file=media_type == "document" or None,
+                )
+                peer = await bot.resolve_peer(chat_id)
+                while True:
+                    try:
+                        r = await bot.invoke(raw.functions.messages.SendMedia(
+                            peer=peer,
+                            media=media_input,
+                            random_id=bot.rnd_id(),
+                            **await utils.parse_text_entities(bot, caption or "", None, None)
+                        ))
+                    except FilePartMissing as e:
+                        log.warning(f"Telegram is missing part {e.value}, uploading it again")
+                        await save_part(e.value)
+                        continue
+                    break
+    finally:
+        for task in workers + [download_task]:
+            task.cancel()
+        await asyncio.gather(*workers, download_task, return_exceptions=True)
+        await session.stop()
+
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            return await types.Message._parse(
+                bot, update.message,
+                {u.id: u for u in r.users},
+                {c.id: c for c in r.chats},
+            )
+    return None
@@ -0,0 +1,143 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import heapq
+import asyncio
+import logging
+from time import time
+from itertools import count
+from collections import defaultdict, deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Download queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DownloadScheduler:
+    """Priority queue drained by a fixed pool of workers.
+
+    Higher priority runs first, equal priorities run in submission order, and
+    no chat may occupy more than ``per_chat`` workers at the same time.
+    """
+
+    def __init__(self, workers: int = 3, max_queue: int = 200, per_chat: int = 2):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.per_chat = max(1, per_chat)
+
+        self._heap: List[list] = []
+        self._seq = count()
+        self._running: Dict[str, int] = {}
+        self._per_chat: Dict[int, int] = defaultdict(int)
+        self._durations = deque(maxlen=50)
+        self._handler: Optional[Callable[..., Awaitable]] = None
+        self._cond: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, handler: Callable[..., Awaitable]):
+        self._handler = handler
+        self._cond = asyncio.Condition()
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        log.info(
+            f"Scheduler started: {self.workers} workers, queue {self.max_queue}, "
+            f"{self.per_chat} per chat"
+        )
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def check_capacity(self):
+        """Raise ``QueueFullError`` if a task submitted now would be rejected."""
+        if len(self._heap) >= self.max_queue:
+            raise QueueFullError(self.retry_after())
+
+    async def submit(self, task_id: str, chat_id: int, *args, priority: int = 1) -> int:
+        async with self._cond:
+            self.check_capacity()
+            heapq.heappush(
+                self._heap, [-priority, next(self._seq), task_id, chat_id, args]
+            )
+            self._cond.notify()
+        return self.position(task_id)
+
+    def position(self, task_id: str) -> Optional[int]:
+        # Entries are ordered by (-priority, seq), unique per entry, so one
+        # pass counting the entries ahead replaces sorting the whole heap
+        target = next((entry for entry in self._heap if entry[2] == task_id), None)
+        if target is None:
+            return None
+        return 1 + sum(1 for entry in self._heap if entry[:2] < target[:2])
+
+    def average_duration(self) -> float:
+        if not self._durations:
+            return 30.0
+        return sum(self._durations) / len(self._durations)
+
+    def estimated_wait(self, position: int) -> float:
+        # Rounds of work ahead of this task, each taking an average task time
+        rounds = (position + len(self._running) - 1) // self.workers
+        return rounds * self.average_duration()
+
+    def retry_after(self) -> int:
+        # A queue slot frees up every time one of the workers finishes a task
+        return max(1, round(self.average_duration() / self.workers))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": len(self._heap),
+            "running": len(self._running),
+            "max_queue": self.max_queue,
+            "per_chat": self.per_chat,
+            "average_duration": round(self.average_duration(), 2),
+        }
+
+    def _pop_runnable(self) -> Optional[list]:
+        skipped = []
+        entry = None
+        while self._heap:
+            candidate = heapq.heappop(self._heap)
+            if self._per_chat.get(candidate[3], 0) < self.per_chat:
+                entry = candidate
+                break
+            skipped.append(candidate)
+        for candidate in skipped:
+            heapq.heappush(self._heap, candidate)
+        return entry
+
+    async def _worker(self, index: int):
+        while True:
+            async with self._cond:
+                entry = self._pop_runnable()
+                while entry is None:
+                    await self._cond.wait()
+                    entry = self._pop_runnable()
+                _, _, task_id, chat_id, args = entry
+                self._running[task_id] = chat_id
+                self._per_chat[chat_id] += 1
+
+            started = time()
+            try:
+                await self._handler(task_id, chat_id, *args)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"Worker {index} failed on task {task_id}: {e}")
+            finally:
+                self._durations.append(time() - started)
+                async with self._cond:
+                    self._running.pop(task_id, None)
+                    self._per_chat[chat_id] -= 1
+                    if self._per_chat[chat_id] <= 0:
+                        del self._per_chat[chat_id]
+                    self._cond.notify_all()
@@ -0,0 +1,148 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, TypeVar, Union
+
+from pyrogram import Client
+from pyrogram.errors import (
+    ChannelBanned,
+    ChannelInvalid,
+    ChannelPrivate,
+    ChatForbidden,
+    ChatIdInvalid,
+    FloodWait,
+    PeerIdInvalid,
+    UsernameInvalid,
+    UsernameNotOccupied,
+)
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+ChatKey = Union[int, str, None]
+
+# The account is not in the chat, or does not know it yet
+ACCESS_ERRORS = (
+    ChannelBanned,
+    ChannelInvalid,
+    ChannelPrivate,
+    ChatForbidden,
+    ChatIdInvalid,
+    PeerIdInvalid,
+    UsernameInvalid,
+    UsernameNotOccupied,
+)
+
+# Method classes whose FloodWait takes a session out of rotation
+ROUTED_KINDS = ("read", "history", "download")
+
+
+def session_names(count: int, base: str = "user_session") -> List[str]:
+    """``user_session`` for the first account, ``user_session_2`` and so on for the rest."""
+    return [base if index == 0 else f"{base}_{index + 1}" for index in range(count)]
+
+
+class SessionPool:
+    """User accounts sharing the download and listing load.
+
+    Each call goes to the session with the fewest calls in flight, skipping
+    sessions whose rate limiter is paused by a FloodWait and sessions that
+    failed to access the chat before. ``call`` moves on to the next session
+    when one cannot access the chat or hits a FloodWait it will not wait
+    out. The first session is ``primary``, for calls that are not routed.
+    """
+
+    def __init__(self, clients: Sequence[Client]):
+        if not clients:
+            raise ValueError("SessionPool needs at least one client")
+        self.clients = list(clients)
+        self._load: Dict[str, int] = {client.name: 0 for client in self.clients}
+        self._leases: Dict[str, int] = {client.name: 0 for client in self.clients}
+        # chat -> names of the sessions that could not access it
+        self._no_access: Dict[ChatKey, Set[str]] = defaultdict(set)
+        self.failovers = 0
+
+    @property
+    def primary(self) -> Client:
+        return self.clients[0]
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    @staticmethod
+    def _paused_for(client: Client) -> float:
+        limiter = getattr(client, "rate_limiter", None)
+        return limiter.paused_for(ROUTED_KINDS) if limiter else 0.0
+
+    def candidates(self, chat: ChatKey = None) -> List[Client]:
+        """Sessions to try for ``chat``, best first."""
+        blocked = self._no_access.get(chat, set()) if chat is not None else set()
+        # Sessions are added to a chat all the time, so never rule out every one
+        usable = [client for client in self.clients if client.name not in blocked] or self.clients
+        return sorted(
+            usable,
+            key=lambda client: (self._paused_for(client), self._load[client.name], self._leases[client.name]),
+        )
+
+    def pick(self, chat: ChatKey = None) -> Client:
+        return self.candidates(chat)[0]
+
+    @asynccontextmanager
+    async def lease(self, chat: ChatKey = None, client: Optional[Client] = None) -> AsyncIterator[Client]:
+        """Hold ``client`` (or the best session for ``chat``) for a call and count its load."""
+        client = client or self.pick(chat)
+        self._load[client.name] += 1
+        self._leases[client.name] += 1
+        try:
+            yield client
+        except ACCESS_ERRORS:
+            if chat is not None:
+                self._no_access[chat].add(client.name)
+            raise
+        else:
+            if chat in self._no_access:
+                self._no_access[chat].discard(client.name)
+        finally:
+            self._load[client.name] -= 1
+
+    async def call(self, chat: ChatKey, func: Callable[[Client], Awaitable[T]]) -> T:
+        """``func(client)`` on the best session, failing over to the others."""
+        error: Optional[Exception] = None
+        for client in self.candidates(chat):
+            if error is not None:
+                self.failovers += 1
+                log.info(f"Retrying on {client.name} after {type(error).__name__}")
+            try:
+                async with self.lease(chat, client) as leased:
+                    return await func(leased)
+            except ACCESS_ERRORS + (FloodWait,) as e:
+                error = e
+        raise error
+
+    async def start(self):
+        for client in self.clients:
+            await client.start()
+            log.info(f"Started session {client.name}")
+
+    async def stop(self):
+        for client in self.clients:
+            try:
+                await client.stop()
+            except ConnectionError:
+                # Already stopped
+                pass
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": client.name,
+                "in_flight": self._load[client.name],
+                "calls": self._leases[client.name],
+                "paused_for": round(self._paused_for(client), 1),
+                "chats_without_access": sum(client.name in names for names in self._no_access.values()),
+            }
+            for client in self.clients
+        ]
@@ -0,0 +1,233 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import shutil
+import asyncio
+import logging
+from pathlib import Path
+from time import monotonic, time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, List, Optional, Tuple, Union
+
+log = logging.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+# Unfinished downloads and their saved offsets
+PARTIAL_SUFFIXES = (".temp", ".parts")
+
+
+class InsufficientStorageError(Exception):
+    def __init__(self, needed: int, available: int):
+        super().__init__(
+            f"Not enough storage: {needed} bytes needed, {max(0, available)} available"
+        )
+        self.needed = needed
+        self.available = available
+
+
+class StorageManager:
+    """Keeps downloaded files under ``roots`` within a byte quota.
+
+    Downloads reserve their size first. When it does not fit in the quota
+    (or in the disk's free space minus ``min_free``), completed files are
+    evicted in least-recently-accessed order until it does; files of
+    active reservations are never evicted. ``sweep`` removes ``.temp`` and
+    ``.parts`` leftovers of abandoned downloads and empty directories.
+    """
+
+    def __init__(
+        self,
+        roots: Iterable[PathLike],
+        quota: int = 0,
+        min_free: int = 0,
+        temp_max_age: float = 24 * 3600,
+    ):
+        self.roots = [Path(root) for root in roots]
+        for root in self.roots:
+            root.mkdir(parents=True, exist_ok=True)
+        self.quota = quota
+        self.min_free = min_free
+        self.temp_max_age = temp_max_age
+        # (path, size) of each reservation; path may be None
+        self._reservations: List[Tuple[Optional[Path], int]] = []
+        self._lock = asyncio.Lock()
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.swept_files = 0
+        self.rejected = 0
+
+    def _files(self) -> List[Tuple[float, int, Path]]:
+        files = []
+        for root in self.roots:
+            for directory, _, names in os.walk(root):
+                for name in names:
+                    path = Path(directory, name)
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_atime, stat.st_size, path))
+        return files
+
+    @property
+    def _active(self) -> List[Path]:
+        return [path for path, _ in tuple(self._reservations) if path is not None]
+
+    @staticmethod
+    def _under(path: Path, active: Path) -> bool:
+        return path == active or active in path.parents
+
+    @staticmethod
+    def _owner(path: Path) -> Path:
+        """The final path of a file, so ``x.temp`` belongs to a reservation of ``x``."""
+        path = path.resolve()
+        for suffix in PARTIAL_SUFFIXES:
+            if path.name.endswith(suffix):
+                return path.with_name(path.name[:-len(suffix)])
+        return path
+
+    def _protected(self, path: Path) -> bool:
+        owner = self._owner(path)
+        return any(self._under(owner, active) for active in self._active)
+
+    def _holds_active(self, directory: Path) -> bool:
+        resolved = directory.resolve()
+        return any(
+            self._under(resolved, active) or resolved in active.parents for active in self._active
+        )
+
+    def _outstanding(self, files: List[Tuple[float, int, Path]]) -> int:
+        """Reserved bytes not written yet; written ones already count as usage."""
+        outstanding = 0
+        for active, size in tuple(self._reservations):
+            written = 0
+            if active is not None:
+                written = sum(
+                    file_size for _, file_size, path in files if self._under(self._owner(path), active)
+                )
+            outstanding += max(0, size - written)
+        return outstanding
+
+    def _available(self, files: List[Tuple[float, int, Path]]) -> int:
+        outstanding = self._outstanding(files)
+        available = shutil.disk_usage(self.roots[0]).free - self.min_free - outstanding
+        if self.quota:
+            usage = sum(file_size for _, file_size, _ in files)
+            available = min(available, self.quota - usage - outstanding)
+        return available
+
+    def usage(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def reserved(self) -> int:
+        return sum(size for _, size in tuple(self._reservations))
+
+    def make_room(self, size: int) -> int:
+        """Evict old files until ``size`` more bytes fit; returns the bytes available."""
+        files = self._files()
+        available = self._available(files)
+        if available >= size:
+            return available
+
+        # Oldest access first; unfinished downloads are only removed by sweep
+        for _, file_size, path in sorted(files):
+            if available >= size:
+                break
+            if path.name.endswith(PARTIAL_SUFFIXES) or self._protected(path):
+                continue
+            try:
+                path.unlink()
+            except OSError as e:
+                log.warning(f"Could not evict {path}: {e}")
+                continue
+            available += file_size
+            self.evicted_files += 1
+            self.evicted_bytes += file_size
+            log.info(f"Evicted {path} ({file_size} bytes) to free space")
+        return available
+
+    def sweep(self) -> int:
+        """Delete stale partial downloads and empty directories; returns files removed."""
+        removed = 0
+        cutoff = time() - self.temp_max_age
+        for root in self.roots:
+            for directory, _, names in os.walk(root, topdown=False):
+                for name in names:
+                    path = Path(directory, name)
+                    if not name.endswith(PARTIAL_SUFFIXES) or self._protected(path):
+                        continue
+                    try:
+                        if path.stat().st_mtime < cutoff:
+                            path.unlink()
+                            removed += 1
+                            log.info(f"Removed orphaned download {path}")
+                    except OSError:
+                        pass
+                if Path(directory) != root and not self._holds_active(Path(directory)):
+                    try:
+                        os.rmdir(directory)
+                    except OSError:
+                        # Not empty
+                        pass
+        self.swept_files += removed
+        return removed
+
+    def touch(self, path: PathLike):
+        """Mark a file as just used, since atime updates are often disabled."""
+        try:
+            stat = os.stat(path)
+            os.utime(path, (time(), stat.st_mtime))
+        except OSError:
+            pass
+
+    @asynccontextmanager
+    async def reserve(self, size: int, path: Optional[PathLike] = None, timeout: float = 0) -> AsyncIterator[None]:
+        """Hold ``size`` bytes for a download to ``path`` (a file or a directory).
+
+        Waits up to ``timeout`` seconds for room to appear, then raises
+        ``InsufficientStorageError``. ``path`` and everything below it are
+        protected from eviction while the reservation is held.
+        """
+        deadline = monotonic() + timeout
+        while True:
+            async with self._lock:
+                available = await asyncio.to_thread(self.make_room, size)
+                if available >= size:
+                    reservation = (Path(path).resolve() if path else None, size)
+                    self._reservations.append(reservation)
+                    break
+            if monotonic() >= deadline:
+                self.rejected += 1
+                raise InsufficientStorageError(size, available)
+            await asyncio.sleep(min(5, max(0.1, deadline - monotonic())))
+
+        try:
+            yield
+        finally:
+            self._reservations.remove(reservation)
+
+    async def maintain(self, interval: float = 300):
+        """Sweep orphans and enforce the quota every ``interval`` seconds."""
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+                async with self._lock:
+                    await asyncio.to_thread(self.make_room, 0)
+            except Exception as e:
+                log.error(f"Storage maintenance failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        files = self._files()
+        return {
+            "usage_bytes": sum(size for _, size, _ in files),
+            "quota_bytes": self.quota,
+            "reserved_bytes": self.reserved(),
+            "available_bytes": max(0, self._available(files)),
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+            "swept_files": self.swept_files,
+            "rejected": self.rejected,
+        }
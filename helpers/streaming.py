@@ -0,0 +1,163 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from pathlib import Path
+from email.utils import formatdate
+from urllib.parse import quote
+from typing import Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+
+# One threadpool hop per MiB instead of per 8 KiB
+CHUNK_SIZE = 1024 * 1024
+
+
+def read_at(file, offset: int, size: int) -> bytes:
+    # seek + read instead of os.pread, which is not available on Windows
+    file.seek(offset)
+    return file.read(size)
+
+
+def read_file_at(path: Path, offset: int, size: int) -> bytes:
+    # Opened per read so a file that is still being written can be renamed
+    with open(path, "rb") as file:
+        return read_at(file, offset, size)
+
+
+def content_disposition(filename: str) -> str:
+    fallback = filename.encode("ascii", "ignore").decode() or "download"
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into an inclusive (start, end) pair.
+
+    Returns None when the header should be ignored (multiple ranges or
+    syntax errors) and raises ValueError when it is unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if not start:
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(0, size - length), size - 1
+        first = int(start)
+        last = int(end) if end else size - 1
+    except ValueError:
+        if start.isdigit() or end.isdigit():
+            raise
+        return None
+    if first >= size or last < first:
+        raise ValueError("Range not satisfiable")
+    return first, min(last, size - 1)
+
+
+class RangeFileResponse(Response):
+    """File response honouring ``Range``/``If-Range`` with 206 partial content.
+
+    Uses the ASGI ``http.response.zerocopysend`` extension when the server
+    offers it and falls back to reading large chunks in a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        request_headers,
+        filename: Optional[str] = None,
+        media_type: str = "application/octet-stream",
+        method: str = "GET",
+    ):
+        self.path = Path(path)
+        self.send_body = method.upper() != "HEAD"
+        stat = self.path.stat()
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+        super().__init__(status_code=200, media_type=media_type)
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["etag"] = etag
+        self.headers["last-modified"] = last_modified
+        self.headers["content-disposition"] = content_disposition(filename or self.path.name)
+
+        self.start, self.end = 0, size - 1
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and if_range and if_range not in (etag, last_modified):
+            # The client's partial copy is stale, send the whole file
+            range_header = None
+
+        if range_header and size:
+            try:
+                parsed = parse_range(range_header, size)
+            except ValueError:
+                self.status_code = 416
+                self.headers["content-range"] = f"bytes */{size}"
+                self.headers["content-length"] = "0"
+                self.send_body = False
+                return
+            if parsed:
+                self.start, self.end = parsed
+                self.status_code = 206
+                self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+
+        self.headers["content-length"] = str(self.end - self.start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        count = self.end - self.start + 1
+        if not self.send_body or count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        with open(self.path, "rb") as file:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.start,
+                    "count": count,
+                })
+                return
+
+            disconnected = asyncio.Event()
+
+            async def watch_disconnect():
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        disconnected.set()
+                        return
+
+            watcher = asyncio.create_task(watch_disconnect())
+            try:
+                offset = self.start
+                remaining = count
+                while remaining > 0 and not disconnected.is_set():
+                    chunk = await anyio.to_thread.run_sync(
+                        read_at, file, offset, min(CHUNK_SIZE, remaining)
+                    )
+                    if not chunk:
+                        # File shrank underneath us, end the response here
+                        await send({"type": "http.response.body", "body": b""})
+                        break
+                    offset += len(chunk)
+                    remaining -= len(chunk)
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    })
+            finally:
+                watcher.cancel()
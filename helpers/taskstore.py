@@ -0,0 +1,214 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import json
+import asyncio
+import logging
+import sqlite3
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+log = logging.getLogger(__name__)
+
+COLUMNS = (
+    "task_id", "status", "created_at", "chat_id", "message_id", "priority",
+    "progress", "file_name", "file_unique_id", "file_path", "file_size",
+    "actual_file_size", "error", "started_at", "completed_at", "failed_at",
+    "download_time",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    chat_id INTEGER,
+    message_id INTEGER,
+    priority INTEGER,
+    progress REAL,
+    file_name TEXT,
+    file_unique_id TEXT,
+    file_path TEXT,
+    file_size INTEGER,
+    actual_file_size INTEGER,
+    error TEXT,
+    started_at REAL,
+    completed_at REAL,
+    failed_at REAL,
+    download_time REAL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_message ON tasks (chat_id, message_id);
+"""
+
+
+class TaskStore:
+    """SQLite (WAL) backed task table with an in-memory cache of hot tasks.
+
+    Status changes are written through immediately; progress-only updates
+    are buffered and written in batches by ``flush``.
+    """
+
+    def __init__(self, path: Path, flush_interval: float = 2.0, cache_size: int = 1000):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self._db = sqlite3.connect(str(self.path), isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flusher: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+    # --- row <-> dict ---
+
+    @staticmethod
+    def _to_row(task_id: str, task: Dict[str, Any]) -> tuple:
+        extra = {k: v for k, v in task.items() if k not in COLUMNS}
+        values = [task_id] + [task.get(column) for column in COLUMNS[1:]]
+        return tuple(values) + (json.dumps(extra, ensure_ascii=False) if extra else None,)
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        task = {column: row[column] for column in COLUMNS[1:]}
+        if row["extra"]:
+            task.update(json.loads(row["extra"]))
+        return task
+
+    def _remember(self, task_id: str, task: Dict[str, Any]) -> Dict[str, Any]:
+        self._cache[task_id] = task
+        self._cache.move_to_end(task_id)
+        while len(self._cache) > self.cache_size:
+            oldest = next(iter(self._cache))
+            if oldest in self._dirty:
+                break
+            self._cache.pop(oldest)
+        return task
+
+    def _write(self, rows: Iterable[tuple]):
+        placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO tasks ({', '.join(COLUMNS)}, extra) VALUES ({placeholders})",
+                rows,
+            )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _notify(self, task_id: str, task: Dict[str, Any]):
+        for listener in self._listeners:
+            try:
+                listener(task_id, task)
+            except Exception as e:
+                log.error(f"Task listener failed for {task_id}: {e}")
+
+    # --- public API ---
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        """Call ``listener(task_id, task)`` after every write-through change."""
+        self._listeners.append(listener)
+
+    def create(self, task_id: str, task: Dict[str, Any]) -> Dict[str, Any]:
+        self._write([self._to_row(task_id, task)])
+        self._notify(task_id, task)
+        return self._remember(task_id, task)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        task = self._cache.get(task_id)
+        if task is not None:
+            return task
+        row = self._db.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        return self._remember(task_id, self._from_row(row))
+
+    def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        task = self.get(task_id)
+        if task is None:
+            return None
+        task.update(fields)
+        if set(fields) <= {"progress"}:
+            self._dirty.add(task_id)
+        else:
+            self._dirty.discard(task_id)
+            self._write([self._to_row(task_id, task)])
+            self._notify(task_id, task)
+        return task
+
+    def delete(self, task_id: str):
+        self._cache.pop(task_id, None)
+        self._dirty.discard(task_id)
+        self._db.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        rows = [(self._cache[t]["progress"], t) for t in dirty if t in self._cache]
+        self._db.execute("BEGIN")
+        self._db.executemany("UPDATE tasks SET progress = ? WHERE task_id = ?", rows)
+        self._db.execute("COMMIT")
+
+    def list(self, status: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[tuple]:
+        self.flush()
+        if status is None:
+            rows = self._db.execute(
+                "SELECT * FROM tasks ORDER BY created_at LIMIT ? OFFSET ?", (limit, offset)
+            )
+        else:
+            rows = self._db.execute(
+                "SELECT * FROM tasks WHERE status = ? ORDER BY created_at LIMIT ? OFFSET ?",
+                (status, limit, offset),
+            )
+        return [(row["task_id"], self._cache.get(row["task_id"]) or self._from_row(row)) for row in rows]
+
+    def count(self, status: Optional[str] = None) -> int:
+        if status is None:
+            return self._db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        return self._db.execute("SELECT COUNT(*) FROM tasks WHERE status = ?", (status,)).fetchone()[0]
+
+    def find(self, chat_id: int, message_id: int, status: str) -> List[Dict[str, Any]]:
+        rows = self._db.execute(
+            "SELECT * FROM tasks WHERE chat_id = ? AND message_id = ? AND status = ? "
+            "ORDER BY created_at DESC",
+            (chat_id, message_id, status),
+        )
+        return [self._cache.get(row["task_id"]) or self._from_row(row) for row in rows]
+
+    def ids_with_status(self, statuses: Iterable[str], created_before: Optional[float] = None) -> List[str]:
+        statuses = list(statuses)
+        query = f"SELECT task_id FROM tasks WHERE status IN ({', '.join('?' * len(statuses))})"
+        params: list = statuses
+        if created_before is not None:
+            query += " AND created_at < ?"
+            params = statuses + [created_before]
+        return [row[0] for row in self._db.execute(query + " ORDER BY created_at", params)]
+
+    # --- lifecycle ---
+
+    def start(self):
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log.error(f"Task store flush failed: {e}")
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        self.flush()
+        self._db.close()
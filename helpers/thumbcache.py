@@ -0,0 +1,118 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import anyio
+
+log = logging.getLogger(__name__)
+
+# (image bytes, etag); None means the message has no thumbnail
+Thumbnail = Optional[Tuple[bytes, str]]
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=8).hexdigest() + '"'
+
+
+class ThumbnailCache:
+    """Two-level LRU cache of thumbnails: a small in-memory layer in front of
+    a size-bounded directory.
+
+    Concurrent misses for the same key share one loader call.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, memory_items: int = 512):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[Hashable, Thumbnail]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+        # Rebuild the disk LRU order from the last access times
+        files = sorted(self.root.glob("*.jpg"), key=lambda p: p.stat().st_atime)
+        self._disk: "OrderedDict[str, int]" = OrderedDict(
+            (path.name, path.stat().st_size) for path in files
+        )
+        self._disk_bytes = sum(self._disk.values())
+
+    @staticmethod
+    def _file_name(key: Hashable) -> str:
+        return "_".join(str(part) for part in (key if isinstance(key, tuple) else (key,))) + ".jpg"
+
+    def _remember(self, key: Hashable, thumb: Thumbnail) -> Thumbnail:
+        self._memory[key] = thumb
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+        return thumb
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        temp = path.with_name(path.name + ".temp")
+        temp.write_bytes(data)
+        temp.replace(path)
+
+    def _account(self, name: str, data: bytes):
+        self._disk_bytes += len(data) - self._disk.pop(name, 0)
+        self._disk[name] = len(data)
+        while self._disk_bytes > self.max_bytes and len(self._disk) > 1:
+            oldest, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            (self.root / oldest).unlink(missing_ok=True)
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Thumbnail:
+        """Return ``(bytes, etag)`` for ``key``, calling ``loader`` on a miss."""
+        if key in self._memory:
+            self.hits += 1
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        name = self._file_name(key)
+        if name in self._disk:
+            try:
+                data = await anyio.to_thread.run_sync((self.root / name).read_bytes)
+            except FileNotFoundError:
+                self._disk_bytes -= self._disk.pop(name, 0)
+            else:
+                self.hits += 1
+                self._disk.move_to_end(name)
+                return self._remember(key, (data, _etag(data)))
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._inflight[key] = asyncio.create_task(self._load(key, name, loader))
+        # Shielded so a client disconnecting does not cancel other waiters
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, name: str, loader) -> Thumbnail:
+        try:
+            data = await loader()
+            if not data:
+                return self._remember(key, None)
+            try:
+                await anyio.to_thread.run_sync(self._write, self.root / name, data)
+                self._account(name, data)
+            except OSError as e:
+                log.error(f"Failed to store thumbnail {name}: {e}")
+            return self._remember(key, (data, _etag(data)))
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_items": len(self._memory),
+            "disk_items": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
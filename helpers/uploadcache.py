@@ -0,0 +1,88 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import sqlite3
+from time import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from pyrogram.types import Message
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    source_unique_id TEXT PRIMARY KEY,
+    media_type TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    file_size INTEGER,
+    duration INTEGER,
+    width INTEGER,
+    height INTEGER,
+    has_thumbnail INTEGER,
+    created_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class UploadCache:
+    """Maps a source file's ``file_unique_id`` to the bot's own uploaded copy.
+
+    A hit lets the bot resend the uploaded ``file_id`` instead of
+    downloading and uploading the same file again.
+    """
+
+    def __init__(self, path: Path):
+        self._db = sqlite3.connect(str(path), isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source_unique_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            "SELECT * FROM uploads WHERE source_unique_id = ?", (source_unique_id,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._db.execute(
+            "UPDATE uploads SET hits = hits + 1 WHERE source_unique_id = ?", (source_unique_id,)
+        )
+        return dict(row)
+
+    def put(self, source_unique_id: str, sent: Message) -> bool:
+        """Remember the media of a message the bot just sent; False if it has none."""
+        if not sent or not sent.media:
+            return False
+        media_type = sent.media.value
+        media = getattr(sent, media_type, None)
+        if media is None or not getattr(media, "file_id", None):
+            return False
+        self._db.execute(
+            "INSERT OR REPLACE INTO uploads (source_unique_id, media_type, file_id, file_size, "
+            "duration, width, height, has_thumbnail, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                source_unique_id,
+                media_type,
+                media.file_id,
+                getattr(media, "file_size", None),
+                getattr(media, "duration", None),
+                getattr(media, "width", None),
+                getattr(media, "height", None),
+                int(bool(getattr(media, "thumbs", None))),
+                time(),
+            ),
+        )
+        return True
+
+    def evict(self, source_unique_id: str):
+        self._db.execute("DELETE FROM uploads WHERE source_unique_id = ?", (source_unique_id,))
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+
+    def close(self):
+        self._db.close()
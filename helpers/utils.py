@@ -2,16 +2,23 @@
 # Channel: https://t.me/itsSmartDev
 
 import os
+import asyncio
+import logging
 from time import time
-from PIL import Image
-from logger import LOGGER
+from contextlib import AsyncExitStack
 from typing import Optional
-from asyncio.subprocess import PIPE
-from asyncio import create_subprocess_exec, create_subprocess_shell, wait_for
 
-from pyleaves import Leaves
 from pyrogram.parser import Parser
 from pyrogram.utils import get_channel_id
+from pyrogram.errors import (
+    BadRequest,
+    Forbidden,
+    FileIdInvalid,
+    FileReferenceExpired,
+    FileReferenceInvalid,
+    MediaEmpty,
+    MediaInvalid,
+)
 from pyrogram.types import (
     InputMediaPhoto,
     InputMediaVideo,
@@ -21,216 +28,271 @@ from pyrogram.types import (
 )
 
 from helpers.files import (
+    get_download_path,
+    download_lock,
     fileSizeLimit,
     cleanup_download
 )
 
 from helpers.msg import (
+    get_file_name,
+    get_file_unique_id,
     get_parsed_msg
 )
 
-# Progress bar template
-PROGRESS_BAR = """
-Percentage: {percentage:.2f}% | {current}/{total}
-Speed: {speed}/s
-Estimated Time Left: {est_time} seconds
-"""
-
-async def cmd_exec(cmd, shell=False):
-    if shell:
-        proc = await create_subprocess_shell(cmd, stdout=PIPE, stderr=PIPE)
-    else:
-        proc = await create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
-    stdout, stderr = await proc.communicate()
-    try:
-        stdout = stdout.decode().strip()
-    except:
-        stdout = "Unable to decode the response!"
-    try:
-        stderr = stderr.decode().strip()
-    except:
-        stderr = "Unable to decode the error!"
-    return stdout, stderr, proc.returncode
+from helpers.mediainfo import MediaInfo
+from helpers.metrics import TRANSFER_BYTES, stage
+from helpers.parallel import download_parallel
+from helpers.ratelimit import transfer
 
+log = logging.getLogger(__name__)
 
-async def get_media_info(path):
-    try:
-        result = await cmd_exec([
-            "ffprobe", "-hide_banner", "-loglevel", "error",
-            "-print_format", "json", "-show_format", path,
-        ])
-    except Exception as e:
-        print(f"Get Media Info: {e}. Mostly File not found! - File: {path}")
-        return 0, None, None
-    if result[0] and result[2] == 0:
-        fields = eval(result[0]).get("format")
-        if not fields:
-            return 0, None, None
-        duration = round(float(fields.get("duration", 0)))
-        tags = fields.get("tags", {})
-        artist = tags.get("artist") or tags.get("ARTIST") or tags.get("Artist")
-        title = tags.get("title") or tags.get("TITLE") or tags.get("Title")
-        return duration, artist, title
-    return 0, None, None
-
-
-async def get_video_thumbnail(video_file, duration):
-    output = os.path.join("Assets", "video_thumb.jpg")
-    if duration is None:
-        duration = (await get_media_info(video_file))[0]
-    if not duration:
-        duration = 3
-    duration //= 2
-    cmd = [
-        "ffmpeg", "-hide_banner", "-loglevel", "error",
-        "-ss", str(duration), "-i", video_file,
-        "-vf", "thumbnail", "-q:v", "1", "-frames:v", "1",
-        "-threads", str(os.cpu_count() // 2), output,
-    ]
+# Chats the bot could not copy from, and when; retried after COPY_RETRY_AFTER seconds
+COPY_FAILURES = {}
+COPY_RETRY_AFTER = 3600
+
+
+async def copy_fast_path(bot, message, chat_message) -> bool:
+    """Copy a post to the user by reference instead of downloading and re-uploading it.
+
+    Only works when the source chat allows copying and the bot itself can
+    read it. Returns False when the caller should fall back to downloading.
+    """
+    if chat_message.has_protected_content or (
+        chat_message.chat and chat_message.chat.has_protected_content
+    ):
+        return False
+
+    chat_id = chat_message.chat.id
+    if time() - COPY_FAILURES.get(chat_id, 0) < COPY_RETRY_AFTER:
+        return False
+
+    # The bot has no access hash for the user's peers, public chats resolve by username
+    source = chat_message.chat.username or chat_id
     try:
-        _, err, code = await wait_for(cmd_exec(cmd), timeout=60)
-        if code != 0 or not os.path.exists(output):
-            return None
-    except:
-        return None
-    return output
+        if chat_message.media_group_id:
+            await bot.copy_media_group(message.chat.id, source, chat_message.id)
+        else:
+            await bot.copy_message(message.chat.id, source, chat_message.id)
+    except (BadRequest, Forbidden) as e:
+        # Usually the bot is not a member of the source chat
+        log.info(f"Copy from {chat_id} failed, downloading instead: {e}")
+        COPY_FAILURES[chat_id] = time()
+        return False
+
+    COPY_FAILURES.pop(chat_id, None)
+    log.info(f"Copied message {chat_message.id} from {chat_id} by reference")
+    return True
 
 
-# Generate progress bar for downloading/uploading
-def progressArgs(action: str, progress_message, start_time):
-    return (action, progress_message, start_time, PROGRESS_BAR, "▓", "░")
+async def send_cached_media(message, upload_cache, source_unique_id, caption) -> bool:
+    """Resend a file the bot uploaded before; False if it is not cached or no longer valid."""
+    cached = upload_cache.get(source_unique_id)
+    if not cached:
+        return False
+
+    try:
+        await message.reply_cached_media(cached["file_id"], caption=caption or "")
+    except (FileIdInvalid, FileReferenceExpired, FileReferenceInvalid, MediaEmpty, MediaInvalid) as e:
+        log.info(f"Cached upload of {source_unique_id} is no longer valid: {e}")
+        upload_cache.evict(source_unique_id)
+        return False
+
+    log.info(f"Resent cached upload of {source_unique_id}")
+    return True
 
 
 async def send_media(
-    bot, message, media_path, media_type, caption, progress_message, start_time
+    bot, message, media_path, media_type, caption, progress=None,
+    info: Optional[MediaInfo] = None,
 ):
     file_size = os.path.getsize(media_path)
 
     if not await fileSizeLimit(file_size, message, "upload"):
         return
 
-    progress_args = progressArgs("📥 Uploading Progress", progress_message, start_time)
-    LOGGER(__name__).info(f"Uploading media: {media_path} ({media_type})")
+    log.info(f"Uploading media: {media_path} ({media_type})")
+
+    # Metadata comes from MediaInfoCache, which probes the file only when needed
+    info = info or MediaInfo()
+
+    with stage("upload"):
+        async with transfer(bot, "upload"):
+            if media_type == "photo":
+                sent = await message.reply_photo(
+                    media_path,
+                    caption=caption or "",
+                    progress=progress,
+                )
+            elif media_type == "video":
+                sent = await message.reply_video(
+                    media_path,
+                    duration=info.duration,
+                    width=info.width or 480,
+                    height=info.height or 320,
+                    thumb=info.thumb_file(),
+                    caption=caption or "",
+                    progress=progress,
+                )
+            elif media_type == "audio":
+                sent = await message.reply_audio(
+                    media_path,
+                    duration=info.duration,
+                    performer=info.performer,
+                    title=info.title,
+                    thumb=info.thumb_file(),
+                    caption=caption or "",
+                    progress=progress,
+                )
+            else:
+                sent = await message.reply_document(
+                    media_path,
+                    thumb=info.thumb_file(),
+                    caption=caption or "",
+                    progress=progress,
+                )
+
+    TRANSFER_BYTES.labels("upload").inc(file_size)
+    return sent
+
+
+def _media_file_size(msg) -> int:
+    media = msg.photo or msg.video or msg.document or msg.audio
+    return getattr(media, "file_size", 0) or 0
 
-    if media_type == "photo":
-        await message.reply_photo(
-            media_path,
-            caption=caption or "",
-            progress=Leaves.progress_for_pyrogram,
-            progress_args=progress_args,
-        )
-    elif media_type == "video":
-        if os.path.exists("Assets/video_thumb.jpg"):
-            os.remove("Assets/video_thumb.jpg")
-        duration = (await get_media_info(media_path))[0]
-        thumb = await get_video_thumbnail(media_path, duration)
-        if thumb is not None and thumb != "none":
-            with Image.open(thumb) as img:
-                width, height = img.size
-        else:
-            width = 480
-            height = 320
-
-        if thumb == "none":
-            thumb = None
-
-        await message.reply_video(
-            media_path,
-            duration=duration,
-            width=width,
-            height=height,
-            thumb=thumb,
-            caption=caption or "",
-            progress=Leaves.progress_for_pyrogram,
-            progress_args=progress_args,
-        )
-    elif media_type == "audio":
-        duration, artist, title = await get_media_info(media_path)
-        await message.reply_audio(
-            media_path,
-            duration=duration,
-            performer=artist,
-            title=title,
-            caption=caption or "",
-            progress=Leaves.progress_for_pyrogram,
-            progress_args=progress_args,
-        )
-    elif media_type == "document":
-        await message.reply_document(
-            media_path,
-            caption=caption or "",
-            progress=Leaves.progress_for_pyrogram,
-            progress_args=progress_args,
-        )
 
+async def processMediaGroup(
+    chat_message,
+    bot,
+    message,
+    progress_hub,
+    concurrency=3,
+    media_info=None,
+    storage=None,
+    connections=4,
+    segment_size=64 * 1024 * 1024,
+):
+    """Download an album's items ``concurrency`` at a time and send them in order.
 
-async def processMediaGroup(chat_message, bot, message):
+    Items go through ``download_parallel`` like single files, with
+    ``connections`` and ``segment_size`` passed on. Progress is reported for
+    the album as a whole. With ``media_info``, videos and audio get their
+    duration, size and thumbnail as well. With ``storage``, each item's size
+    is reserved before downloading. Items are kept in folders of their
+    source file, so an interrupted album resumes its partial downloads.
+    """
     media_group_messages = await chat_message.get_media_group()
-    valid_media = []
-    temp_paths = []
-    invalid_paths = []
+    items = [
+        msg for msg in media_group_messages
+        if msg.photo or msg.video or msg.document or msg.audio
+    ]
+    folders = [
+        get_file_unique_id(msg) or f"{message.id}_{msg.id}" for msg in items
+    ]
+    # Album items often share a file name, keep their paths apart
+    paths = [
+        get_download_path(folder, f"{index}_{get_file_name(msg.id, msg)}")
+        for index, (folder, msg) in enumerate(zip(folders, items))
+    ]
+
+    async with AsyncExitStack() as stack:
+        # Sorted, so albums sharing items cannot wait on each other's locks
+        for folder in sorted(set(folders)):
+            await stack.enter_async_context(download_lock(folder))
+        try:
+            if storage:
+                for msg, path in zip(items, paths):
+                    await stack.enter_async_context(storage.reserve(_media_file_size(msg), path=path))
+            return await _send_media_group(
+                items, paths, bot, message, progress_hub, concurrency, media_info,
+                connections, segment_size,
+            )
+        finally:
+            for path in paths:
+                cleanup_download(path)
 
-    start_time = time()
+
+async def _send_media_group(
+    items, paths, bot, message, progress_hub, concurrency, media_info, connections, segment_size
+):
     progress_message = await message.reply("📥 Downloading media group...")
-    LOGGER(__name__).info(
-        f"Downloading media group with {len(media_group_messages)} items..."
-    )
+    log.info(f"Downloading media group with {len(items)} items...")
+
+    downloaded = [0] * len(items)
+    group_size = sum(_media_file_size(msg) for msg in items) or 1
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def item_progress(current, total, index):
+        downloaded[index] = current
+        await tracker.update(min(sum(downloaded), group_size), group_size)
 
-    for msg in media_group_messages:
-        if msg.photo or msg.video or msg.document or msg.audio:
+    async def download_item(index, msg):
+        async with slots:
             try:
-                media_path = await msg.download(
-                    progress=Leaves.progress_for_pyrogram,
-                    progress_args=progressArgs(
-                        "📥 Downloading Progress", progress_message, start_time
-                    ),
+                # The user session that fetched the album downloads its items
+                return await download_parallel(
+                    msg._client,
+                    msg,
+                    paths[index],
+                    connections=connections,
+                    segment_size=segment_size,
+                    progress=item_progress,
+                    progress_args=(index,),
                 )
-                temp_paths.append(media_path)
-
-                if msg.photo:
-                    valid_media.append(
-                        InputMediaPhoto(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
-                elif msg.video:
-                    valid_media.append(
-                        InputMediaVideo(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
+            except Exception as e:
+                log.info(f"Error downloading media: {e}")
+                return None
+
+    with progress_hub.track(progress_message, "📥 Downloading Progress") as tracker:
+        media_paths = await asyncio.gather(
+            *(download_item(index, msg) for index, msg in enumerate(items))
+        )
+
+    valid_media = []
+
+    for msg, media_path in zip(items, media_paths):
+        if not media_path:
+            continue
+        try:
+            caption = await get_parsed_msg(msg.caption or "", msg.caption_entities)
+            info = await media_info.get(msg, media_path) if media_info else MediaInfo()
+
+            if msg.photo:
+                valid_media.append(InputMediaPhoto(media=media_path, caption=caption))
+            elif msg.video:
+                valid_media.append(
+                    InputMediaVideo(
+                        media=media_path,
+                        caption=caption,
+                        duration=info.duration,
+                        width=info.width,
+                        height=info.height,
+                        thumb=info.thumb_file(),
                     )
-                elif msg.document:
-                    valid_media.append(
-                        InputMediaDocument(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
+                )
+            elif msg.document:
+                valid_media.append(
+                    InputMediaDocument(
+                        media=media_path, caption=caption, thumb=info.thumb_file()
                     )
-                elif msg.audio:
-                    valid_media.append(
-                        InputMediaAudio(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
+                )
+            elif msg.audio:
+                valid_media.append(
+                    InputMediaAudio(
+                        media=media_path,
+                        caption=caption,
+                        duration=info.duration,
+                        performer=info.performer or "",
+                        title=info.title or "",
+                        thumb=info.thumb_file(),
                     )
+                )
 
-            except Exception as e:
-                LOGGER(__name__).info(f"Error downloading media: {e}")
-                if media_path and os.path.exists(media_path):
-                    invalid_paths.append(media_path)
-                continue
+        except Exception as e:
+            log.info(f"Error preparing media: {e}")
+            continue
 
-    LOGGER(__name__).info(f"Valid media count: {len(valid_media)}")
+    log.info(f"Valid media count: {len(valid_media)}")
 
     if valid_media:
         try:
@@ -279,12 +341,8 @@ async def processMediaGroup(chat_message, bot, message):
 
             await progress_message.delete()
 
-        for path in temp_paths + invalid_paths:
-            cleanup_download(path)
         return True
 
     await progress_message.delete()
     await message.reply("❌ No valid media found in the media group.")
-    for path in invalid_paths:
-        cleanup_download(path)
     return False
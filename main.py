@@ -6,21 +6,23 @@ import shutil
 import psutil
 import asyncio
 from time import time
+from typing import Optional
 
-from pyleaves import Leaves
 from pyrogram.enums import ParseMode
 from pyrogram import Client, filters
-from pyrogram.errors import PeerIdInvalid, BadRequest
+from pyrogram.errors import PeerIdInvalid, BadRequest, FloodWait
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 
 from helpers.utils import (
+    copy_fast_path,
     processMediaGroup,
-    progressArgs,
+    send_cached_media,
     send_media
 )
 
 from helpers.files import (
     get_download_path,
+    download_lock,
     fileSizeLimit,
     get_readable_file_size,
     get_readable_time,
@@ -30,9 +32,31 @@ from helpers.files import (
 from helpers.msg import (
     getChatMsgID,
     get_file_name,
+    get_file_size,
+    get_file_unique_id,
     get_parsed_msg
 )
 
+from helpers.mediainfo import MediaInfoCache, MediaPool
+
+from helpers.metrics import REGISTRY, cache_samples, stage, start_metrics_server
+
+from helpers.parallel import download_parallel
+
+from helpers.progress import ProgressHub
+
+from helpers.relay import can_relay, relay_media
+
+from helpers.storage import InsufficientStorageError, StorageManager
+
+from helpers.batch import AdaptivePacer, iter_messages
+
+from helpers.ratelimit import RateLimiter
+
+from helpers.sessionpool import SessionPool, session_names
+
+from helpers.uploadcache import UploadCache
+
 from config import PyroConf
 from logger import LOGGER
 
@@ -46,11 +70,87 @@ bot = Client(
     parse_mode=ParseMode.MARKDOWN,
 )
 
-# Client for user session
-user = Client("user_session", workers=1000, session_string=PyroConf.SESSION_STRING)
+# Clients for the user sessions; downloads are spread over all of them
+USERS = SessionPool([
+    Client(
+        name,
+        workers=1000,
+        session_string=session_string,
+        max_concurrent_transmissions=PyroConf.MAX_CONCURRENT_TRANSMISSIONS,
+    )
+    for name, session_string in zip(
+        session_names(len(PyroConf.SESSION_STRINGS)), PyroConf.SESSION_STRINGS
+    )
+])
+user = USERS.primary
+
+# Every request of every account goes through a FloodWait-aware limiter
+BOT_LIMITER = RateLimiter("bot").attach(bot)
+USER_LIMITERS = [
+    RateLimiter("user" if index == 0 else f"user_{index + 1}").attach(client)
+    for index, client in enumerate(USERS.clients)
+]
+USER_LIMITER = USER_LIMITERS[0]
+
+# Source file_unique_id -> file_id of the bot's own upload of it
+UPLOAD_CACHE = UploadCache(PyroConf.UPLOAD_CACHE_PATH)
+
+# Upload metadata (duration, size, thumbnail) per source file_unique_id
+MEDIA_POOL = MediaPool(PyroConf.FFMPEG_WORKERS, PyroConf.FFMPEG_TIMEOUT)
+MEDIA_INFO = MediaInfoCache(user, MEDIA_POOL)
+
+# Progress messages are edited at most once per PROGRESS_EDIT_INTERVAL per chat
+PROGRESS = ProgressHub(PyroConf.PROGRESS_EDIT_INTERVAL)
+
+# Downloads stay within STORAGE_QUOTA_MB; leftovers of crashes are swept
+STORAGE = StorageManager(
+    ["downloads"],
+    quota=PyroConf.STORAGE_QUOTA_MB * 1024 * 1024,
+    min_free=PyroConf.STORAGE_MIN_FREE_MB * 1024 * 1024,
+)
 
 RUNNING_TASKS = set()
 
+REGISTRY.gauge_callback(
+    "rcdl_inflight_tasks", "Downloads and batches currently running.",
+    lambda: [({}, len(RUNNING_TASKS))],
+)
+REGISTRY.gauge_callback(
+    "rcdl_ffmpeg_jobs", "ffprobe/ffmpeg jobs by state.",
+    lambda: [({"state": "running"}, MEDIA_POOL.running), ({"state": "waiting"}, MEDIA_POOL.waiting)],
+)
+REGISTRY.gauge_callback(
+    "rcdl_progress_trackers", "Transfers showing a progress message.",
+    lambda: [({}, PROGRESS.active)],
+)
+REGISTRY.counter_callback(
+    "rcdl_cache_requests_total", "Cache lookups by result.",
+    lambda: cache_samples(upload=UPLOAD_CACHE, media_info=MEDIA_INFO),
+)
+REGISTRY.gauge_callback(
+    "rcdl_storage_bytes", "Disk space used and reserved by downloads.",
+    lambda: [
+        ({"state": "used"}, STORAGE.usage()),
+        ({"state": "reserved"}, STORAGE.reserved()),
+    ],
+)
+REGISTRY.counter_callback(
+    "rcdl_storage_evicted_bytes_total", "Bytes of downloads evicted to make room.",
+    lambda: [({}, STORAGE.evicted_bytes)],
+)
+REGISTRY.gauge_callback(
+    "rcdl_rate_limit_rate", "Current requests per second allowed per method class.",
+    lambda: [
+        ({"client": limiter.name, "kind": kind}, bucket.rate)
+        for limiter in (BOT_LIMITER, *USER_LIMITERS)
+        for kind, bucket in limiter.buckets.items()
+    ],
+)
+REGISTRY.gauge_callback(
+    "rcdl_session_in_flight", "Calls in flight per user session.",
+    lambda: [({"session": session["name"]}, session["in_flight"]) for session in USERS.stats()],
+)
+
 def track_task(coro):
     task = asyncio.create_task(coro)
     RUNNING_TASKS.add(task)
@@ -107,95 +207,207 @@ async def help_command(_, message: Message):
     await message.reply(help_text, reply_markup=markup, disable_web_page_preview=True)
 
 
-async def handle_download(bot: Client, message: Message, post_url: str):
-    # Cut off URL at '?' if present
-    if "?" in post_url:
-        post_url = post_url.split("?", 1)[0]
-
-    try:
-        chat_id, message_id = getChatMsgID(post_url)
-        chat_message = await user.get_messages(chat_id=chat_id, message_ids=message_id)
+async def download_and_send(
+    user: Client,
+    chat_message: Message,
+    message: Message,
+    download_path: str,
+    caption: str,
+    progress_message: Message,
+):
+    with PROGRESS.track(progress_message, "📥 Downloading Progress") as progress:
+        media_path = await download_parallel(
+            user,
+            chat_message,
+            download_path,
+            connections=PyroConf.DOWNLOAD_CONNECTIONS,
+            segment_size=PyroConf.DOWNLOAD_SEGMENT_MB * 1024 * 1024,
+            progress=progress.update,
+        )
 
-        LOGGER(__name__).info(f"Downloading media from URL: {post_url}")
+    LOGGER(__name__).info(f"Downloaded media: {media_path}")
 
-        if chat_message.document or chat_message.video or chat_message.audio:
-            file_size = (
-                chat_message.document.file_size
-                if chat_message.document
-                else chat_message.video.file_size
-                if chat_message.video
-                else chat_message.audio.file_size
-            )
+    media_type = (
+        "photo"
+        if chat_message.photo
+        else "video"
+        if chat_message.video
+        else "audio"
+        if chat_message.audio
+        else "document"
+    )
+    info = await MEDIA_INFO.get(chat_message, media_path)
+    with PROGRESS.track(progress_message, "📤 Uploading Progress") as progress:
+        return await send_media(
+            bot,
+            message,
+            media_path,
+            media_type,
+            caption,
+            progress=progress.update,
+            info=info,
+        )
 
-            if not await fileSizeLimit(
-                file_size, message, "download", user.me.is_premium
-            ):
-                return
 
-        parsed_caption = await get_parsed_msg(
-            chat_message.caption or "", chat_message.caption_entities
-        )
-        parsed_text = await get_parsed_msg(
-            chat_message.text or "", chat_message.entities
+async def download_post(
+    bot: Client,
+    message: Message,
+    post_url: str,
+    chat_message: Message,
+    message_id: int,
+    user: Client,
+) -> bool:
+    """Send one post to the chat of ``message``; False if it could not be sent."""
+    LOGGER(__name__).info(f"Downloading media from URL: {post_url}")
+
+    # Unprotected chats the bot can read are copied without any download
+    if chat_message.media and await copy_fast_path(bot, message, chat_message):
+        return True
+
+    # Files the bot has uploaded before are resent by file_id
+    source_unique_id = None if chat_message.media_group_id else get_file_unique_id(chat_message)
+    if source_unique_id and await send_cached_media(
+        message,
+        UPLOAD_CACHE,
+        source_unique_id,
+        await get_parsed_msg(chat_message.caption or "", chat_message.caption_entities),
+    ):
+        return True
+
+    if chat_message.document or chat_message.video or chat_message.audio:
+        file_size = (
+            chat_message.document.file_size
+            if chat_message.document
+            else chat_message.video.file_size
+            if chat_message.video
+            else chat_message.audio.file_size
         )
 
-        if chat_message.media_group_id:
-            if not await processMediaGroup(chat_message, bot, message):
-                await message.reply(
-                    "**Could not extract any valid media from the media group.**"
-                )
-            return
+        if not await fileSizeLimit(
+            file_size, message, "download", user.me.is_premium
+        ):
+            return False
 
-        elif chat_message.media:
-            start_time = time()
-            progress_message = await message.reply("**📥 Downloading Progress...**")
-
-            filename = get_file_name(message_id, chat_message)
-            download_path = get_download_path(message.id, filename)
+    parsed_caption = await get_parsed_msg(
+        chat_message.caption or "", chat_message.caption_entities
+    )
+    parsed_text = await get_parsed_msg(
+        chat_message.text or "", chat_message.entities
+    )
 
-            media_path = await chat_message.download(
-                file_name=download_path,
-                progress=Leaves.progress_for_pyrogram,
-                progress_args=progressArgs(
-                    "📥 Downloading Progress", progress_message, start_time
-                ),
+    if chat_message.media_group_id:
+        if not await processMediaGroup(
+            chat_message,
+            bot,
+            message,
+            PROGRESS,
+            concurrency=PyroConf.MEDIA_GROUP_CONCURRENCY,
+            media_info=MEDIA_INFO,
+            storage=STORAGE,
+            connections=PyroConf.DOWNLOAD_CONNECTIONS,
+            segment_size=PyroConf.DOWNLOAD_SEGMENT_MB * 1024 * 1024,
+        ):
+            await message.reply(
+                "**Could not extract any valid media from the media group.**"
             )
+            return False
+        return True
 
-            LOGGER(__name__).info(f"Downloaded media: {media_path}")
+    elif chat_message.media:
+        progress_message = await message.reply("**📥 Downloading Progress...**")
 
-            media_type = (
-                "photo"
-                if chat_message.photo
-                else "video"
-                if chat_message.video
-                else "audio"
-                if chat_message.audio
-                else "document"
-            )
-            await send_media(
-                bot,
-                message,
-                media_path,
-                media_type,
-                parsed_caption,
-                progress_message,
-                start_time,
-            )
+        filename = get_file_name(message_id, chat_message)
+        # Keyed by the source file, so a retry or a restart resumes its partial download
+        folder = get_file_unique_id(chat_message) or f"{message.id}_{chat_message.id}"
+        download_path = get_download_path(folder, filename)
 
-            cleanup_download(media_path)
+        # Large files are uploaded part by part while they download
+        relay = PyroConf.RELAY_UPLOADS and can_relay(
+            chat_message, PyroConf.RELAY_MIN_MB * 1024 * 1024
+        )
+        if relay and not await fileSizeLimit(file_size, message, "upload"):
             await progress_message.delete()
+            return False
 
-        elif chat_message.text or chat_message.caption:
-            await message.reply(parsed_text or parsed_caption)
-        else:
-            await message.reply("**No media or text found in the post URL.**")
+        # Another request for the same file finishes (and cleans up) first
+        async with download_lock(folder):
+            try:
+                async with STORAGE.reserve(get_file_size(chat_message), path=download_path):
+                    if relay:
+                        with PROGRESS.track(progress_message, "📤 Relaying Progress") as progress:
+                            sent = await relay_media(
+                                bot,
+                                user,
+                                chat_message,
+                                message.chat.id,
+                                download_path,
+                                parsed_caption,
+                                info=await MEDIA_INFO.get(chat_message),
+                                connections=PyroConf.DOWNLOAD_CONNECTIONS,
+                                segment_size=PyroConf.DOWNLOAD_SEGMENT_MB * 1024 * 1024,
+                                upload_workers=PyroConf.RELAY_UPLOAD_WORKERS,
+                                progress=progress.update,
+                            )
+                    else:
+                        sent = await download_and_send(
+                            user, chat_message, message, download_path, parsed_caption, progress_message
+                        )
+                if source_unique_id:
+                    UPLOAD_CACHE.put(source_unique_id, sent)
+            finally:
+                cleanup_download(download_path)
+        await progress_message.delete()
+
+    elif chat_message.text or chat_message.caption:
+        await message.reply(parsed_text or parsed_caption)
+    else:
+        await message.reply("**No media or text found in the post URL.**")
+        return False
+    return True
+
+
+async def handle_download(
+    bot: Client,
+    message: Message,
+    post_url: str,
+    chat_message: Optional[Message] = None,
+    batch: bool = False,
+) -> bool:
+    """Download and send one post, replying with the error if it fails.
+
+    Returns whether the post was sent, so batches can count failures.
+    """
+    # Cut off URL at '?' if present
+    if "?" in post_url:
+        post_url = post_url.split("?", 1)[0]
+
+    try:
+        chat_id, message_id = getChatMsgID(post_url)
+        if chat_message is None:
+            with stage("get_messages"):
+                chat_message = await USERS.call(
+                    chat_id,
+                    lambda client: client.get_messages(chat_id=chat_id, message_ids=message_id),
+                )
+
+        # The session that fetched the message also downloads its media
+        async with USERS.lease(chat_id, chat_message._client) as user:
+            return await download_post(bot, message, post_url, chat_message, message_id, user)
 
     except (PeerIdInvalid, BadRequest, KeyError):
         await message.reply("**Make sure the user client is part of the chat.**")
+    except InsufficientStorageError:
+        await message.reply("**❌ Not enough storage space for this file right now, try again later.**")
+    except FloodWait:
+        # Batch mode retries the post and slows down instead of reporting it
+        if batch:
+            raise
+        await message.reply("**❌ Telegram is rate limiting requests, try again later.**")
     except Exception as e:
         error_message = f"**❌ {str(e)}**"
         await message.reply(error_message)
         LOGGER(__name__).error(e)
+    return False
 
 
 @bot.on_message(filters.command("dl") & filters.private)
@@ -232,53 +444,92 @@ async def download_range(bot: Client, message: Message):
     if start_id > end_id:
         return await message.reply("**❌ Invalid range: start ID cannot exceed end ID.**")
 
+    async def open_chat(client: Client) -> Client:
+        await client.get_chat(start_chat)
+        return client
+
+    # The whole batch is listed by one session that can see the chat
     try:
-        await user.get_chat(start_chat)
+        user = await USERS.call(start_chat, open_chat)
     except Exception:
-        pass
+        user = USERS.pick(start_chat)
 
     prefix = args[1].rsplit("/", 1)[0]
     loading = await message.reply(f"📥 **Downloading posts {start_id}–{end_id}…**")
 
-    downloaded = skipped = failed = 0
-
-    for msg_id in range(start_id, end_id + 1):
-        url = f"{prefix}/{msg_id}"
-        try:
-            chat_msg = await user.get_messages(chat_id=start_chat, message_ids=msg_id)
-            if not chat_msg:
-                skipped += 1
-                continue
-
-            has_media = bool(chat_msg.media_group_id or chat_msg.media)
-            has_text  = bool(chat_msg.text or chat_msg.caption)
-            if not (has_media or has_text):
-                skipped += 1
+    counts = {"downloaded": 0, "skipped": 0, "failed": 0}
+    pacer = AdaptivePacer()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PyroConf.BATCH_WORKERS * 2)
+
+    async def produce():
+        seen_groups = set()
+        expected = start_id
+        async for chat_msg in iter_messages(user, start_chat, start_id, end_id, pacer):
+            # Ids missing from the batch were deleted or never existed
+            counts["skipped"] += chat_msg.id - expected
+            expected = chat_msg.id + 1
+
+            if chat_msg.media_group_id:
+                # The whole album is sent when its first post is handled
+                if chat_msg.media_group_id in seen_groups:
+                    continue
+                seen_groups.add(chat_msg.media_group_id)
+            elif not (chat_msg.media or chat_msg.text or chat_msg.caption):
+                counts["skipped"] += 1
                 continue
-
-            task = track_task(handle_download(bot, message, url))
-            try:
-                await task
-                downloaded += 1
-            except asyncio.CancelledError:
-                await loading.delete()
-                return await message.reply(
-                    f"**❌ Batch canceled** after downloading `{downloaded}` posts."
-                )
-
-        except Exception as e:
-            failed += 1
-            LOGGER(__name__).error(f"Error at {url}: {e}")
-
-        await asyncio.sleep(3)
+            await queue.put(chat_msg)
+        counts["skipped"] += end_id + 1 - expected
+
+        for _ in range(PyroConf.BATCH_WORKERS):
+            await queue.put(None)
+
+    async def work():
+        while (chat_msg := await queue.get()) is not None:
+            url = f"{prefix}/{chat_msg.id}"
+            for _ in range(PyroConf.BATCH_RETRIES + 1):
+                await pacer.wait()
+                try:
+                    sent = await handle_download(bot, message, url, chat_message=chat_msg, batch=True)
+                except FloodWait as e:
+                    LOGGER(__name__).warning(f"FloodWait of {e.value}s at {url}")
+                    pacer.flood(e.value)
+                    continue
+                except Exception as e:
+                    LOGGER(__name__).error(f"Error at {url}: {e}")
+                    counts["failed"] += 1
+                    break
+                pacer.success()
+                # handle_download has already reported why a post was not sent
+                counts["downloaded" if sent else "failed"] += 1
+                break
+            else:
+                counts["failed"] += 1
+
+    tasks = [track_task(produce())] + [track_task(work()) for _ in range(PyroConf.BATCH_WORKERS)]
+    try:
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await loading.delete()
+        return await message.reply(
+            f"**❌ Batch canceled** after downloading `{counts['downloaded']}` posts."
+        )
+    except Exception as e:
+        for task in tasks:
+            task.cancel()
+        LOGGER(__name__).error(f"Batch {start_id}-{end_id} aborted: {e}")
+        await loading.delete()
+        return await message.reply(f"**❌ Batch aborted:** `{e}`")
 
     await loading.delete()
     await message.reply(
         "**✅ Batch Process Complete!**\n"
         "━━━━━━━━━━━━━━━━━━━\n"
-        f"📥 **Downloaded** : `{downloaded}` post(s)\n"
-        f"⏭️ **Skipped**    : `{skipped}` (no content)\n"
-        f"❌ **Failed**     : `{failed}` error(s)"
+        f"📥 **Downloaded** : `{counts['downloaded']}` post(s)\n"
+        f"⏭️ **Skipped**    : `{counts['skipped']}` (no content)\n"
+        f"❌ **Failed**     : `{counts['failed']}` error(s)\n"
+        f"🐢 **FloodWaits** : `{pacer.flood_waits}`"
     )
 
 
@@ -301,6 +552,11 @@ async def stats(_, message: Message):
     memory = psutil.virtual_memory().percent
     disk = psutil.disk_usage("/").percent
     process = psutil.Process(os.getpid())
+    user_limits = " | ".join(f"{limiter.name} `{limiter.summary()}`" for limiter in USER_LIMITERS)
+    sessions = ", ".join(
+        f"`{session['name']}` {session['in_flight']} active/{session['calls']} calls"
+        for session in USERS.stats()
+    )
 
     stats = (
         "**≧◉◡◉≦ Bot is Up and Running successfully.**\n\n"
@@ -313,7 +569,15 @@ async def stats(_, message: Message):
         f"**➜ Download:** `{recv}`\n\n"
         f"**➜ CPU:** `{cpuUsage}%` | "
         f"**➜ RAM:** `{memory}%` | "
-        f"**➜ DISK:** `{disk}%`"
+        f"**➜ DISK:** `{disk}%`\n\n"
+        f"**➜ Rate Limits:** bot `{BOT_LIMITER.summary()}` | {user_limits}\n"
+        f"**➜ Sessions:** {sessions}, `{USERS.failovers}` failover(s)\n"
+        f"**➜ Upload Cache:** `{UPLOAD_CACHE.count()}` file(s), "
+        f"`{UPLOAD_CACHE.hits}` hit(s)\n"
+        f"**➜ FFmpeg:** `{MEDIA_POOL.running}/{MEDIA_POOL.workers}` running, "
+        f"`{MEDIA_POOL.waiting}` queued, `{MEDIA_POOL.timeouts}` timeout(s)\n"
+        f"**➜ Storage:** `{get_readable_file_size(STORAGE.usage())}` used, "
+        f"`{STORAGE.evicted_files}` evicted, `{STORAGE.rejected}` rejected"
     )
     await message.reply(stats)
 
@@ -339,7 +603,14 @@ async def cancel_all_tasks(_, message: Message):
 if __name__ == "__main__":
     try:
         LOGGER(__name__).info("Bot Started!")
-        user.start()
+        for client in USERS.clients:
+            client.start()
+        asyncio.get_event_loop().create_task(STORAGE.maintain())
+        if PyroConf.METRICS_PORT:
+            # Bound to the loop bot.run() uses below
+            asyncio.get_event_loop().run_until_complete(
+                start_metrics_server(PyroConf.METRICS_PORT)
+            )
         bot.run()
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,79 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Both apps read config.py and write their databases, logs and downloads to
+# the working directory when imported, so both are set up before any import
+WORKDIR = tempfile.mkdtemp(prefix="rcdl-tests-")
+os.chdir(WORKDIR)
+os.environ.update({
+    "API_ID": "1",
+    "API_HASH": "0" * 32,
+    "BOT_TOKEN": "1:tests",
+    # Relayed uploads go through raw upload sessions that are not simulated
+    "RELAY_UPLOADS": "false",
+    # Small synthetic files still take the segmented download path
+    "DOWNLOAD_SEGMENT_MB": "1",
+})
+
+from benchmarks.fake_client import PART_SIZE, FakeClient, FakeTelegram, NetworkProfile  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def backend():
+    import backend
+    return backend
+
+
+@pytest.fixture(scope="session")
+def bot_app():
+    import main
+    return main
+
+
+@pytest.fixture
+def world() -> FakeTelegram:
+    return FakeTelegram(channels=1, messages=120, albums=2, album_size=2, media_size=2 * PART_SIZE)
+
+
+@pytest.fixture
+def user(world, backend, bot_app, monkeypatch) -> FakeClient:
+    """One simulated account, installed as the session pool of both apps."""
+    from helpers.ratelimit import RateLimiter
+    from helpers.sessionpool import SessionPool
+
+    client = FakeClient(world, NetworkProfile(latency=0), name="test_user")
+    users = SessionPool([client])
+    limiter = RateLimiter("user").attach(client)
+    for module in (backend, bot_app):
+        monkeypatch.setattr(module, "USERS", users)
+        monkeypatch.setattr(module, "user", client)
+    monkeypatch.setattr(backend, "RATE_LIMITERS", [limiter])
+    monkeypatch.setattr(backend, "RATE_LIMITER", limiter)
+    monkeypatch.setattr(bot_app, "USER_LIMITERS", [limiter])
+    monkeypatch.setattr(bot_app, "USER_LIMITER", limiter)
+    monkeypatch.setattr(bot_app.MEDIA_INFO, "client", client)
+    return client
+
+
+@pytest.fixture
+def storage(bot_app, monkeypatch, tmp_path):
+    """A fresh downloads folder and storage manager for the bot.
+
+    The manager's lock belongs to a single event loop, so it is not shared.
+    """
+    from helpers.storage import StorageManager
+
+    monkeypatch.chdir(tmp_path)
+    manager = StorageManager(["downloads"])
+    monkeypatch.setattr(bot_app, "STORAGE", manager)
+    return manager
@@ -0,0 +1,140 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+
+from helpers.scheduler import QueueFullError
+from helpers.taskstore import TaskStore
+
+
+async def _request(backend, method: str, url: str, **kwargs) -> httpx.Response:
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.request(method, url, **kwargs)
+
+
+@asynccontextmanager
+async def _scheduler(backend, handler=None):
+    async def idle(*args):
+        pass
+
+    backend.scheduler.start(handler or idle)
+    try:
+        yield backend.scheduler
+    finally:
+        await backend.scheduler.stop()
+
+
+def _download_request(world) -> dict:
+    channel_id = next(iter(world.channels))
+    return {"chat_id": world.chat_id(channel_id), "message_id": world.singles[channel_id][0]}
+
+
+def test_rejected_download_is_not_published(backend, user, world, monkeypatch):
+    monkeypatch.setattr(backend.TASK_STORE, "_listeners", [backend._publish_task_change])
+    monkeypatch.setattr(backend.scheduler, "max_queue", 0)
+
+    async def scenario():
+        with backend.EVENTS.subscribe() as events:
+            response = await _request(backend, "POST", "/api/download/request", json=_download_request(world))
+            return response, events.qsize()
+
+    response, published = asyncio.run(scenario())
+    assert response.status_code == 429
+    assert published == 0
+
+
+def test_download_rejected_after_creation_is_published_as_failed(backend, user, world, monkeypatch):
+    monkeypatch.setattr(backend.TASK_STORE, "_listeners", [backend._publish_task_change])
+    checks = []
+
+    def check_capacity():
+        # The queue fills up between the admission check and the submit
+        checks.append(True)
+        if len(checks) > 1:
+            raise QueueFullError(1)
+
+    monkeypatch.setattr(backend.scheduler, "check_capacity", check_capacity)
+
+    async def scenario():
+        async with _scheduler(backend):
+            with backend.EVENTS.subscribe() as events:
+                response = await _request(backend, "POST", "/api/download/request", json=_download_request(world))
+                return response, [events.get_nowait() for _ in range(events.qsize())]
+
+    response, published = asyncio.run(scenario())
+    assert response.status_code == 429
+    assert [event["status"] for event in published] == ["pending", "failed"]
+    assert backend.TASK_STORE.get(published[0]["task_id"]) is None
+
+
+def test_channel_listing_applies_limit(backend, user, world):
+    chat_id = world.chat_id(next(iter(world.channels)))
+
+    async def scenario():
+        # The first listing indexes every video, the second is answered from the index
+        full = await _request(backend, "GET", f"/api/channel/{chat_id}/", params={"limit": 1000})
+        limited = await _request(backend, "GET", f"/api/channel/{chat_id}/", params={"limit": 10})
+        return full.json(), limited.json()
+
+    full, limited = asyncio.run(scenario())
+    assert full["total_found"] > 10
+    assert len(limited["videos"]) == limited["total_found"] == 10
+    assert limited["videos"] == full["videos"][:10]
+
+
+def test_repeated_listing_within_sync_interval_makes_no_api_calls(backend, user, world):
+    chat_id = world.chat_id(next(iter(world.channels)))
+    calls = []
+
+    async def scenario():
+        for _ in range(4):
+            before = user.profile.calls
+            response = await _request(backend, "GET", f"/api/channel/{chat_id}/", params={"media_type": "audio"})
+            response.raise_for_status()
+            calls.append(user.profile.calls - before)
+
+    asyncio.run(scenario())
+    assert calls[0] > 0
+    assert calls[1:] == [0, 0, 0]
+
+
+def test_blob_suffix_of_extensionless_files(backend):
+    assert backend._blob_suffix("clip.mkv", "video/mp4") == ".mkv"
+    assert backend._blob_suffix("report", "application/pdf") == ".pdf"
+    assert backend._blob_suffix("track", "audio/mpeg") == ".mp3"
+    assert backend._blob_suffix("data") == ".bin"
+
+
+def test_interrupted_tasks_are_requeued_after_restart(backend, tmp_path, monkeypatch):
+    path = tmp_path / "tasks.db"
+    store = TaskStore(path)
+    for task_id, status in (("queued", "pending"), ("running", "processing"), ("done", "completed")):
+        store.create(task_id, {
+            "status": status, "created_at": 1.0, "chat_id": -100, "message_id": len(task_id), "priority": 1,
+        })
+    store.update("running", {"progress": 0.4})
+    asyncio.run(store.close())
+
+    # The next run of the backend opens the same database
+    restarted = TaskStore(path)
+    monkeypatch.setattr(backend, "TASK_STORE", restarted)
+    handled = {}
+
+    async def handler(task_id, chat_id, message_id):
+        handled[task_id] = (chat_id, message_id)
+
+    async def scenario():
+        async with _scheduler(backend, handler):
+            await backend.requeue_interrupted_tasks()
+            while len(handled) < 2:
+                await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert handled == {"queued": (-100, 6), "running": (-100, 7)}
+    assert restarted.get("running")["status"] == "pending"
+    assert restarted.get("running")["progress"] == 0.0
+    assert restarted.get("done")["status"] == "completed"
@@ -0,0 +1,31 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+
+from helpers.blobstore import BlobStore
+
+
+def test_blobs_with_different_suffixes_download_separately(tmp_path):
+    store = BlobStore(tmp_path)
+    downloads = []
+
+    def writer(data: bytes):
+        async def download(path, progress):
+            downloads.append(path.name)
+            await asyncio.sleep(0.01)
+            path.write_bytes(data)
+        return download
+
+    async def scenario():
+        return await asyncio.gather(
+            store.fetch("AgADBQ", ".mp3", writer(b"audio")),
+            store.fetch("AgADBQ", ".pdf", writer(b"document")),
+            store.fetch("AgADBQ", ".pdf", writer(b"unused")),
+        )
+
+    mp3, pdf, joined = asyncio.run(scenario())
+    assert sorted(downloads) == ["AgADBQ.mp3", "AgADBQ.pdf"]
+    assert mp3.read_bytes() == b"audio"
+    assert pdf == joined and pdf.read_bytes() == b"document"
+    assert store.coalesced == 1
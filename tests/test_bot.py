@@ -0,0 +1,163 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+
+from pyrogram import raw
+
+from benchmarks.fake_client import PART_SIZE, FakeBot, FakeCommand
+
+
+def _rename(world, channel_id: int, message_id: int, file_name: str, size: int):
+    document = world.history[channel_id][message_id].media.document
+    document.size = size
+    for attribute in document.attributes:
+        if isinstance(attribute, raw.types.DocumentAttributeFilename):
+            attribute.file_name = file_name
+
+
+def test_batch_posts_with_the_same_file_name(bot_app, user, world, storage):
+    channel_id = next(iter(world.channels))
+    first, second = world.singles[channel_id][3:5]
+    sizes = {first: 3 * PART_SIZE, second: 2 * PART_SIZE + 123}
+    for message_id, size in sizes.items():
+        _rename(world, channel_id, message_id, "same.bin", size)
+    # Let the two downloads interleave
+    user.profile.latency = 0.002
+
+    bot = FakeBot(user.profile)
+    command = FakeCommand(
+        bot,
+        message_id=7001,
+        chat_id=7001,
+        text=f"/bdl https://t.me/c/{channel_id}/{first} https://t.me/c/{channel_id}/{second}",
+    )
+    asyncio.run(bot_app.download_range(bot, command))
+
+    assert bot.uploaded_to[command.chat.id] == sum(sizes.values())
+
+
+def test_batch_albums_with_the_same_file_names(bot_app, user, world, storage):
+    channel_id = next(iter(world.channels))
+    first, second = world.albums[channel_id]
+    sizes = {}
+    for album, size in ((first, 3 * PART_SIZE), (second, 2 * PART_SIZE + 123)):
+        for message_id in (album, album + 1):
+            if world.media_type(world.history[channel_id][message_id]) == "video":
+                _rename(world, channel_id, message_id, "same.mp4", size)
+                sizes[message_id] = size
+            else:
+                sizes[message_id] = world.photo_size
+    user.profile.latency = 0.002
+
+    bot = FakeBot(user.profile)
+    command = FakeCommand(
+        bot,
+        message_id=7002,
+        chat_id=7002,
+        text=f"/bdl https://t.me/c/{channel_id}/{first} https://t.me/c/{channel_id}/{second + 1}",
+    )
+    asyncio.run(bot_app.download_range(bot, command))
+
+    assert bot.uploaded_to[command.chat.id] == sum(sizes.values())
+
+
+def test_album_downloads_are_counted(bot_app, user, world, storage):
+    from helpers.metrics import TRANSFER_BYTES
+
+    channel_id = next(iter(world.channels))
+    album = world.albums[channel_id][0]
+    size = sum(
+        world.photo_size if world.media_type(world.history[channel_id][message_id]) == "photo"
+        else world.media_size
+        for message_id in (album, album + 1)
+    )
+    downloaded = TRANSFER_BYTES.labels("download")
+    before = downloaded.value
+
+    bot = FakeBot(user.profile)
+    command = FakeCommand(bot, message_id=7003, chat_id=7003)
+    asyncio.run(bot_app.handle_download(bot, command, f"https://t.me/c/{channel_id}/{album}"))
+
+    assert bot.uploaded_to[command.chat.id] == size
+    assert downloaded.value - before == size
+
+
+def test_interrupted_download_resumes(bot_app, user, world, storage):
+    channel_id = next(iter(world.channels))
+    message_id = world.singles[channel_id][3]
+    size = world.media_size * 2
+    _rename(world, channel_id, message_id, "large.mp4", size)
+    url = f"https://t.me/c/{channel_id}/{message_id}"
+    stream_media = user.stream_media
+    finished = []
+    first_parts_done = asyncio.Event()
+
+    async def failing_stream(message, limit=0, offset=0):
+        if offset >= 2:
+            # Fail only once the first two parts are on disk
+            await first_parts_done.wait()
+            raise ConnectionError("connection lost")
+        try:
+            async for chunk in stream_media(message, limit=limit, offset=offset):
+                yield chunk
+        finally:
+            finished.append(offset)
+            if len(finished) == 2:
+                first_parts_done.set()
+
+    bot = FakeBot(user.profile)
+    first = FakeCommand(bot, message_id=7004, chat_id=7004)
+    user.stream_media = failing_stream
+    assert asyncio.run(bot_app.handle_download(bot, first, url)) is False
+    assert first.chat.id not in bot.uploaded_to
+
+    # A new command for the same post, as after a restart
+    resumed = []
+
+    async def counting_stream(message, limit=0, offset=0):
+        async for chunk in stream_media(message, limit=limit, offset=offset):
+            resumed.append(len(chunk))
+            yield chunk
+
+    user.stream_media = counting_stream
+    second = FakeCommand(bot, message_id=7005, chat_id=7005)
+    asyncio.run(bot_app.handle_download(bot, second, url))
+
+    assert bot.uploaded_to[second.chat.id] == size
+    # Only the parts missing from the first attempt are fetched again
+    assert sum(resumed) == size - 2 * PART_SIZE
+
+
+def test_batch_counts_posts_that_failed(bot_app, user, world, storage):
+    channel_id = next(iter(world.channels))
+    good, bad = world.singles[channel_id][3:5]
+    stream_media = user.stream_media
+
+    async def broken_stream(message, limit=0, offset=0):
+        if message.id == bad:
+            raise ConnectionError("connection lost")
+        async for chunk in stream_media(message, limit=limit, offset=offset):
+            yield chunk
+
+    user.stream_media = broken_stream
+    bot = FakeBot(user.profile)
+    command = FakeCommand(
+        bot,
+        message_id=7006,
+        chat_id=7006,
+        text=f"/bdl https://t.me/c/{channel_id}/{good} https://t.me/c/{channel_id}/{bad}",
+    )
+    replies = []
+    reply = command.reply
+
+    async def recording_reply(text, **kwargs):
+        replies.append(text)
+        return await reply(text, **kwargs)
+
+    command.reply = recording_reply
+    asyncio.run(bot_app.download_range(bot, command))
+
+    summary = replies[-1]
+    assert "**Downloaded** : `1`" in summary
+    assert "**Failed**     : `1`" in summary
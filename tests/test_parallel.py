@@ -0,0 +1,59 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+import os
+
+from benchmarks.fake_client import PART_SIZE
+from helpers.parallel import download_parallel
+
+
+def test_segments_download_concurrently_into_place(user, world, tmp_path):
+    channel_id = next(iter(world.channels))
+    message_id = world.singles[channel_id][3]
+    size = 5 * PART_SIZE + 123
+    world.history[channel_id][message_id].media.document.size = size
+    user.profile.latency = 0.002
+    stream_media = user.stream_media
+    streams = []
+    active = []
+
+    async def labelled_stream(message, limit=0, offset=0):
+        # Every part is filled with its own index, so misplaced writes show
+        streams.append(offset)
+        active.append(offset)
+        try:
+            part = offset
+            async for chunk in stream_media(message, limit=limit, offset=offset):
+                yield bytes([part]) * len(chunk)
+                part += 1
+        finally:
+            active.remove(offset)
+
+    peak = []
+    reports = []
+
+    def progress(current, total):
+        peak.append(len(active))
+        reports.append((current, total))
+
+    user.stream_media = labelled_stream
+    path = str(tmp_path / "video.mp4")
+
+    async def scenario():
+        message = await user.get_messages(world.chat_id(channel_id), message_id)
+        return await download_parallel(user, message, path, connections=3, segment_size=2 * PART_SIZE, progress=progress)
+
+    assert asyncio.run(scenario()) == path
+    with open(path, "rb") as file:
+        data = file.read()
+    assert data == b"".join(
+        bytes([part]) * min(PART_SIZE, size - part * PART_SIZE) for part in range(6)
+    )
+    assert not os.path.exists(path + ".temp") and not os.path.exists(path + ".parts")
+    # One stream per two-part segment, up to three at a time
+    assert sorted(streams) == [0, 2, 4]
+    assert max(peak) > 1
+    # Progress only reports the contiguous prefix, so it never goes back
+    assert [current for current, _ in reports] == sorted(current for current, _ in reports)
+    assert reports[-1] == (size, size)
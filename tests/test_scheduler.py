@@ -0,0 +1,97 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+
+import pytest
+
+from helpers.scheduler import DownloadScheduler, QueueFullError
+
+
+def test_higher_priority_runs_first():
+    order = []
+
+    async def scenario():
+        scheduler = DownloadScheduler(workers=1, per_chat=1)
+        release = asyncio.Event()
+
+        async def handler(task_id, chat_id):
+            if task_id == "busy":
+                await release.wait()
+            order.append(task_id)
+
+        scheduler.start(handler)
+        try:
+            # Occupy the only worker so the rest wait in the queue
+            await scheduler.submit("busy", 1)
+            await asyncio.sleep(0)
+            await scheduler.submit("low", 2, priority=0)
+            await scheduler.submit("first", 3)
+            await scheduler.submit("second", 4)
+            await scheduler.submit("urgent", 5, priority=5)
+            positions = [scheduler.position(task_id) for task_id in ("urgent", "first", "second", "low")]
+            release.set()
+            while len(order) < 5:
+                await asyncio.sleep(0)
+        finally:
+            await scheduler.stop()
+        return positions
+
+    positions = asyncio.run(scenario())
+    assert positions == [1, 2, 3, 4]
+    assert order == ["busy", "urgent", "first", "second", "low"]
+
+
+def test_one_chat_cannot_take_every_worker():
+    running = {}
+    peak = {}
+
+    async def scenario():
+        scheduler = DownloadScheduler(workers=3, per_chat=2)
+        release = asyncio.Event()
+
+        async def handler(task_id, chat_id):
+            running[chat_id] = running.get(chat_id, 0) + 1
+            peak[chat_id] = max(peak.get(chat_id, 0), running[chat_id])
+            await release.wait()
+            running[chat_id] -= 1
+
+        scheduler.start(handler)
+        try:
+            for n in range(4):
+                await scheduler.submit(f"busy-{n}", 1)
+            # Submitted last, but runs on the worker chat 1 may not use
+            await scheduler.submit("other", 2)
+            for _ in range(5):
+                await asyncio.sleep(0)
+            busy = dict(running)
+            release.set()
+            while sum(running.values()) or scheduler.stats()["queued"]:
+                await asyncio.sleep(0)
+        finally:
+            await scheduler.stop()
+        return busy
+
+    assert asyncio.run(scenario()) == {1: 2, 2: 1}
+    assert peak == {1: 2, 2: 1}
+
+
+def test_full_queue_rejects_submissions():
+    async def scenario():
+        scheduler = DownloadScheduler(workers=1, max_queue=1)
+        blocked = asyncio.Event()
+
+        async def handler(task_id, chat_id):
+            await blocked.wait()
+
+        scheduler.start(handler)
+        try:
+            await scheduler.submit("running", 1)
+            await asyncio.sleep(0)
+            await scheduler.submit("queued", 1)
+            with pytest.raises(QueueFullError):
+                await scheduler.submit("rejected", 1)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(scenario())
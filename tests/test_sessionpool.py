@@ -0,0 +1,67 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pyrogram.errors import ChannelPrivate, FloodWait
+
+from helpers.sessionpool import SessionPool, session_names
+
+
+def _pool(*names):
+    return SessionPool([SimpleNamespace(name=name) for name in names])
+
+
+def _failing_on(name, error):
+    async def func(client):
+        if client.name == name:
+            raise error
+        return client.name
+    return func
+
+
+def test_flood_wait_moves_on_to_the_next_session():
+    pool = _pool("first", "second")
+
+    assert asyncio.run(pool.call(-100, _failing_on("first", FloodWait(value=30)))) == "second"
+    assert pool.failovers == 1
+    # A FloodWait says nothing about access, the next call starts with the first session again
+    assert pool.pick(-100).name == "first"
+
+
+def test_session_without_access_is_skipped_for_that_chat():
+    pool = _pool("first", "second")
+
+    assert asyncio.run(pool.call(-100, _failing_on("first", ChannelPrivate()))) == "second"
+    assert pool.pick(-100).name == "second"
+    assert pool.pick(-200).name == "first"
+    assert [session["chats_without_access"] for session in pool.stats()] == [1, 0]
+
+
+def test_last_error_is_raised_when_every_session_fails():
+    pool = _pool("first", "second")
+
+    async def func(client):
+        raise ChannelPrivate()
+
+    with pytest.raises(ChannelPrivate):
+        asyncio.run(pool.call(-100, func))
+    assert pool.failovers == 1
+    # Every session is still tried next time, one may have joined since
+    assert [client.name for client in pool.candidates(-100)] == ["first", "second"]
+
+
+def test_calls_go_to_the_least_loaded_session():
+    pool = _pool("first", "second", "third")
+
+    async def scenario():
+        async with pool.lease(-100) as busy:
+            return busy.name, pool.pick(-100).name
+
+    assert asyncio.run(scenario()) == ("first", "second")
+
+
+def test_session_names():
+    assert session_names(3) == ["user_session", "user_session_2", "user_session_3"]
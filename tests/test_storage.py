@@ -0,0 +1,71 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+import os
+from time import time
+
+import pytest
+
+from helpers.storage import InsufficientStorageError, StorageManager
+
+
+def _write(path, size: int, age: float = 0):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * size)
+    stamp = time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_quota_evicts_least_recently_used_files(tmp_path):
+    storage = StorageManager([tmp_path], quota=300)
+    oldest = _write(tmp_path / "a" / "oldest.mp4", 100, age=300)
+    older = _write(tmp_path / "b" / "older.mp4", 100, age=200)
+    recent = _write(tmp_path / "c" / "recent.mp4", 100, age=100)
+    # A partial download is left for sweep to judge, however old it is
+    partial = _write(tmp_path / "d" / "partial.mp4.temp", 10, age=1000)
+    storage.touch(older)
+
+    async def scenario():
+        async with storage.reserve(150, path=tmp_path / "new.mp4"):
+            return storage.reserved()
+
+    assert asyncio.run(scenario()) == 150
+    assert not oldest.exists() and not recent.exists()
+    assert older.exists() and partial.exists()
+    assert storage.evicted_files == 2
+    assert storage.reserved() == 0
+
+
+def test_reservation_protects_its_files(tmp_path):
+    storage = StorageManager([tmp_path], quota=400)
+    downloading = _write(tmp_path / "active" / "video.mp4.temp", 100, age=1000)
+    finished = _write(tmp_path / "done.mp4", 100, age=500)
+
+    async def scenario():
+        async with storage.reserve(200, path=tmp_path / "active" / "video.mp4"):
+            # Even with the finished file evicted only 200 bytes fit; the active download stays
+            with pytest.raises(InsufficientStorageError):
+                async with storage.reserve(250):
+                    pass
+            assert storage.sweep() == 0
+
+    asyncio.run(scenario())
+    assert downloading.exists()
+    assert not finished.exists()
+    assert storage.rejected == 1
+
+
+def test_sweep_removes_stale_partial_downloads(tmp_path):
+    storage = StorageManager([tmp_path], temp_max_age=3600)
+    stale = _write(tmp_path / "old" / "movie.mkv.temp", 100, age=7200)
+    stale_parts = _write(tmp_path / "old" / "movie.mkv.parts", 10, age=7200)
+    fresh = _write(tmp_path / "new" / "movie.mkv.temp", 100, age=60)
+    complete = _write(tmp_path / "done" / "song.mp3", 100, age=7200)
+
+    assert storage.sweep() == 2
+    assert not stale.exists() and not stale_parts.exists()
+    assert not (tmp_path / "old").exists()
+    assert fresh.exists() and complete.exists()
+    assert storage.swept_files == 2
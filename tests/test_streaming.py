@@ -0,0 +1,88 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from helpers.streaming import RangeFileResponse, parse_range
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-10", None),
+    ("bytes=abc", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=20-10", "bytes=-0"])
+def test_parse_unsatisfiable_range(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+def _fetch(path, headers=None, method="GET") -> httpx.Response:
+    async def endpoint(request):
+        return RangeFileResponse(path, request.headers, method=request.method)
+
+    app = Starlette(routes=[Route("/file", endpoint, methods=["GET", "HEAD"])])
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.request(method, "/file", headers=headers)
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture
+def blob(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(DATA)
+    return path
+
+
+def test_whole_file(blob):
+    response = _fetch(blob)
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == DATA
+
+
+def test_range_is_partial_content(blob):
+    response = _fetch(blob, {"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{len(DATA)}"
+    assert response.headers["content-length"] == "100"
+    assert response.content == DATA[100:200]
+
+
+def test_unsatisfiable_range(blob):
+    response = _fetch(blob, {"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+    assert response.content == b""
+
+
+def test_if_range_resumes_only_the_same_file(blob):
+    etag = _fetch(blob, method="HEAD").headers["etag"]
+
+    current = _fetch(blob, {"Range": "bytes=10-", "If-Range": etag})
+    assert current.status_code == 206
+    assert current.content == DATA[10:]
+
+    # A stale validator gets the whole file instead of a mismatched tail
+    stale = _fetch(blob, {"Range": "bytes=10-", "If-Range": '"0-0"'})
+    assert stale.status_code == 200
+    assert stale.content == DATA